@@ -53,12 +53,17 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.logic = None
     self._parameterNode = None
     self._updatingGUIFromParameterNode = False
+    self._segmentSelectorSegmentationNode = None  # segmentation node that the segment selector shows the segments of
+    self._selectedSegmentIds = []
+    self._selectedSegmentIdsParameter = None  # value of SelectedSegmentIDs parameter that _selectedSegmentIds was last read from
 
   def setup(self):
     ScriptedLoadableModuleWidget.setup(self)
 
     self.logic = SegmentMesherLogic()
     self.logic.logCallback = self.addLog
+    self.logic.progressCallback = self.onMesherProgress
+    self.logic.mesherIdleCallback = self.onMesherIdle
     self.modelGenerationInProgress = False
 
     uiWidget = slicer.util.loadUI(self.resourcePath('UI/SegmentMesher.ui'))
@@ -72,10 +77,39 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.ui.inputSegmentationSelector.setMRMLScene( slicer.mrmlScene )
     self.ui.inputModelSelector.setMRMLScene( slicer.mrmlScene )
     self.ui.outputModelSelector.setMRMLScene( slicer.mrmlScene )
+    self.ui.sizingFieldSelector.setMRMLScene( slicer.mrmlScene )
+    self.ui.tetgenRefinementRegionSelector.setMRMLScene( slicer.mrmlScene )
 
     self.ui.methodSelectorComboBox.addItem("Cleaver", METHOD_CLEAVER)
     self.ui.methodSelectorComboBox.addItem("TetGen", METHOD_TETGEN)
 
+    self.updatePresetSelector()
+
+    # Progress bar is only shown while the mesher is running
+    self.ui.mesherProgressBar.visible = False
+
+    # Segment selection changes are written to the parameter node in a single batch
+    self.selectedSegmentsUpdateTimer = qt.QTimer()
+    self.selectedSegmentsUpdateTimer.setSingleShot(True)
+    self.selectedSegmentsUpdateTimer.setInterval(200)
+    self.selectedSegmentsUpdateTimer.connect('timeout()', self.updateParameterNodeSelectedSegments)
+
+    # Cost estimate is updated once after a series of quick parameter changes
+    self.presetEstimateUpdateTimer = qt.QTimer()
+    self.presetEstimateUpdateTimer.setSingleShot(True)
+    self.presetEstimateUpdateTimer.setInterval(300)
+    self.presetEstimateUpdateTimer.connect('timeout()', self.updatePresetEstimate)
+
+    # Progress and remaining time is refreshed periodically while the mesher is running,
+    # as some phases may not write anything for a long time
+    self.mesherProgressTimer = qt.QTimer()
+    self.mesherProgressTimer.setInterval(500)
+    self.mesherProgressTimer.connect('timeout()', self.logic.updateMesherProgress)
+
+    self.ui.cleaverMaterialFieldTypeComboBox.addItem("Merged labelmap", CLEAVER_MATERIAL_FIELD_LABELMAP)
+    self.ui.cleaverMaterialFieldTypeComboBox.addItem("Indicator functions", CLEAVER_MATERIAL_FIELD_INDICATOR)
+    self.ui.cleaverMaterialFieldTypeComboBox.addItem("Signed distance", CLEAVER_MATERIAL_FIELD_DISTANCE)
+
     customCleaverPath = self.logic.getCustomCleaverPath()
     self.ui.customCleaverPathSelector.setCurrentPath(customCleaverPath)
     self.ui.customCleaverPathSelector.nameFilters = [self.logic.cleaverFilename]
@@ -93,6 +127,12 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
     # connections
     self.ui.selectAllSegmentsButton.connect('clicked(bool)', self.onSelectAllSegmentsButton)
+    self.ui.segmentSelectorCombBox.connect('checkedIndexesChanged()', self.onSegmentSelectionChanged)
+    self.ui.segmentFilterSearchBox.connect('textChanged(const QString&)', self.filterSegmentSelector)
+    self.ui.inputSegmentationSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.setSegmentSelectorSegmentationNode)
+    self.ui.applyPresetButton.connect('clicked(bool)', self.onApplyPresetButton)
+    self.ui.savePresetButton.connect('clicked(bool)', self.onSavePresetButton)
+    self.ui.presetSelectorComboBox.connect("currentIndexChanged(int)", self.schedulePresetEstimateUpdate)
     self.ui.applyButton.connect('clicked(bool)', self.onApplyButton)
     self.ui.showTemporaryFilesFolderButton.connect('clicked(bool)', self.onShowTemporaryFilesFolder)
     self.ui.inputSegmentationSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.updateMRMLFromGUI)
@@ -103,16 +143,23 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     # keep the temporary file while the model generation is running
     self.ui.keepTemporaryFilesCheckBox.connect("toggled(bool)", self.onKeepTemporaryFilesToggled)
     self.ui.tetgenUseSurface.connect("toggled(bool)", self.updateMRMLFromGUI)
+    self.ui.tetgenRefineOutputMesh.connect("toggled(bool)", self.updateMRMLFromGUI)
 
     #Parameter node connections
     self.ui.inputSegmentationSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.updateParameterNodeFromGUI)
     self.ui.inputModelSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.updateParameterNodeFromGUI)
     self.ui.outputModelSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.updateParameterNodeFromGUI)
+    self.ui.sizingFieldSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.updateParameterNodeFromGUI)
     self.ui.methodSelectorComboBox.connect("currentIndexChanged(int)", self.updateParameterNodeFromGUI)
 
 
     self.ui.showDetailedLogDuringExecutionCheckBox.connect("toggled(bool)", self.updateParameterNodeFromGUI)
     self.ui.keepTemporaryFilesCheckBox.connect("toggled(bool)", self.updateParameterNodeFromGUI)
+    self.ui.memoryLimitSpinBox.connect("valueChanged(double)", self.updateParameterNodeFromGUI)
+    self.ui.timeLimitSpinBox.connect("valueChanged(int)", self.updateParameterNodeFromGUI)
+    self.ui.retryWithCoarserParametersCheckBox.connect("toggled(bool)", self.updateParameterNodeFromGUI)
+    self.ui.meshingServerUrlLineEdit.connect("textChanged(const QString&)", self.updateParameterNodeFromGUI)
+    self.ui.optimizationIterationsSpinBox.connect("valueChanged(int)", self.updateParameterNodeFromGUI)
 
     self.ui.cleaverFeatureScalingParameterWidget.connect("valueChanged(double)", self.updateParameterNodeFromGUI)
     self.ui.cleaverSamplingParameterWidget.connect("valueChanged(double)", self.updateParameterNodeFromGUI)
@@ -121,8 +168,12 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.ui.cleaverRemoveBackgroundMeshCheckBox.connect("toggled(bool)", self.updateParameterNodeFromGUI)
     self.ui.cleaverPaddingPercentSpinBox.connect("valueChanged(int)", self.updateParameterNodeFromGUI)
     self.ui.customCleaverPathSelector.connect("currentPathChanged(const QString&)", self.updateParameterNodeFromGUI)
+    self.ui.cleaverMaterialFieldTypeComboBox.connect("currentIndexChanged(int)", self.updateParameterNodeFromGUI)
 
     self.ui.tetgenUseSurface.connect("toggled(bool)", self.updateParameterNodeFromGUI)
+    self.ui.tetgenRefineOutputMesh.connect("toggled(bool)", self.updateParameterNodeFromGUI)
+    self.ui.tetgenRefinementRegionSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.updateParameterNodeFromGUI)
+    self.ui.tetgenRefinementRegionVolumeParameterWidget.connect("valueChanged(double)", self.updateParameterNodeFromGUI)
     self.ui.tetgenRatioParameterWidget.connect("valueChanged(double)", self.updateParameterNodeFromGUI)
     self.ui.tetgenAngleParameterWidget.connect("valueChanged(double)", self.updateParameterNodeFromGUI)
     self.ui.tetgenVolumeParameterWidget.connect("valueChanged(double)", self.updateParameterNodeFromGUI)
@@ -139,6 +190,7 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
     # Refresh Apply button state
     self.updateMRMLFromGUI()
+    self.updatePresetEstimate()
 
   def enter(self):
     """
@@ -147,11 +199,13 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     # Make sure parameter node exists and observed
     self.initializeParameterNode()
     self.updateMRMLFromGUI()
+    self.updatePresetEstimate()
 
   def cleanup(self):
     """
     Called when the application closes and the module widget is destroyed.
     """
+    self.presetEstimateUpdateTimer.stop()
     self.removeObservers()
 
   def exit(self):
@@ -231,14 +285,32 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     # Make sure GUI changes do not call updateParameterNodeFromGUI (it could cause infinite loop)
     self._updatingGUIFromParameterNode = True
 
+    # Inputs or parameters that the estimate depends on may have changed
+    self.schedulePresetEstimateUpdate()
+
     # Update node selectors and sliders
     self.ui.inputSegmentationSelector.setCurrentNode(self._parameterNode.GetNodeReference("InputSegmentation"))
     self.ui.inputModelSelector.setCurrentNode(self._parameterNode.GetNodeReference("InputSurface"))
     self.ui.outputModelSelector.setCurrentNode(self._parameterNode.GetNodeReference("OutputModel"))
+    self.ui.sizingFieldSelector.setCurrentNode(self._parameterNode.GetNodeReference("SizingField"))
     self.ui.methodSelectorComboBox.setCurrentText(self._parameterNode.GetParameter("Method"))
 
+    # Segment list and check states are only updated if the segmentation or the selection has changed
+    self.setSegmentSelectorSegmentationNode(self._parameterNode.GetNodeReference("InputSegmentation"))
+    selectedSegmentIdsParameter = self._parameterNode.GetParameter("SelectedSegmentIDs")
+    if selectedSegmentIdsParameter != self._selectedSegmentIdsParameter and not self.selectedSegmentsUpdateTimer.isActive():
+      # there are no selection changes that are not written into the parameter node yet
+      self._selectedSegmentIdsParameter = selectedSegmentIdsParameter
+      self._selectedSegmentIds = self.logic.getSelectedSegmentIds(self._parameterNode)
+      self.updateSegmentSelectorCheckStates()
+
     self.ui.showDetailedLogDuringExecutionCheckBox.checked = (self._parameterNode.GetParameter("showDetailedLogDuringExecution") == "true")
     self.ui.keepTemporaryFilesCheckBox.checked = (self._parameterNode.GetParameter("keepTemporaryFiles") == "true")
+    self.ui.memoryLimitSpinBox.value = float(self._parameterNode.GetParameter("memoryLimitGB"))
+    self.ui.timeLimitSpinBox.value = int(self._parameterNode.GetParameter("timeLimitMinutes"))
+    self.ui.retryWithCoarserParametersCheckBox.checked = (self._parameterNode.GetParameter("retryWithCoarserParameters") == "true")
+    self.ui.meshingServerUrlLineEdit.text = self._parameterNode.GetParameter("meshingServerUrl")
+    self.ui.optimizationIterationsSpinBox.value = int(self._parameterNode.GetParameter("optimizationIterations"))
 
     self.ui.cleaverFeatureScalingParameterWidget.value = float(self._parameterNode.GetParameter("cleaverFeatureScalingParameter"))
     self.ui.cleaverSamplingParameterWidget.value = float(self._parameterNode.GetParameter("cleaverSamplingParameter"))
@@ -247,8 +319,12 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.ui.cleaverRemoveBackgroundMeshCheckBox.checked = (self._parameterNode.GetParameter("cleaverRemoveBackgroundMesh") == "true")
     self.ui.cleaverPaddingPercentSpinBox.value = int(self._parameterNode.GetParameter("cleaverPaddingPercent"))
     self.ui.customCleaverPathSelector.setCurrentPath(self._parameterNode.GetParameter("customCleaverPath"))
+    self.ui.cleaverMaterialFieldTypeComboBox.setCurrentText(self._parameterNode.GetParameter("cleaverMaterialFieldType"))
 
     self.ui.tetgenUseSurface.checked = (self._parameterNode.GetParameter("tetgenUseSurface") == "true")
+    self.ui.tetgenRefineOutputMesh.checked = (self._parameterNode.GetParameter("tetgenRefineOutputMesh") == "true")
+    self.ui.tetgenRefinementRegionSelector.setCurrentNode(self._parameterNode.GetNodeReference("RefinementRegion"))
+    self.ui.tetgenRefinementRegionVolumeParameterWidget.value = float(self._parameterNode.GetParameter("tetgenRefinementRegionVolumeParameter"))
     self.ui.tetgenRatioParameterWidget.value = float(self._parameterNode.GetParameter("tetgenRatioParameter"))
     self.ui.tetgenAngleParameterWidget.value = float(self._parameterNode.GetParameter("tetgenAngleParameter"))
     self.ui.tetgenVolumeParameterWidget.value = float(self._parameterNode.GetParameter("tetgenVolumeParameter"))
@@ -277,11 +353,19 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self._parameterNode.SetNodeReferenceID("InputSegmentation", self.ui.inputSegmentationSelector.currentNodeID)
     self._parameterNode.SetNodeReferenceID("InputSurface", self.ui.inputModelSelector.currentNodeID)
     self._parameterNode.SetNodeReferenceID("OutputModel", self.ui.outputModelSelector.currentNodeID)
+    self._parameterNode.SetNodeReferenceID("SizingField", self.ui.sizingFieldSelector.currentNodeID)
     self._parameterNode.SetParameter("Method", self.ui.methodSelectorComboBox.currentText)
+    self.selectedSegmentsUpdateTimer.stop()
+    self.logic.setSelectedSegmentIds(self._parameterNode, self._selectedSegmentIds)
 
     #General parameters
     self._parameterNode.SetParameter("showDetailedLogDuringExecution", "true" if self.ui.showDetailedLogDuringExecutionCheckBox.checked else "false")
     self._parameterNode.SetParameter("keepTemporaryFiles", "true" if self.ui.keepTemporaryFilesCheckBox.checked else "false")
+    self._parameterNode.SetParameter("memoryLimitGB", str(self.ui.memoryLimitSpinBox.value))
+    self._parameterNode.SetParameter("timeLimitMinutes", str(self.ui.timeLimitSpinBox.value))
+    self._parameterNode.SetParameter("retryWithCoarserParameters", "true" if self.ui.retryWithCoarserParametersCheckBox.checked else "false")
+    self._parameterNode.SetParameter("meshingServerUrl", self.ui.meshingServerUrlLineEdit.text)
+    self._parameterNode.SetParameter("optimizationIterations", str(self.ui.optimizationIterationsSpinBox.value))
 
     #Cleaver parameters
     self._parameterNode.SetParameter("cleaverFeatureScalingParameter", str(self.ui.cleaverFeatureScalingParameterWidget.value))
@@ -291,9 +375,13 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self._parameterNode.SetParameter("cleaverRemoveBackgroundMesh", "true" if self.ui.cleaverRemoveBackgroundMeshCheckBox.checked else "false")
     self._parameterNode.SetParameter("cleaverPaddingPercent", str(self.ui.cleaverPaddingPercentSpinBox.value))
     self._parameterNode.SetParameter("customCleaverPath", self.ui.customCleaverPathSelector.currentPath)
+    self._parameterNode.SetParameter("cleaverMaterialFieldType", self.ui.cleaverMaterialFieldTypeComboBox.currentText)
 
     #TetGen parameters
     self._parameterNode.SetParameter("tetgenUseSurface", "true" if self.ui.tetgenUseSurface.checked else "false")
+    self._parameterNode.SetParameter("tetgenRefineOutputMesh", "true" if self.ui.tetgenRefineOutputMesh.checked else "false")
+    self._parameterNode.SetNodeReferenceID("RefinementRegion", self.ui.tetgenRefinementRegionSelector.currentNodeID)
+    self._parameterNode.SetParameter("tetgenRefinementRegionVolumeParameter", str(self.ui.tetgenRefinementRegionVolumeParameterWidget.value))
     self._parameterNode.SetParameter("tetgenRatioParameter", str(self.ui.tetgenRatioParameterWidget.value))
     self._parameterNode.SetParameter("tetgenAngleParameter", str(self.ui.tetgenAngleParameterWidget.value))
     self._parameterNode.SetParameter("tetgenVolumeParameter", str(self.ui.tetgenVolumeParameterWidget.value))
@@ -312,33 +400,34 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.ui.inputSegmentationSelector.visible = not inputIsModel
     self.ui.segmentSelectorLabel.visible = not inputIsModel
     self.ui.segmentSelectorCombBox.visible = not inputIsModel
+    self.ui.segmentFilterSearchBox.visible = not inputIsModel
+    self.ui.selectAllSegmentsButton.visible = not inputIsModel
     self.ui.inputModelLabel.visible = inputIsModel
     self.ui.inputModelSelector.visible = inputIsModel
     segmentationSelected = self.ui.inputSegmentationSelector.currentNode() is not None
     self.ui.segmentSelectorCombBox.enabled = segmentationSelected
+    self.ui.segmentFilterSearchBox.enabled = segmentationSelected
     self.ui.selectAllSegmentsButton.enabled = segmentationSelected
 
-    #populate segments
-    inputSeg = self.ui.inputSegmentationSelector.currentNode()
-    oldIndex = self.ui.segmentSelectorCombBox.checkedIndexes()
-    oldCount = self.ui.segmentSelectorCombBox.count
-    self.ui.segmentSelectorCombBox.clear()
-    if inputSeg is not None:
-      segmentIDs = vtk.vtkStringArray()
-      inputSeg.GetSegmentation().GetSegmentIDs(segmentIDs)
-      for index in range(0, segmentIDs.GetNumberOfValues()):
-        segmentId = segmentIDs.GetValue(index)
-        self.ui.segmentSelectorCombBox.addItem(inputSeg.GetSegmentation().GetSegment(segmentId).GetName(), segmentId)
-
-    #Restore index - often we will be reloading the data from the same segmentation, so re-select items number of items is the same
-    if oldCount == self.ui.segmentSelectorCombBox.count:
-      for index in oldIndex:
-        self.ui.segmentSelectorCombBox.setCheckState(index, qt.Qt.Checked)
-
     self.ui.CleaverParametersGroupBox.visible = (method == METHOD_CLEAVER)
     self.ui.TetGenParametersGroupBox.visible = (method == METHOD_TETGEN)
-
-    if method == METHOD_TETGEN and self.ui.tetgenUseSurface.isChecked():
+    refineOutputMesh = self.ui.tetgenRefineOutputMesh.isChecked()
+    self.ui.tetgenRefinementRegionLabel.visible = refineOutputMesh
+    self.ui.tetgenRefinementRegionSelector.visible = refineOutputMesh
+    self.ui.tetgenRefinementRegionVolumeLabel.visible = refineOutputMesh
+    self.ui.tetgenRefinementRegionVolumeParameterWidget.visible = refineOutputMesh
+
+    if method == METHOD_TETGEN and self.ui.tetgenRefineOutputMesh.isChecked():
+      if not self.ui.outputModelSelector.currentNode():
+        self.ui.applyButton.text = "Select an output model node"
+        self.ui.applyButton.enabled = False
+      elif not self.ui.outputModelSelector.currentNode().GetUnstructuredGrid():
+        self.ui.applyButton.text = "Output model must contain a volumetric mesh"
+        self.ui.applyButton.enabled = False
+      else:
+        self.ui.applyButton.text = "Apply"
+        self.ui.applyButton.enabled = True
+    elif method == METHOD_TETGEN and self.ui.tetgenUseSurface.isChecked():
       if not self.ui.inputModelSelector.currentNode():
         self.ui.applyButton.text = "Select input surface"
         self.ui.applyButton.enabled = False
@@ -365,8 +454,6 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
         self.ui.applyButton.text = "Apply"
         self.ui.applyButton.enabled = True
 
-    self.updateParameterNodeFromGUI()
-
 
   # def updateGUIFromMRML(self):
     # parameterNode = self.parameterNodeSelector.currentNode()
@@ -393,6 +480,10 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.modelGenerationInProgress = True
     self.ui.applyButton.text = "Cancel"
     self.ui.statusLabel.plainText = ''
+    self.ui.mesherProgressBar.value = 0
+    self.ui.mesherProgressBar.format = "%p%"
+    self.ui.mesherProgressBar.visible = True
+    self.mesherProgressTimer.start()
     slicer.app.setOverrideCursor(qt.Qt.WaitCursor)
     try:
       self.logic.setCustomCleaverPath(self.ui.customCleaverPathSelector.currentPath)
@@ -400,34 +491,64 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
       self.logic.deleteTemporaryFiles = not self.ui.keepTemporaryFilesCheckBox.checked
       self.logic.logStandardOutput = self.ui.showDetailedLogDuringExecutionCheckBox.checked
+      self.logic.setResourceLimitsFromParameterNode(self._parameterNode)
+      self.logic.setBackendFromParameterNode(self._parameterNode)
 
       method = self.ui.methodSelectorComboBox.itemData(self.ui.methodSelectorComboBox.currentIndex)
 
       #Get list of segments to mesh
-      segmentIndexes = self.ui.segmentSelectorCombBox.checkedIndexes()
-      segments = []
-
-      for index in segmentIndexes:
-        segments.append(self.ui.segmentSelectorCombBox.itemData(index.row()))
+      segments = self.logic.getExistingSegmentIds(self.ui.inputSegmentationSelector.currentNode(), self._selectedSegmentIds)
+
+      # Parameters that may be changed if the mesher is retried with coarser parameters
+      parameters = {
+        "featureScale": self.ui.cleaverFeatureScalingParameterWidget.value,
+        "samplingRate": self.ui.cleaverSamplingParameterWidget.value,
+        "rateOfChange": self.ui.cleaverRateParameterWidget.value,
+        "paddingRatio": self.ui.cleaverPaddingPercentSpinBox.value * 0.01,
+        "ratio": self.ui.tetgenRatioParameterWidget.value,
+        "angle": self.ui.tetgenAngleParameterWidget.value,
+        "volume": self.ui.tetgenVolumeParameterWidget.value,
+        "inputDownsamplingFactor": 1.0,
+        }
 
       print(method)
       if method == METHOD_CLEAVER:
-        self.logic.createMeshFromSegmentationCleaver(self.ui.inputSegmentationSelector.currentNode(),
+        self.logic.createMeshWithResourceLimits(method, parameters, lambda p: self.logic.createMeshFromSegmentationCleaver(
+          self.ui.inputSegmentationSelector.currentNode(),
           self.ui.outputModelSelector.currentNode(), segments, self.ui.cleaverAdditionalParametersWidget.text,
           self.ui.cleaverRemoveBackgroundMeshCheckBox.isChecked(),
-          self.ui.cleaverPaddingPercentSpinBox.value * 0.01, self.ui.cleaverFeatureScalingParameterWidget.value, self.ui.cleaverSamplingParameterWidget.value, self.ui.cleaverRateParameterWidget.value)
+          p["paddingRatio"], p["featureScale"], p["samplingRate"], p["rateOfChange"],
+          self.ui.sizingFieldSelector.currentNode(),
+          self.ui.cleaverMaterialFieldTypeComboBox.itemData(self.ui.cleaverMaterialFieldTypeComboBox.currentIndex),
+          self.ui.optimizationIterationsSpinBox.value, p["inputDownsamplingFactor"]))
       else:
-        if self.ui.tetgenUseSurface.isChecked():
+        if self.ui.tetgenRefineOutputMesh.isChecked():
+          inputMesh = self.ui.outputModelSelector.currentNode().GetUnstructuredGrid()
+          elementVolumeConstraints = None
+          if self.ui.tetgenRefinementRegionSelector.currentNode():
+            elementVolumeConstraints = self.logic.getElementVolumeConstraintsInRegion(self.ui.outputModelSelector.currentNode(),
+              self.ui.tetgenRefinementRegionVolumeParameterWidget.value, self.ui.tetgenRefinementRegionSelector.currentNode())
+          # The input mesh is refined as is, only the volume and quality constraints are relaxed on retry
+          del parameters["inputDownsamplingFactor"]
+          self.logic.createMeshWithResourceLimits(method, parameters, lambda p: self.logic.refineMeshTetGen(inputMesh,
+            self.ui.outputModelSelector.currentNode(), self.ui.tetGenAdditionalParametersWidget.text,
+            p["ratio"], p["angle"], p["volume"], elementVolumeConstraints))
+        elif self.ui.tetgenUseSurface.isChecked():
           if self.ui.inputModelSelector.currentNode().GetUnstructuredGrid() is not None:
             self.addLog("Error: Mesh must be a surface, not volumetric")
             return
-          self.logic.createMeshFromPolyDataTetGen(self.ui.inputModelSelector.currentNode().GetPolyData(),
+          self.logic.createMeshWithResourceLimits(method, parameters, lambda p: self.logic.createMeshFromPolyDataTetGen(
+            self.ui.inputModelSelector.currentNode().GetPolyData(),
             self.ui.outputModelSelector.currentNode(), self.ui.tetGenAdditionalParametersWidget.text,
-            self.ui.tetgenRatioParameterWidget.value, self.ui.tetgenAngleParameterWidget.value, self.ui.tetgenVolumeParameterWidget.value)
+            p["ratio"], p["angle"], p["volume"],
+            self.ui.sizingFieldSelector.currentNode(), self.ui.optimizationIterationsSpinBox.value,
+            self.ui.inputModelSelector.currentNode().GetParentTransformNode(), p["inputDownsamplingFactor"]))
         else:
-          self.logic.createMeshFromSegmentationTetGen(self.ui.inputSegmentationSelector.currentNode(),
+          self.logic.createMeshWithResourceLimits(method, parameters, lambda p: self.logic.createMeshFromSegmentationTetGen(
+            self.ui.inputSegmentationSelector.currentNode(),
             self.ui.outputModelSelector.currentNode(), segments, self.ui.tetGenAdditionalParametersWidget.text,
-            self.ui.tetgenRatioParameterWidget.value, self.ui.tetgenAngleParameterWidget.value, self.ui.tetgenVolumeParameterWidget.value)
+            p["ratio"], p["angle"], p["volume"],
+            self.ui.sizingFieldSelector.currentNode(), self.ui.optimizationIterationsSpinBox.value, p["inputDownsamplingFactor"]))
 
     except Exception as e:
       print(e)
@@ -435,15 +556,185 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
       import traceback
       traceback.print_exc()
     finally:
+      self.mesherProgressTimer.stop()
       slicer.app.restoreOverrideCursor()
       self.modelGenerationInProgress = False
+      self.ui.mesherProgressBar.visible = False
       self.updateMRMLFromGUI() # restores default Apply button state
+      self.updatePresetEstimate() # run history is updated
+
+  def updatePresetSelector(self):
+    wasBlocked = self.ui.presetSelectorComboBox.blockSignals(True)
+    currentPresetName = self.ui.presetSelectorComboBox.currentText
+    self.ui.presetSelectorComboBox.clear()
+    for presetName in self.logic.getPresetNames():
+      self.ui.presetSelectorComboBox.addItem(presetName)
+    if currentPresetName:
+      self.ui.presetSelectorComboBox.setCurrentText(currentPresetName)
+    self.ui.presetSelectorComboBox.blockSignals(wasBlocked)
+
+  def schedulePresetEstimateUpdate(self, caller=None, event=None):
+    self.presetEstimateUpdateTimer.start()
+
+  def updatePresetEstimate(self):
+    presetName = self.ui.presetSelectorComboBox.currentText
+    if not presetName or self._parameterNode is None:
+      self.ui.presetEstimateLabel.text = ""
+      return
+    try:
+      estimate = self.logic.estimatePresetCost(self._parameterNode, presetName)
+    except Exception as e:
+      logging.debug("Failed to estimate meshing cost: " + str(e))
+      estimate = None
+    if not estimate:
+      self.ui.presetEstimateLabel.text = "Cost estimate is not available (requires valid input and previous runs with the selected meshing method)"
+      return
+    estimateTexts = []
+    if "numberOfElements" in estimate:
+      estimateTexts.append("{0:,.0f} elements".format(estimate["numberOfElements"]))
+    if "runtime" in estimate:
+      estimateTexts.append("{0:.0f} s".format(estimate["runtime"]))
+    if "peakMemory" in estimate:
+      estimateTexts.append("{0:.0f} MB peak memory".format(estimate["peakMemory"] / 1024.0**2))
+    self.ui.presetEstimateLabel.text = "Estimated: {0} (based on {1} previous runs)".format(", ".join(estimateTexts), estimate["numberOfRuns"])
+
+  def onApplyPresetButton(self):
+    presetName = self.ui.presetSelectorComboBox.currentText
+    if not presetName or self._parameterNode is None:
+      return
+    self.logic.applyPreset(self._parameterNode, presetName)
+
+  def onSavePresetButton(self):
+    if self._parameterNode is None:
+      return
+    presetName = qt.QInputDialog.getText(slicer.util.mainWindow(), "Save preset", "Preset name:")
+    if not presetName:
+      return
+    self.logic.savePreset(self._parameterNode, presetName)
+    self.updatePresetSelector()
+    self.ui.presetSelectorComboBox.setCurrentText(presetName)
+    self.updatePresetEstimate()
 
   def onSelectAllSegmentsButton(self):
-      newState = qt.Qt.Unchecked if self.ui.segmentSelectorCombBox.allChecked() else qt.Qt.Checked
-      model = self.ui.segmentSelectorCombBox.model()
-      for i in range(self.ui.segmentSelectorCombBox.count):
-        self.ui.segmentSelectorCombBox.setCheckState(model.index(i, 0), newState)
+    # Only segments that match the filter are selected/unselected
+    model = self.ui.segmentSelectorCombBox.model()
+    view = self.ui.segmentSelectorCombBox.view()
+    visibleRows = [row for row in range(self.ui.segmentSelectorCombBox.count) if not view.isRowHidden(row)]
+    allChecked = all(self.ui.segmentSelectorCombBox.checkState(model.index(row, 0)) == qt.Qt.Checked for row in visibleRows)
+    newState = qt.Qt.Unchecked if allChecked else qt.Qt.Checked
+    wasBlocked = self.ui.segmentSelectorCombBox.blockSignals(True)
+    for row in visibleRows:
+      self.ui.segmentSelectorCombBox.setCheckState(model.index(row, 0), newState)
+    self.ui.segmentSelectorCombBox.blockSignals(wasBlocked)
+    self.onSegmentSelectionChanged()
+
+  def setSegmentSelectorSegmentationNode(self, segmentationNode):
+    """Show segments of the segmentation node in the segment selector and keep the list up-to-date.
+    Segment list is only fully repopulated when a different segmentation node is selected, after that only
+    the changed segments are updated.
+    """
+    if segmentationNode == self._segmentSelectorSegmentationNode:
+      return
+    if self._segmentSelectorSegmentationNode:
+      for event, callback in self.getSegmentEventCallbacks():
+        self.removeObserver(self._segmentSelectorSegmentationNode, event, callback)
+    self._segmentSelectorSegmentationNode = segmentationNode
+    if self._segmentSelectorSegmentationNode:
+      for event, callback in self.getSegmentEventCallbacks():
+        self.addObserver(self._segmentSelectorSegmentationNode, event, callback)
+    self.populateSegmentSelector()
+
+  def getSegmentEventCallbacks(self):
+    return [
+      (slicer.vtkSegmentation.SegmentAdded, self.onSegmentAdded),
+      (slicer.vtkSegmentation.SegmentRemoved, self.onSegmentRemoved),
+      (slicer.vtkSegmentation.SegmentModified, self.onSegmentModified),
+      (slicer.vtkSegmentation.SegmentsOrderModified, self.onSegmentsOrderModified),
+      ]
+
+  def populateSegmentSelector(self):
+    wasBlocked = self.ui.segmentSelectorCombBox.blockSignals(True)
+    self.ui.segmentSelectorCombBox.clear()
+    if self._segmentSelectorSegmentationNode:
+      segmentation = self._segmentSelectorSegmentationNode.GetSegmentation()
+      for segmentIndex in range(segmentation.GetNumberOfSegments()):
+        self.ui.segmentSelectorCombBox.addItem(segmentation.GetNthSegment(segmentIndex).GetName(), segmentation.GetNthSegmentID(segmentIndex))
+    self.ui.segmentSelectorCombBox.blockSignals(wasBlocked)
+    self.updateSegmentSelectorCheckStates()
+    self.filterSegmentSelector()
+
+  @vtk.calldata_type(vtk.VTK_STRING)
+  def onSegmentAdded(self, caller, event, segmentId):
+    segment = caller.GetSegmentation().GetSegment(segmentId)
+    if not segment or self.ui.segmentSelectorCombBox.findData(segmentId) >= 0:
+      return
+    wasBlocked = self.ui.segmentSelectorCombBox.blockSignals(True)
+    self.ui.segmentSelectorCombBox.addItem(segment.GetName(), segmentId)
+    row = self.ui.segmentSelectorCombBox.count - 1
+    if segmentId in self._selectedSegmentIds:
+      self.ui.segmentSelectorCombBox.setCheckState(self.ui.segmentSelectorCombBox.model().index(row, 0), qt.Qt.Checked)
+    self.ui.segmentSelectorCombBox.blockSignals(wasBlocked)
+    self.filterSegmentSelector(rows=[row])
+
+  @vtk.calldata_type(vtk.VTK_STRING)
+  def onSegmentRemoved(self, caller, event, segmentId):
+    row = self.ui.segmentSelectorCombBox.findData(segmentId)
+    if row < 0:
+      return
+    # Segment ID is kept in the selection, so that the segment is selected again if it is added back (e.g., by undo)
+    wasBlocked = self.ui.segmentSelectorCombBox.blockSignals(True)
+    self.ui.segmentSelectorCombBox.removeItem(row)
+    self.ui.segmentSelectorCombBox.blockSignals(wasBlocked)
+
+  @vtk.calldata_type(vtk.VTK_STRING)
+  def onSegmentModified(self, caller, event, segmentId):
+    # Only segment name is displayed, other changes (such as modified segment content) are ignored
+    row = self.ui.segmentSelectorCombBox.findData(segmentId)
+    segment = caller.GetSegmentation().GetSegment(segmentId)
+    if row < 0 or not segment or self.ui.segmentSelectorCombBox.itemText(row) == segment.GetName():
+      return
+    self.ui.segmentSelectorCombBox.setItemText(row, segment.GetName())
+    self.filterSegmentSelector(rows=[row])
+
+  def onSegmentsOrderModified(self, caller, event):
+    self.populateSegmentSelector()
+
+  def updateSegmentSelectorCheckStates(self):
+    """Check segments that are in the list of selected segment IDs.
+    """
+    selectedSegmentIds = set(self._selectedSegmentIds)
+    model = self.ui.segmentSelectorCombBox.model()
+    wasBlocked = self.ui.segmentSelectorCombBox.blockSignals(True)
+    for row in range(self.ui.segmentSelectorCombBox.count):
+      checkState = qt.Qt.Checked if self.ui.segmentSelectorCombBox.itemData(row) in selectedSegmentIds else qt.Qt.Unchecked
+      index = model.index(row, 0)
+      if self.ui.segmentSelectorCombBox.checkState(index) != checkState:
+        self.ui.segmentSelectorCombBox.setCheckState(index, checkState)
+    self.ui.segmentSelectorCombBox.blockSignals(wasBlocked)
+
+  def onSegmentSelectionChanged(self):
+    # Selected segments that are not in the segment list (e.g., removed segments) remain selected
+    listedSegmentIds = set(self.ui.segmentSelectorCombBox.itemData(row) for row in range(self.ui.segmentSelectorCombBox.count))
+    self._selectedSegmentIds = ([self.ui.segmentSelectorCombBox.itemData(index.row()) for index in self.ui.segmentSelectorCombBox.checkedIndexes()]
+      + [segmentId for segmentId in self._selectedSegmentIds if segmentId not in listedSegmentIds])
+    # Write to parameter node when the user stops changing the selection
+    self.selectedSegmentsUpdateTimer.start()
+
+  def updateParameterNodeSelectedSegments(self):
+    if self._parameterNode is None:
+      return
+    self.logic.setSelectedSegmentIds(self._parameterNode, self._selectedSegmentIds)
+
+  def filterSegmentSelector(self, filterText=None, rows=None):
+    """Hide segments in the segment selector that do not contain the filter text in their name.
+    If rows are not specified then all segments are filtered.
+    """
+    filterText = self.ui.segmentFilterSearchBox.text.lower()
+    view = self.ui.segmentSelectorCombBox.view()
+    if rows is None:
+      rows = range(self.ui.segmentSelectorCombBox.count)
+    for row in rows:
+      view.setRowHidden(row, bool(filterText) and filterText not in self.ui.segmentSelectorCombBox.itemText(row).lower())
 
   def addLog(self, text):
     """Append text to log window
@@ -451,6 +742,22 @@ class SegmentMesherWidget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self.ui.statusLabel.appendPlainText(text)
     slicer.app.processEvents()  # force update
 
+  def onMesherIdle(self):
+    """Called periodically while the logic waits for the mesher
+    """
+    slicer.app.processEvents()  # give a chance to click Cancel button and to refresh progress
+
+  def onMesherProgress(self, progress, remainingTime, phase):
+    """Show mesher progress and estimated remaining time in the progress bar
+    """
+    self.ui.mesherProgressBar.value = int(round(progress * 100))
+    if remainingTime is None:
+      self.ui.mesherProgressBar.format = "{0}: %p%".format(phase)
+    elif remainingTime < 120:
+      self.ui.mesherProgressBar.format = "{0}: %p% (about {1:.0f} s remaining)".format(phase, remainingTime)
+    else:
+      self.ui.mesherProgressBar.format = "{0}: %p% (about {1:.0f} min remaining)".format(phase, remainingTime / 60.0)
+
 #
 # SegmentMesherLogic
 #
@@ -478,6 +785,75 @@ class SegmentMesherLogic(ScriptedLoadableModuleLogic):
     self.cleaverPath = None # this will be determined dynamically
     self.tetGenPath = None # this will be determined dynamically
 
+    # Statistics of the last mesher run
+    self.mesherStartTime = None
+    self.lastRunTime = None
+    self.lastRunPeakMemory = None
+
+    # Resource limits of the mesher process (None means unlimited)
+    self.maximumMemoryUsage = None  # resident memory, in bytes
+    self.maximumRunTime = None  # in seconds
+    self.memorySamplingInterval = 0.2  # in seconds
+    self.retryWithCoarserParameters = False
+    self.maximumNumberOfRetries = 3
+    self.resourceLimitExceeded = None  # description of the limit that stopped the last mesher run
+    self.resourceLimitType = None  # type of the limit that stopped the last mesher run (RESOURCE_LIMIT_MEMORY or RESOURCE_LIMIT_TIME)
+    self.failedAttempts = []  # parameters and stopping resource limit of each failed attempt of the last createMeshWithResourceLimits call
+    self.attemptTempDirectories = None  # temporary directories created during the current meshing attempt
+
+    # Progress of the running mesher, estimated from phase markers in the mesher output (see getMesherProgress).
+    # progressCallback is called with progress (between 0 and 1), estimated remaining time (in seconds, None if not known),
+    # and name of the current phase.
+    self.progressCallback = None
+    # mesherIdleCallback is called periodically (without arguments) while waiting for the mesher output,
+    # for example to process GUI events, so that the user can request cancel
+    self.mesherIdleCallback = None
+    self.mesherMethod = None
+    self.mesherPhaseIndex = 0
+    self.mesherPhaseStartTimes = {}  # start time of each phase, in seconds, relative to mesherStartTime
+    self.mesherPhaseStartFractions = []
+    self.lastRunPhaseStartTimes = None
+    self.maximumNumberOfPhaseCalibrationRuns = 20
+
+    # Meshers run on this computer by default, see setBackendFromParameterNode
+    self.backend = SegmentMesherLocalBackend()
+
+    # Parameter node values that are stored in presets
+    self.presetParameterNames = [
+      "cleaverFeatureScalingParameter", "cleaverSamplingParameter", "cleaverRateParameter", "cleaverAdditionalParameters",
+      "cleaverRemoveBackgroundMesh", "cleaverPaddingPercent", "cleaverMaterialFieldType",
+      "tetgenRatioParameter", "tetgenAngleParameter", "tetgenVolumeParameter", "tetGenAdditionalParameters"]
+    self.builtInPresets = {
+      "FEM coarse": {
+        "cleaverFeatureScalingParameter": "3.0", "cleaverSamplingParameter": "0.2", "cleaverRateParameter": "0.3",
+        "tetgenRatioParameter": "2.0", "tetgenAngleParameter": "10", "tetgenVolumeParameter": "50" },
+      "FEM fine": {
+        "cleaverFeatureScalingParameter": "1.0", "cleaverSamplingParameter": "0.5", "cleaverRateParameter": "0.2",
+        "tetgenRatioParameter": "1.5", "tetgenAngleParameter": "15", "tetgenVolumeParameter": "5" },
+      "Visualization": {
+        "cleaverFeatureScalingParameter": "4.0", "cleaverSamplingParameter": "0.1", "cleaverRateParameter": "0.5",
+        "tetgenRatioParameter": "5", "tetgenAngleParameter": "0", "tetgenVolumeParameter": "100" },
+      }
+
+    # Slopes of the log-linear cost model that are assumed when there are only a few previous runs
+    # (see getCostFeatures for the meaning of each value)
+    self.costModelPriorSlopes = {
+      METHOD_CLEAVER: [1.0, -2.0, 1.0, -1.0, 0.5, 0.0, 1.0],
+      METHOD_TETGEN: [1.0, 1.0, -1.0, 0.0, 1.0],
+      }
+    self.maximumNumberOfRunHistoryRecords = 1000
+    # Run history is only read from file again if the file is modified
+    self.runHistoryCache = None
+    self.runHistoryCacheKey = None
+
+    # Input sizes and sizing field densities, for fast update of cost estimates when only meshing parameters change
+    self.costEstimateInputCache = {}
+    self.maximumNumberOfCachedCostEstimateInputs = 16
+
+    # Voxel to mesh element indices, for fast mapping of multiple volumes to the same mesh
+    self.voxelToElementIndexCache = {}
+    self.maximumNumberOfCachedVoxelToElementIndices = 4
+
     import platform
     executableExt = '.exe' if platform.system() == 'Windows' else ''
     self.cleaverFilename = 'cleaver-cli' + executableExt
@@ -500,6 +876,11 @@ class SegmentMesherLogic(ScriptedLoadableModuleLogic):
     """
     self.setParameterIfNotDefined(parameterNode, "showDetailedLogDuringExecution", "false")
     self.setParameterIfNotDefined(parameterNode, "keepTemporaryFiles", "false")
+    self.setParameterIfNotDefined(parameterNode, "memoryLimitGB", "0")
+    self.setParameterIfNotDefined(parameterNode, "timeLimitMinutes", "0")
+    self.setParameterIfNotDefined(parameterNode, "retryWithCoarserParameters", "false")
+    self.setParameterIfNotDefined(parameterNode, "meshingServerUrl", "")
+    self.setParameterIfNotDefined(parameterNode, "optimizationIterations", "0")
 
     self.setParameterIfNotDefined(parameterNode, "cleaverFeatureScalingParameter", "2.0")
     self.setParameterIfNotDefined(parameterNode, "cleaverSamplingParameter", "0.2")
@@ -508,8 +889,11 @@ class SegmentMesherLogic(ScriptedLoadableModuleLogic):
     self.setParameterIfNotDefined(parameterNode, "cleaverRemoveBackgroundMesh", "true")
     self.setParameterIfNotDefined(parameterNode, "cleaverPaddingPercent", "10")
     self.setParameterIfNotDefined(parameterNode, "customCleaverPath", "")
+    self.setParameterIfNotDefined(parameterNode, "cleaverMaterialFieldType", "Merged labelmap")
 
     self.setParameterIfNotDefined(parameterNode, "tetgenUseSurface", "false")
+    self.setParameterIfNotDefined(parameterNode, "tetgenRefineOutputMesh", "false")
+    self.setParameterIfNotDefined(parameterNode, "tetgenRefinementRegionVolumeParameter", "1")
     self.setParameterIfNotDefined(parameterNode, "tetgenRatioParameter", "5")
     self.setParameterIfNotDefined(parameterNode, "tetgenAngleParameter", "5")
     self.setParameterIfNotDefined(parameterNode, "tetgenVolumeParameter", "5")
@@ -521,6 +905,27 @@ class SegmentMesherLogic(ScriptedLoadableModuleLogic):
     if not parameterNode.GetParameter(key):
       parameterNode.SetParameter(key, value)
 
+  def getSelectedSegmentIds(self, parameterNode):
+    """Get IDs of the segments that are selected for meshing in the parameter node.
+    The list may contain IDs of segments that are not in the input segmentation (for example, because they have been removed),
+    use getExistingSegmentIds to get the segments to mesh.
+    """
+    import json
+    selectedSegmentIds = parameterNode.GetParameter("SelectedSegmentIDs")
+    return json.loads(selectedSegmentIds) if selectedSegmentIds else []
+
+  def setSelectedSegmentIds(self, parameterNode, segmentIds):
+    import json
+    parameterNode.SetParameter("SelectedSegmentIDs", json.dumps(list(segmentIds)))
+
+  def getExistingSegmentIds(self, inputSegmentation, segmentIds):
+    """Get those of the specified segment IDs that are in the segmentation, in the order of segments in the segmentation.
+    """
+    if not inputSegmentation:
+      return []
+    segmentIds = set(segmentIds)
+    return [segmentId for segmentId in inputSegmentation.GetSegmentation().GetSegmentIDs() if segmentId in segmentIds]
+
   def addLog(self, text):
     logging.info(text)
     if self.logCallback:
@@ -596,6 +1001,105 @@ class SegmentMesherLogic(ScriptedLoadableModuleLogic):
     self.tetGenPath = None
     self.getTetGenPath()
 
+  def setBackendFromParameterNode(self, parameterNode):
+    """Run meshers on the meshing server that is specified in the parameter node, or on this computer
+    if server is not specified.
+    """
+    serverUrl = parameterNode.GetParameter("meshingServerUrl").strip()
+    if serverUrl:
+      self.backend = SegmentMesherRemoteBackend(serverUrl)
+    else:
+      self.backend = SegmentMesherLocalBackend()
+
+  def runMesher(self, method, cmdLineArguments, workingDirectory):
+    """Run mesher (METHOD_CLEAVER or METHOD_TETGEN) using the current backend.
+    All input files of the mesher must be in workingDirectory and the mesher must write its outputs there.
+    """
+    self.startMesherProgress(method)
+    try:
+      self.backend.runMesher(self, method, cmdLineArguments, workingDirectory)
+    except Exception:
+      self.mesherMethod = None
+      raise
+    self.finishMesherProgress()
+
+  def startMesherProgress(self, method):
+    self.mesherStartTime = None
+    self.mesherMethod = method
+    self.mesherPhaseIndex = 0
+    self.mesherPhaseStartTimes = {MESHER_PHASES[method][0][0]: 0.0}
+    self.mesherPhaseStartFractions = self.getMesherPhaseStartFractions(method)
+    self.lastRunPhaseStartTimes = None
+    if self.progressCallback:
+      self.progressCallback(0.0, None, MESHER_PHASES[method][0][0])
+
+  def finishMesherProgress(self):
+    self.lastRunPhaseStartTimes = dict(self.mesherPhaseStartTimes)
+    lastPhaseName = MESHER_PHASES[self.mesherMethod][self.mesherPhaseIndex][0]
+    self.mesherMethod = None
+    if self.progressCallback:
+      self.progressCallback(1.0, 0.0, lastPhaseName)
+
+  def updateMesherProgress(self, outputLine=None):
+    """Update progress of the running mesher. If outputLine is specified then it is checked for phase markers.
+    """
+    import re
+    import time
+    if not self.mesherMethod or not self.mesherStartTime:
+      return
+    if outputLine:
+      phases = MESHER_PHASES[self.mesherMethod]
+      # Phases only advance, but some phases may be skipped (for example, TetGen does not refine the mesh if not requested)
+      for phaseIndex in range(self.mesherPhaseIndex + 1, len(phases)):
+        phaseName, phaseMarker, defaultStartFraction = phases[phaseIndex]
+        if re.search(phaseMarker, outputLine, re.IGNORECASE):
+          self.mesherPhaseIndex = phaseIndex
+          self.mesherPhaseStartTimes[phaseName] = time.time() - self.mesherStartTime
+          break
+    if self.progressCallback:
+      progress = self.getMesherProgress()
+      self.progressCallback(progress["progress"], progress["remainingTime"], progress["phase"])
+
+  def getMesherProgress(self):
+    """Get progress of the currently running mesher as a dictionary (method, phase, progress, elapsedTime, remainingTime).
+    Progress is between 0 and 1, times are in seconds. Remaining time is None if it cannot be estimated yet.
+    Returns None if no mesher is running.
+    """
+    import time
+    if not self.mesherMethod or not self.mesherStartTime:
+      return None
+    phases = MESHER_PHASES[self.mesherMethod]
+    phaseName = phases[self.mesherPhaseIndex][0]
+    elapsedTime = time.time() - self.mesherStartTime
+    phaseStartTime = self.mesherPhaseStartTimes[phaseName]
+    phaseStartFraction = self.mesherPhaseStartFractions[self.mesherPhaseIndex]
+    nextPhaseStartFraction = self.mesherPhaseStartFractions[self.mesherPhaseIndex + 1] if self.mesherPhaseIndex + 1 < len(phases) else 1.0
+    progress = phaseStartFraction
+    if phaseStartFraction > 0 and phaseStartTime > 0:
+      # Total computation time is extrapolated from the time that was needed to reach the current phase.
+      # Progress within the phase is assumed to be linear, but never reaches the start of the next phase.
+      expectedPhaseDuration = phaseStartTime / phaseStartFraction * (nextPhaseStartFraction - phaseStartFraction)
+      if expectedPhaseDuration > 0:
+        progress += (nextPhaseStartFraction - phaseStartFraction) * min((elapsedTime - phaseStartTime) / expectedPhaseDuration, 0.95)
+    remainingTime = elapsedTime * (1.0 - progress) / progress if progress > 0 else None
+    return {"method": self.mesherMethod, "phase": phaseName, "progress": progress,
+      "elapsedTime": elapsedTime, "remainingTime": remainingTime}
+
+  def getMesherPhaseStartFractions(self, method):
+    """Get the typical fraction of the total computation time at which each phase of the mesher (see MESHER_PHASES) starts.
+    Fractions are calibrated using phase timings of previous runs with the same method on this computer.
+    """
+    import numpy as np
+    phases = MESHER_PHASES[method]
+    runs = [run for run in self.getRunHistory() if run.get("method") == method and run.get("phaseStartTimes") and run.get("runtime")]
+    runs = runs[-self.maximumNumberOfPhaseCalibrationRuns:]
+    startFractions = []
+    for phaseName, phaseMarker, defaultStartFraction in phases:
+      measuredStartFractions = [run["phaseStartTimes"][phaseName] / run["runtime"] for run in runs if phaseName in run["phaseStartTimes"]]
+      startFractions.append(float(np.median(measuredStartFractions)) if measuredStartFractions else defaultStartFraction)
+    # Phases that are missing in previous runs may make the fractions non-monotonic
+    return [float(fraction) for fraction in np.clip(np.maximum.accumulate(startFractions), 0.0, 0.99)]
+
   def startMesher(self, cmdLineArguments, executableFilePath):
     self.addLog("Generating volumetric mesh...")
     import subprocess
@@ -610,31 +1114,559 @@ class SegmentMesherLogic(ScriptedLoadableModuleLogic):
       info = None
 
     logging.info("Generate mesh using: "+executableFilePath+": "+repr(cmdLineArguments))
-    return subprocess.Popen([executableFilePath] + cmdLineArguments,
+    import time
+    self.mesherStartTime = time.time()
+    process = subprocess.Popen([executableFilePath] + cmdLineArguments,
                             stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, startupinfo=info)
 
+    # Limit address space of the process, so that memory allocation fails instead of swapping the whole system.
+    # Address space is usually larger than the resident memory, therefore a more generous limit is set here
+    # and resident memory usage is enforced by sampling (see logProcessOutput).
+    if self.maximumMemoryUsage:
+      from SegmentMesherLib.MeshingWorker import limitProcessAddressSpace
+      limitProcessAddressSpace(process.pid, int(self.maximumMemoryUsage * 2))
+    return process
+
   def logProcessOutput(self, process, processName):
     # save process output (if not logged) so that it can be displayed in case of an error
     processOutput = ''
+    import queue
+    import re
     import subprocess
-    for stdout_line in iter(process.stdout.readline, ""):
-      if self.logStandardOutput:
-        self.addLog(stdout_line.rstrip())
-      else:
-        processOutput += stdout_line.rstrip() + '\n'
-      slicer.app.processEvents()  # give a chance to click Cancel button
-      if self.abortRequested:
+    import threading
+    import time
+
+    # Sample memory usage and enforce resource limits in a separate thread,
+    # as the process may not write anything to the output for a long time.
+    # Both limits are checked every memorySamplingInterval seconds.
+    from SegmentMesherLib.MeshingWorker import MEMORY_ALLOCATION_FAILURE_PATTERN, RESOURCE_LIMIT_MEMORY, RESOURCE_LIMIT_TIME, getProcessMemoryUsage
+    self.resourceLimitExceeded = None
+    self.resourceLimitType = None
+    peakMemory = [0]
+    monitoringStopped = threading.Event()
+    def monitorProcess():
+      while not monitoringStopped.wait(self.memorySamplingInterval):
+        memoryUsage = getProcessMemoryUsage(process.pid) or 0
+        peakMemory[0] = max(peakMemory[0], memoryUsage)
+        if self.maximumMemoryUsage and memoryUsage > self.maximumMemoryUsage:
+          self.resourceLimitType = RESOURCE_LIMIT_MEMORY
+          self.resourceLimitExceeded = "memory usage exceeded {0:.1f} GB".format(self.maximumMemoryUsage / 1024.0**3)
+        elif self.maximumRunTime and time.time() - self.mesherStartTime > self.maximumRunTime:
+          self.resourceLimitType = RESOURCE_LIMIT_TIME
+          self.resourceLimitExceeded = "computation time exceeded {0:.0f} s".format(self.maximumRunTime)
+        if self.resourceLimitExceeded:
+          process.kill()
+          return
+    monitorThread = threading.Thread(target=monitorProcess)
+    monitorThread.daemon = True
+    monitorThread.start()
+
+    # Read the output in a separate thread, so that the application remains responsive
+    # while the mesher does not write anything to the output
+    outputLines = queue.Queue()
+    def readOutput():
+      for stdout_line in iter(process.stdout.readline, ""):
+        outputLines.put(stdout_line)
+      outputLines.put(None)
+    readerThread = threading.Thread(target=readOutput)
+    readerThread.daemon = True
+    readerThread.start()
+
+    memoryAllocationFailed = False
+    processKilled = False
+    try:
+      while True:
+        if self.mesherIdleCallback:
+          self.mesherIdleCallback()
+        if self.abortRequested and not processKilled:
+          process.kill()
+          processKilled = True
+        try:
+          stdout_line = outputLines.get(timeout=0.1)
+        except queue.Empty:
+          continue
+        if stdout_line is None:
+          break
+        if re.search(MEMORY_ALLOCATION_FAILURE_PATTERN, stdout_line, re.IGNORECASE):
+          memoryAllocationFailed = True
+        if self.logStandardOutput:
+          self.addLog(stdout_line.rstrip())
+        else:
+          processOutput += stdout_line.rstrip() + '\n'
+        self.updateMesherProgress(stdout_line)
+    finally:
+      # Process is not left running if waiting for the output is interrupted
+      monitoringStopped.set()
+      if process.poll() is None:
         process.kill()
-    process.stdout.close()
-    return_code = process.wait()
+      return_code = process.wait()
+      readerThread.join()
+      process.stdout.close()
+      monitorThread.join()
+    self.lastRunTime = time.time() - self.mesherStartTime if self.mesherStartTime else None
+    self.lastRunPeakMemory = peakMemory[0] if peakMemory[0] > 0 else None
     if return_code:
       if self.abortRequested:
         raise ValueError("User requested cancel.")
+      if memoryAllocationFailed and self.maximumMemoryUsage and not self.resourceLimitExceeded:
+        self.resourceLimitType = RESOURCE_LIMIT_MEMORY
+        self.resourceLimitExceeded = "memory allocation failed"
+      if self.resourceLimitExceeded:
+        if processOutput:
+          self.addLog(processOutput)
+        raise ValueError("Mesher is stopped: {0}".format(self.resourceLimitExceeded))
       else:
         if processOutput:
           self.addLog(processOutput)
         raise subprocess.CalledProcessError(return_code, processName)
 
+  def setResourceLimitsFromParameterNode(self, parameterNode):
+    """Set mesher memory and time limits and retry policy from parameter node values.
+    Both limits are enforced by sampling the mesher process every memorySamplingInterval seconds,
+    therefore the process may run slightly longer (and may briefly use more memory) than the limit.
+    """
+    memoryLimitGB = float(parameterNode.GetParameter("memoryLimitGB") or 0)
+    timeLimitMinutes = float(parameterNode.GetParameter("timeLimitMinutes") or 0)
+    self.maximumMemoryUsage = memoryLimitGB * 1024**3 if memoryLimitGB > 0 else None
+    self.maximumRunTime = timeLimitMinutes * 60 if timeLimitMinutes > 0 else None
+    self.retryWithCoarserParameters = (parameterNode.GetParameter("retryWithCoarserParameters") == "true")
+
+  def getCoarserMesherParameters(self, method, parameters):
+    """Get mesher parameters (as returned by getMesherParametersFromParameterNode) that result in a coarser mesh,
+    requiring less memory and computation time.
+    If parameters contain inputDownsamplingFactor then the input is coarsened as well: Cleaver input labelmap spacing
+    is multiplied by this factor, TetGen input surface is decimated to have correspondingly fewer points.
+    Returns the modified parameters and list of descriptions of the changes.
+    """
+    coarserParameters = dict(parameters)
+    if "inputDownsamplingFactor" in parameters:
+      coarserParameters["inputDownsamplingFactor"] = parameters["inputDownsamplingFactor"] * 1.5
+    if method == METHOD_CLEAVER:
+      coarserParameters["featureScale"] = parameters["featureScale"] * 1.5
+      coarserParameters["samplingRate"] = parameters["samplingRate"] / 1.5
+      # Crop the input volume by reducing the padding around the segments
+      coarserParameters["paddingRatio"] = parameters["paddingRatio"] * 0.5
+    else:
+      # Zero volume means that element volume is not constrained
+      if parameters["volume"] > 0:
+        coarserParameters["volume"] = parameters["volume"] * 2.0
+      coarserParameters["ratio"] = parameters["ratio"] * 1.25
+    changes = ["{0}: {1:.3g} -> {2:.3g}".format(name, parameters[name], coarserParameters[name])
+      for name in sorted(coarserParameters) if coarserParameters[name] != parameters[name]]
+    return coarserParameters, changes
+
+  def createMeshWithResourceLimits(self, method, parameters, createMesh):
+    """Call createMesh(parameters), which creates mesh using the specified mesher parameters.
+    If a resource limit is exceeded and retryWithCoarserParameters is enabled then it is called again with coarser parameters,
+    up to maximumNumberOfRetries times.
+    Temporary directories of each attempt are removed (unless deleteTemporaryFiles is disabled), even if the attempt failed.
+    Parameters and the resource limit that stopped the mesher are stored in failedAttempts for each failed attempt.
+    Returns the parameters that were used for creating the mesh.
+    """
+    import shutil
+    self.failedAttempts = []
+    for retryIndex in range(self.maximumNumberOfRetries + 1):
+      self.resourceLimitExceeded = None
+      self.resourceLimitType = None
+      self.attemptTempDirectories = []
+      try:
+        createMesh(parameters)
+        return parameters
+      except ValueError:
+        if self.resourceLimitExceeded:
+          self.failedAttempts.append({"parameters": parameters, "resourceLimitType": self.resourceLimitType,
+            "resourceLimitExceeded": self.resourceLimitExceeded})
+        if not self.resourceLimitExceeded or not self.retryWithCoarserParameters or retryIndex >= self.maximumNumberOfRetries:
+          raise
+      finally:
+        if self.deleteTemporaryFiles:
+          for tempDir in self.attemptTempDirectories:
+            shutil.rmtree(tempDir, ignore_errors=True)
+        self.attemptTempDirectories = None
+      parameters, changes = self.getCoarserMesherParameters(method, parameters)
+      self.addLog("Mesher is stopped by the {0} limit ({1}), retrying with coarser parameters: {2}".format(
+        self.resourceLimitType, self.resourceLimitExceeded, ", ".join(changes)))
+
+  def getUserDataDirectory(self):
+    """Directory for storing presets and run history of this module.
+    """
+    dirPath = os.path.join(os.path.dirname(slicer.app.slicerUserSettingsFilePath), "SegmentMesher")
+    qt.QDir().mkpath(dirPath)
+    return dirPath
+
+  def getUserPresetsFilePath(self):
+    return os.path.join(self.getUserDataDirectory(), "Presets.json")
+
+  def getRunHistoryFilePath(self):
+    return os.path.join(self.getUserDataDirectory(), "RunHistory.json")
+
+  def getUserPresets(self):
+    import json
+    presetsFilePath = self.getUserPresetsFilePath()
+    if not os.path.exists(presetsFilePath):
+      return {}
+    try:
+      with open(presetsFilePath) as presetsFile:
+        return json.load(presetsFile)
+    except ValueError as e:
+      logging.warning("Failed to read presets from {0}: {1}".format(presetsFilePath, str(e)))
+      return {}
+
+  def getPresetNames(self):
+    """Get names of built-in and user-defined presets.
+    """
+    presetNames = list(self.builtInPresets.keys())
+    presetNames += [presetName for presetName in self.getUserPresets().keys() if presetName not in self.builtInPresets]
+    return presetNames
+
+  def getPresetParameters(self, presetName):
+    """Get parameter node values stored in a preset as a dictionary.
+    """
+    userPresets = self.getUserPresets()
+    if presetName in userPresets:
+      return userPresets[presetName]
+    if presetName in self.builtInPresets:
+      return self.builtInPresets[presetName]
+    raise ValueError("Preset not found: " + presetName)
+
+  def applyPreset(self, parameterNode, presetName):
+    """Set meshing parameters in the parameter node from a preset.
+    """
+    presetParameters = self.getPresetParameters(presetName)
+    wasModified = parameterNode.StartModify()
+    for parameterName in self.presetParameterNames:
+      if parameterName in presetParameters:
+        parameterNode.SetParameter(parameterName, presetParameters[parameterName])
+    parameterNode.EndModify(wasModified)
+
+  def savePreset(self, parameterNode, presetName):
+    """Save meshing parameters of the parameter node as a user-defined preset.
+    A user-defined preset overrides the built-in preset of the same name.
+    """
+    import json
+    userPresets = self.getUserPresets()
+    userPresets[presetName] = {parameterName: parameterNode.GetParameter(parameterName) for parameterName in self.presetParameterNames}
+    with open(self.getUserPresetsFilePath(), "w") as presetsFile:
+      json.dump(userPresets, presetsFile, indent=2, sort_keys=True)
+
+  def getMethodFromParameterNode(self, parameterNode):
+    return METHOD_TETGEN if parameterNode.GetParameter("Method") == "TetGen" else METHOD_CLEAVER
+
+  def getInputSizeCleaver(self, inputSegmentation, paddingRatio):
+    """Get input size for cost estimation: number of voxels of the padded labelmap that is meshed by Cleaver.
+    """
+    referenceGeometry_Segmentation = slicer.vtkOrientedImageData()
+    inputSegmentation.GetSegmentation().SetImageGeometryFromCommonLabelmapGeometry(referenceGeometry_Segmentation, None,
+      slicer.vtkSegmentation.EXTENT_REFERENCE_GEOMETRY)
+    extent = referenceGeometry_Segmentation.GetExtent()
+    numberOfVoxels = 1
+    for axisIndex in range(3):
+      axisLength = extent[axisIndex * 2 + 1] - extent[axisIndex * 2]
+      numberOfVoxels *= axisLength + 1 + 2 * int(axisLength * paddingRatio)
+    return [numberOfVoxels] if numberOfVoxels > 0 else None
+
+  def getInputSizeTetGen(self, inputPolyData):
+    """Get input size for cost estimation: number of surface points and enclosed volume.
+    """
+    if inputPolyData is None or inputPolyData.GetNumberOfPoints() == 0:
+      return None
+    triangulator = vtk.vtkTriangleFilter()
+    triangulator.SetInputData(inputPolyData)
+    massProperties = vtk.vtkMassProperties()
+    massProperties.SetInputConnection(triangulator.GetOutputPort())
+    massProperties.Update()
+    return [inputPolyData.GetNumberOfPoints(), massProperties.GetVolume()]
+
+  def getInputSizeTetGenFromSegmentation(self, inputSegmentation, segmentIds):
+    """Get input size for cost estimation of meshing segments with TetGen, without creating closed surface representation.
+    If closed surface representation is not available then the number of surface points is estimated from the
+    binary labelmap representation (surface extraction creates one point for each boundary voxel face).
+    """
+    import numpy as np
+    from vtk.util import numpy_support
+    segmentation = inputSegmentation.GetSegmentation()
+    closedSurfaceRepresentationName = slicer.vtkSegmentationConverter.GetSegmentationClosedSurfaceRepresentationName()
+    if segmentation.ContainsRepresentation(closedSurfaceRepresentationName):
+      appender = vtk.vtkAppendPolyData()
+      for segmentId in segmentIds:
+        appender.AddInputData(segmentation.GetSegment(segmentId).GetRepresentation(closedSurfaceRepresentationName))
+      appender.Update()
+      return self.getInputSizeTetGen(appender.GetOutput())
+    if not segmentation.ContainsRepresentation(slicer.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName()):
+      return None
+    numberOfSurfacePoints = 0
+    enclosedVolume = 0.0
+    for segmentId in segmentIds:
+      segmentLabelmap = slicer.vtkOrientedImageData()
+      slicer.vtkSlicerSegmentationsModuleLogic.GetSegmentBinaryLabelmapRepresentation(inputSegmentation, segmentId, segmentLabelmap, False)
+      extent = segmentLabelmap.GetExtent()
+      if extent[0] > extent[1] or extent[2] > extent[3] or extent[4] > extent[5]:
+        continue
+      shape = (extent[5] - extent[4] + 1, extent[3] - extent[2] + 1, extent[1] - extent[0] + 1)
+      inside = numpy_support.vtk_to_numpy(segmentLabelmap.GetPointData().GetScalars()).reshape(shape) > 0
+      # Pad the labelmap so that voxel faces at the labelmap boundary are counted, too
+      inside = np.pad(inside, 1, mode='constant')
+      for axis in range(3):
+        numberOfSurfacePoints += np.count_nonzero(np.diff(inside, axis=axis))
+      imageToWorldMatrix = vtk.vtkMatrix4x4()
+      segmentLabelmap.GetImageToWorldMatrix(imageToWorldMatrix)
+      enclosedVolume += np.count_nonzero(inside) * abs(imageToWorldMatrix.Determinant())
+    decimationFactor = self.getClosedSurfaceConversionParameters(segmentation)["decimationFactor"]
+    numberOfSurfacePoints = int(numberOfSurfacePoints * (1.0 - decimationFactor))
+    return [numberOfSurfacePoints, enclosedVolume] if numberOfSurfacePoints > 0 else None
+
+  def getInputSizeTetGenFromMesh(self, inputMesh):
+    """Get input size for cost estimation of refining a volumetric mesh with TetGen: number of points on the
+    outer boundary and volume of the mesh (corresponding to the size of a surface input, see getInputSizeTetGen).
+    """
+    import numpy as np
+    from vtk.util import numpy_support
+    points = numpy_support.vtk_to_numpy(inputMesh.GetPoints().GetData()).astype(np.float64)
+    tetrahedra = self.getTetrahedra(inputMesh)
+    # All elements are considered to be in the same region, therefore only the outer boundary is returned
+    boundaryFaces = np.concatenate([faceIndices for surfaceName, faceIndices in
+      self.getMeshSurfaces(tetrahedra, np.zeros(len(tetrahedra), dtype=np.int64))])
+    numberOfBoundaryPoints = len(np.unique(self.getFaceNodeIds(tetrahedra, boundaryFaces)))
+    return [numberOfBoundaryPoints, float(np.abs(self.computeTetrahedraVolumes(points, tetrahedra)).sum())]
+
+  def getSizingFieldDensity(self, sizingFieldVolumeNode):
+    """Get average of size^-3 in the sizing field volume, which is proportional to the number of elements per unit volume.
+    Returns None if sizing field is not specified.
+    """
+    import numpy as np
+    if not sizingFieldVolumeNode:
+      return None
+    sizes = np.maximum(slicer.util.arrayFromVolume(sizingFieldVolumeNode).astype(np.float64), 1e-3)
+    return float(np.mean(sizes ** -3))
+
+  def getCostFeatures(self, method, inputSize, parameters):
+    """Get values that the logarithm of number of elements, computation time, and memory usage
+    is assumed to depend on linearly.
+    Parameters may contain numberOfMaterialFields (number of input files of Cleaver) and sizingFieldDensity
+    (see getSizingFieldDensity, None if sizing field is not used). They are not available in old run history records.
+    """
+    import math
+    def safeLog(value):
+      return math.log(max(float(value), 1e-6))
+    sizingFieldDensity = parameters.get("sizingFieldDensity")
+    usesSizingField = 1.0 if sizingFieldDensity else 0.0
+    if method == METHOD_CLEAVER:
+      return [safeLog(inputSize[0]), safeLog(parameters["featureScale"]), safeLog(parameters["samplingRate"]), safeLog(parameters["rateOfChange"]),
+        safeLog(parameters.get("numberOfMaterialFields", 1)), usesSizingField, safeLog(sizingFieldDensity) if sizingFieldDensity else 0.0]
+    else:
+      return [safeLog(inputSize[0]), safeLog(inputSize[1] / max(float(parameters["volume"]), 1e-6)), safeLog(parameters["ratio"]),
+        usesSizingField, safeLog(inputSize[1] * sizingFieldDensity) if sizingFieldDensity else 0.0]
+
+  def getRunHistory(self):
+    """Get list of previous run records. The file is only parsed again if it has been modified since the last call,
+    therefore the returned list must not be modified.
+    """
+    import json
+    runHistoryFilePath = self.getRunHistoryFilePath()
+    if not os.path.exists(runHistoryFilePath):
+      return []
+    fileStatus = os.stat(runHistoryFilePath)
+    cacheKey = (runHistoryFilePath, fileStatus.st_mtime_ns, fileStatus.st_size)
+    if self.runHistoryCacheKey == cacheKey:
+      return self.runHistoryCache
+    runs = []
+    with open(runHistoryFilePath) as runHistoryFile:
+      for line in runHistoryFile:
+        try:
+          runs.append(json.loads(line))
+        except ValueError:
+          # skip corrupted records
+          pass
+    self.runHistoryCache = runs
+    self.runHistoryCacheKey = cacheKey
+    return runs
+
+  def recordRun(self, method, inputSize, parameters, numberOfElements):
+    """Add statistics of the last mesher run to the run history (used for cost estimation).
+    """
+    import json
+    import time
+    if inputSize is None or not numberOfElements or not self.lastRunTime:
+      return
+    run = {"method": method, "inputSize": inputSize, "parameters": parameters, "numberOfElements": numberOfElements,
+      "runtime": self.lastRunTime, "peakMemory": self.lastRunPeakMemory, "phaseStartTimes": self.lastRunPhaseStartTimes,
+      "timestamp": time.time()}
+    runs = self.getRunHistory()[-(self.maximumNumberOfRunHistoryRecords - 1):] + [run]
+    with open(self.getRunHistoryFilePath(), "w") as runHistoryFile:
+      for run in runs:
+        runHistoryFile.write(json.dumps(run) + "\n")
+    # File modification time resolution may be too coarse to detect the change
+    self.runHistoryCacheKey = None
+
+  def estimateCost(self, method, inputSize, parameters):
+    """Predict number of elements, computation time (in seconds), and peak memory usage (in bytes)
+    of a mesher run, based on previous runs with the same method on this computer.
+    Returns None if no estimate is available.
+    """
+    import numpy as np
+    runs = [run for run in self.getRunHistory() if run.get("method") == method]
+    if not runs or inputSize is None:
+      return None
+    priorSlopes = np.array(self.costModelPriorSlopes[method])
+    numberOfFeatures = len(priorSlopes)
+    features = np.array([self.getCostFeatures(method, run["inputSize"], run["parameters"]) for run in runs])
+    queryFeatures = np.array(self.getCostFeatures(method, inputSize, parameters))
+    # Regularize slopes towards prior values, so that the model is usable even if there are only a few previous runs
+    priorWeight = 0.5
+    priorRows = np.column_stack((np.zeros(numberOfFeatures), np.eye(numberOfFeatures))) * priorWeight
+    estimate = {"numberOfRuns": len(runs)}
+    for quantity in ["numberOfElements", "runtime", "peakMemory"]:
+      validRunIndices = [runIndex for runIndex, run in enumerate(runs) if run.get(quantity)]
+      if not validRunIndices:
+        continue
+      designMatrix = np.column_stack((np.ones(len(validRunIndices)), features[validRunIndices]))
+      observations = np.log([runs[runIndex][quantity] for runIndex in validRunIndices])
+      coefficients = np.linalg.lstsq(np.vstack((designMatrix, priorRows)),
+        np.concatenate((observations, priorSlopes * priorWeight)), rcond=None)[0]
+      estimate[quantity] = float(np.exp(coefficients[0] + queryFeatures.dot(coefficients[1:])))
+    return estimate
+
+  def getMesherParametersFromParameterNode(self, parameterNode, overrideParameters=None):
+    """Get mesher parameters (as used in cost estimation) from parameter node values,
+    optionally overriding some values (for example, by values in a preset).
+    Default values are used for parameters that are not set, without modifying the parameter node.
+    """
+    defaultParameterNode = slicer.vtkMRMLScriptedModuleNode()
+    self.setDefaultParameters(defaultParameterNode)
+    def getParameter(parameterName):
+      if overrideParameters and parameterName in overrideParameters:
+        return overrideParameters[parameterName]
+      return parameterNode.GetParameter(parameterName) or defaultParameterNode.GetParameter(parameterName)
+    return {
+      "featureScale": float(getParameter("cleaverFeatureScalingParameter")),
+      "samplingRate": float(getParameter("cleaverSamplingParameter")),
+      "rateOfChange": float(getParameter("cleaverRateParameter")),
+      "paddingRatio": int(getParameter("cleaverPaddingPercent")) * 0.01,
+      "ratio": float(getParameter("tetgenRatioParameter")),
+      "angle": float(getParameter("tetgenAngleParameter")),
+      "volume": float(getParameter("tetgenVolumeParameter")),
+      "inputDownsamplingFactor": 1.0,
+      }
+
+  def getCachedCostEstimateInput(self, cacheKey, computeValue):
+    """Get input size or sizing field density from the cache, computing it by calling computeValue if it is not cached.
+    The cache key must contain the node ID and the modification time of the data, so that modified inputs are not
+    looked up from the cache.
+    """
+    if cacheKey in self.costEstimateInputCache:
+      return self.costEstimateInputCache[cacheKey]
+    value = computeValue()
+    # Only keep a few recently used values
+    while len(self.costEstimateInputCache) >= self.maximumNumberOfCachedCostEstimateInputs:
+      del self.costEstimateInputCache[next(iter(self.costEstimateInputCache))]
+    self.costEstimateInputCache[cacheKey] = value
+    return value
+
+  def getSegmentationModifiedTime(self, inputSegmentation, segmentIds):
+    """Get modification times of a segmentation node and the representations of the specified segments.
+    """
+    segmentation = inputSegmentation.GetSegmentation()
+    modifiedTimes = [inputSegmentation.GetMTime(), segmentation.GetMTime()]
+    representationNames = [slicer.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName(),
+      slicer.vtkSegmentationConverter.GetSegmentationClosedSurfaceRepresentationName()]
+    for segmentId in segmentIds:
+      segment = segmentation.GetSegment(segmentId)
+      for representationName in representationNames:
+        representation = segment.GetRepresentation(representationName) if segment else None
+        modifiedTimes.append(representation.GetMTime() if representation else 0)
+    return tuple(modifiedTimes)
+
+  def estimatePresetCost(self, parameterNode, presetName):
+    """Predict cost of meshing the inputs of the parameter node using a preset.
+    The parameter node is not modified. Input sizes and sizing field densities are cached,
+    therefore the estimate is quickly updated when only meshing parameters change.
+    """
+    method = self.getMethodFromParameterNode(parameterNode)
+    parameters = self.getMesherParametersFromParameterNode(parameterNode, self.getPresetParameters(presetName))
+    sizingFieldVolumeNode = parameterNode.GetNodeReference("SizingField")
+    if sizingFieldVolumeNode and sizingFieldVolumeNode.GetImageData():
+      parameters["sizingFieldDensity"] = self.getCachedCostEstimateInput(("sizingFieldDensity", sizingFieldVolumeNode.GetID(),
+        sizingFieldVolumeNode.GetMTime(), sizingFieldVolumeNode.GetImageData().GetMTime()),
+        lambda: self.getSizingFieldDensity(sizingFieldVolumeNode))
+    else:
+      parameters["sizingFieldDensity"] = self.getSizingFieldDensity(sizingFieldVolumeNode)
+    inputSegmentation = parameterNode.GetNodeReference("InputSegmentation")
+    segmentIds = []
+    if inputSegmentation:
+      segmentIds = (self.getExistingSegmentIds(inputSegmentation, self.getSelectedSegmentIds(parameterNode))
+        or list(inputSegmentation.GetSegmentation().GetSegmentIDs()))
+    inputSize = None
+    if method == METHOD_CLEAVER:
+      if inputSegmentation:
+        # Padded labelmap contains all segments
+        allSegmentIds = list(inputSegmentation.GetSegmentation().GetSegmentIDs())
+        inputSize = self.getCachedCostEstimateInput(("inputSizeCleaver", inputSegmentation.GetID(),
+          self.getSegmentationModifiedTime(inputSegmentation, allSegmentIds), parameters["paddingRatio"]),
+          lambda: self.getInputSizeCleaver(inputSegmentation, parameters["paddingRatio"]))
+      if parameterNode.GetParameter("cleaverMaterialFieldType") in ["Indicator functions", "Signed distance"]:
+        parameters["numberOfMaterialFields"] = len(segmentIds) + 1
+    elif parameterNode.GetParameter("tetgenUseSurface") == "true":
+      inputModel = parameterNode.GetNodeReference("InputSurface")
+      if inputModel and inputModel.GetPolyData():
+        inputSize = self.getCachedCostEstimateInput(("inputSizeTetGen", inputModel.GetID(), inputModel.GetPolyData().GetMTime()),
+          lambda: self.getInputSizeTetGen(inputModel.GetPolyData()))
+    elif inputSegmentation and segmentIds:
+      # Segment surfaces are only created when meshing starts, therefore size is estimated from the segments
+      inputSize = self.getCachedCostEstimateInput(("inputSizeTetGenFromSegmentation", inputSegmentation.GetID(), tuple(segmentIds),
+        self.getSegmentationModifiedTime(inputSegmentation, segmentIds),
+        inputSegmentation.GetSegmentation().GetConversionParameter("Decimation factor")),
+        lambda: self.getInputSizeTetGenFromSegmentation(inputSegmentation, segmentIds))
+    return self.estimateCost(method, inputSize, parameters)
+
+  def createMeshUsingParameterNode(self, parameterNode, segments=None):
+    """Create mesh using inputs, outputs, and parameters stored in the parameter node.
+    If segments are not specified then segments selected in the parameter node are meshed
+    (or all segments of the input segmentation, if none of the selected segments are in the segmentation).
+    This can be used for running the meshing in batch mode (for example, after applying a preset).
+    """
+    self.setDefaultParameters(parameterNode)
+    method = self.getMethodFromParameterNode(parameterNode)
+    parameters = self.getMesherParametersFromParameterNode(parameterNode)
+    inputSegmentation = parameterNode.GetNodeReference("InputSegmentation")
+    outputMeshNode = parameterNode.GetNodeReference("OutputModel")
+    sizingFieldVolumeNode = parameterNode.GetNodeReference("SizingField")
+    optimizationIterations = int(parameterNode.GetParameter("optimizationIterations"))
+    if not outputMeshNode:
+      raise ValueError("Output model is not specified")
+    if segments is None and inputSegmentation:
+      segments = (self.getExistingSegmentIds(inputSegmentation, self.getSelectedSegmentIds(parameterNode))
+        or list(inputSegmentation.GetSegmentation().GetSegmentIDs()))
+    self.setResourceLimitsFromParameterNode(parameterNode)
+    self.setBackendFromParameterNode(parameterNode)
+    if method == METHOD_CLEAVER:
+      materialFieldTypes = {"Indicator functions": CLEAVER_MATERIAL_FIELD_INDICATOR, "Signed distance": CLEAVER_MATERIAL_FIELD_DISTANCE}
+      self.createMeshWithResourceLimits(method, parameters, lambda p: self.createMeshFromSegmentationCleaver(inputSegmentation, outputMeshNode, segments,
+        parameterNode.GetParameter("cleaverAdditionalParameters"), parameterNode.GetParameter("cleaverRemoveBackgroundMesh") == "true",
+        p["paddingRatio"], p["featureScale"], p["samplingRate"], p["rateOfChange"],
+        sizingFieldVolumeNode, materialFieldTypes.get(parameterNode.GetParameter("cleaverMaterialFieldType"), CLEAVER_MATERIAL_FIELD_LABELMAP),
+        optimizationIterations, p["inputDownsamplingFactor"]))
+    elif parameterNode.GetParameter("tetgenRefineOutputMesh") == "true":
+      inputMesh = outputMeshNode.GetUnstructuredGrid()
+      refinementRegionNode = parameterNode.GetNodeReference("RefinementRegion")
+      elementVolumeConstraints = None
+      if refinementRegionNode:
+        elementVolumeConstraints = self.getElementVolumeConstraintsInRegion(outputMeshNode,
+          float(parameterNode.GetParameter("tetgenRefinementRegionVolumeParameter")), refinementRegionNode)
+      # The input mesh is refined as is, only the volume and quality constraints are relaxed on retry
+      del parameters["inputDownsamplingFactor"]
+      self.createMeshWithResourceLimits(method, parameters, lambda p: self.refineMeshTetGen(inputMesh, outputMeshNode,
+        parameterNode.GetParameter("tetGenAdditionalParameters"), p["ratio"], p["angle"], p["volume"], elementVolumeConstraints))
+    elif parameterNode.GetParameter("tetgenUseSurface") == "true":
+      inputSurfaceNode = parameterNode.GetNodeReference("InputSurface")
+      self.createMeshWithResourceLimits(method, parameters, lambda p: self.createMeshFromPolyDataTetGen(
+        inputSurfaceNode.GetPolyData(), outputMeshNode,
+        parameterNode.GetParameter("tetGenAdditionalParameters"), p["ratio"], p["angle"], p["volume"],
+        sizingFieldVolumeNode, optimizationIterations, inputSurfaceNode.GetParentTransformNode(), p["inputDownsamplingFactor"]))
+    else:
+      self.createMeshWithResourceLimits(method, parameters, lambda p: self.createMeshFromSegmentationTetGen(inputSegmentation, outputMeshNode, segments,
+        parameterNode.GetParameter("tetGenAdditionalParameters"), p["ratio"], p["angle"], p["volume"],
+        sizingFieldVolumeNode, optimizationIterations, p["inputDownsamplingFactor"]))
+
   def getTempDirectoryBase(self):
     tempDir = qt.QDir(slicer.app.temporaryPath)
     fileInfo = qt.QFileInfo(qt.QDir(tempDir), "SegmentMesher")
@@ -649,26 +1681,311 @@ class SegmentMesherLogic(ScriptedLoadableModuleLogic):
     fileInfo = qt.QFileInfo(qt.QDir(tempDir), tempDirName)
     dirPath = fileInfo.absoluteFilePath()
     qt.QDir().mkpath(dirPath)
+    if self.attemptTempDirectories is not None:
+      self.attemptTempDirectories.append(dirPath)
     return dirPath
 
+  def resampleVolumeToReferenceGeometry(self, inputVolumeNode, referenceVolumeNode, outputVolumeNode):
+    """Resample a scalar volume to the voxel grid of a reference volume (using linear interpolation).
+    Regions that are outside of the input volume are filled with the maximum value of the input volume.
+    """
+    referenceIjkToRas = vtk.vtkMatrix4x4()
+    referenceVolumeNode.GetIJKToRASMatrix(referenceIjkToRas)
+    inputRasToIjk = vtk.vtkMatrix4x4()
+    inputVolumeNode.GetRASToIJKMatrix(inputRasToIjk)
+    referenceToInputTransform = vtk.vtkGeneralTransform()
+    slicer.vtkMRMLTransformNode.GetTransformBetweenNodes(referenceVolumeNode.GetParentTransformNode(),
+      inputVolumeNode.GetParentTransformNode(), referenceToInputTransform)
+
+    # Transform from reference voxel coordinates to input voxel coordinates
+    resliceTransform = vtk.vtkGeneralTransform()
+    resliceTransform.PostMultiply()
+    resliceTransform.Concatenate(referenceIjkToRas)
+    resliceTransform.Concatenate(referenceToInputTransform)
+    resliceTransform.Concatenate(inputRasToIjk)
+
+    inputImage = inputVolumeNode.GetImageData()
+    reslice = vtk.vtkImageReslice()
+    reslice.SetInputData(inputImage)
+    reslice.SetResliceTransform(resliceTransform)
+    reslice.SetInterpolationModeToLinear()
+    reslice.SetOutputScalarType(vtk.VTK_FLOAT)
+    reslice.SetBackgroundLevel(inputImage.GetScalarRange()[1])
+    reslice.SetOutputOrigin(0, 0, 0)
+    reslice.SetOutputSpacing(1, 1, 1)
+    reslice.SetOutputExtent(referenceVolumeNode.GetImageData().GetExtent())
+    reslice.Update()
+
+    outputVolumeNode.SetAndObserveImageData(reslice.GetOutput())
+    outputVolumeNode.SetIJKToRASMatrix(referenceIjkToRas)
+    outputVolumeNode.SetAndObserveTransformNodeID(referenceVolumeNode.GetTransformNodeID())
+
+  def createSizingFieldFromSegmentation(self, inputSegmentation, segments = [], minimumSize = 1.0, maximumSize = 10.0, rateOfChange = 0.2, outputVolumeNode = None):
+    """Create a sizing field volume from segment boundaries. Element size is minimumSize at
+    boundaries between segments and grows with the distance from the closest boundary (by rateOfChange mm/mm),
+    up to maximumSize. Sizes are specified in mm. The created volume can be used as sizing field input for
+    createMeshFromSegmentationCleaver and createMeshFromPolyDataTetGen.
+    """
+    import numpy as np
+
+    segmentIdList = vtk.vtkStringArray()
+    for segment in segments:
+      segmentIdList.InsertNextValue(segment)
+    if segmentIdList.GetNumberOfValues() == 0:
+      raise ValueError("No input segments are selected, sizing field cannot be computed")
+
+    if not inputSegmentation.GetSegmentation().CreateRepresentation(slicer.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName()):
+      raise ValueError("Failed to create binary labelmap representation")
+
+    labelmapVolumeNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLLabelMapVolumeNode')
+    parentTransformNode = inputSegmentation.GetParentTransformNode()
+    labelmapVolumeNode.SetAndObserveTransformNodeID(parentTransformNode.GetID() if parentTransformNode else None)
+    referenceGeometry_Segmentation = slicer.vtkOrientedImageData()
+    inputSegmentation.GetSegmentation().SetImageGeometryFromCommonLabelmapGeometry(referenceGeometry_Segmentation, None,
+      slicer.vtkSegmentation.EXTENT_REFERENCE_GEOMETRY)
+    slicer.modules.segmentations.logic().CopyOrientedImageDataToVolumeNode(referenceGeometry_Segmentation, labelmapVolumeNode)
+    slicer.modules.segmentations.logic().ExportSegmentsToLabelmapNode(inputSegmentation, segmentIdList, labelmapVolumeNode, labelmapVolumeNode)
+    labels = slicer.util.arrayFromVolume(labelmapVolumeNode)
+
+    # Voxels where the label differs from any of the face neighbors
+    boundary = np.zeros(labels.shape, dtype=bool)
+    for axis in range(3):
+      front = [slice(None)] * 3
+      back = [slice(None)] * 3
+      front[axis] = slice(1, None)
+      back[axis] = slice(None, -1)
+      different = labels[tuple(front)] != labels[tuple(back)]
+      boundary[tuple(front)] |= different
+      boundary[tuple(back)] |= different
+
+    distance = self.computeDistanceMap(boundary, labelmapVolumeNode.GetSpacing())
+    sizes = np.clip(minimumSize + rateOfChange * distance, minimumSize, maximumSize).astype(np.float32)
+
+    if outputVolumeNode is None:
+      outputVolumeNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLScalarVolumeNode', slicer.mrmlScene.GenerateUniqueName("SizingField"))
+    slicer.util.updateVolumeFromArray(outputVolumeNode, sizes)
+    outputVolumeNode.CopyOrientation(labelmapVolumeNode)
+    outputVolumeNode.SetAndObserveTransformNodeID(labelmapVolumeNode.GetTransformNodeID())
+
+    colorTableNode = labelmapVolumeNode.GetDisplayNode().GetColorNode()
+    slicer.mrmlScene.RemoveNode(labelmapVolumeNode)
+    slicer.mrmlScene.RemoveNode(colorTableNode)
+
+    return outputVolumeNode
+
+  def computeDistanceMap(self, featureMask, spacing):
+    """Compute distance of each voxel from the closest voxel where featureMask is True.
+    featureMask is a numpy array indexed as [k, j, i], distance is computed in physical units (using spacing).
+    """
+    import numpy as np
+    from vtk.util import numpy_support
+    distanceInput = vtk.vtkImageData()
+    distanceInput.SetDimensions(featureMask.shape[2], featureMask.shape[1], featureMask.shape[0])
+    distanceInput.SetSpacing(spacing)
+    # vtkImageEuclideanDistance computes distance from zero-valued voxels
+    distanceInput.GetPointData().SetScalars(numpy_support.numpy_to_vtk((~featureMask).astype(np.uint8).ravel(), deep=True))
+    distanceFilter = vtk.vtkImageEuclideanDistance()
+    distanceFilter.SetInputData(distanceInput)
+    distanceFilter.ConsiderAnisotropyOn()
+    distanceFilter.Update()
+    squaredDistance = numpy_support.vtk_to_numpy(distanceFilter.GetOutput().GetPointData().GetScalars()).reshape(featureMask.shape)
+    return np.sqrt(squaredDistance)
+
+  def computeSignedDistanceMap(self, insideMask, spacing):
+    """Compute signed distance from the boundary of a binary mask (positive inside, negative outside).
+    """
+    import numpy as np
+    if not insideMask.any() or insideMask.all():
+      # There is no boundary, return a value that is larger than any distance within the volume
+      maximumDistance = np.linalg.norm(np.array(insideMask.shape[::-1]) * np.array(spacing))
+      return np.full(insideMask.shape, maximumDistance if insideMask.all() else -maximumDistance, dtype=np.float32)
+    return (self.computeDistanceMap(~insideMask, spacing) - self.computeDistanceMap(insideMask, spacing)).astype(np.float32)
+
+  def exportSegmentMaterialFields(self, inputSegmentation, segmentIds, referenceVolumeNode, outputDirectory, materialFieldType):
+    """Write one material field for the background and one for each segment as NRRD files, on the voxel grid
+    of the reference volume. Material fields are computed in parallel for all segments, in a thread pool.
+    This relies on the computation releasing the GIL: Slicer's VTK is built with VTK_PYTHON_FULL_THREADSAFE,
+    which releases it during resampling and distance map filter updates, and numpy releases it during array operations.
+    If VTK keeps the GIL then the results are the same, but the segments are effectively computed one at a time.
+    Returns the list of written file paths (background first, then segments in the order of segmentIds),
+    therefore material index in the Cleaver output matches the label value in a merged labelmap.
+    """
+    import collections
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+    from vtk.util import numpy_support
+
+    ijkToRasMatrix = vtk.vtkMatrix4x4()
+    referenceVolumeNode.GetIJKToRASMatrix(ijkToRasMatrix)
+    extent = referenceVolumeNode.GetImageData().GetExtent()
+    referenceGeometry = slicer.vtkOrientedImageData()
+    referenceGeometry.SetExtent(extent)
+    referenceGeometry.SetImageToWorldMatrix(ijkToRasMatrix)
+    shape = (extent[5] - extent[4] + 1, extent[3] - extent[2] + 1, extent[1] - extent[0] + 1)
+    spacing = referenceVolumeNode.GetSpacing()
+
+    def computeMaterialField(segmentLabelmap):
+      resampledSegmentLabelmap = slicer.vtkOrientedImageData()
+      slicer.vtkOrientedImageDataResample.ResampleOrientedImageToReferenceOrientedImage(segmentLabelmap, referenceGeometry, resampledSegmentLabelmap, False, True)
+      insideMask = numpy_support.vtk_to_numpy(resampledSegmentLabelmap.GetPointData().GetScalars()).reshape(shape) > 0
+      if materialFieldType == CLEAVER_MATERIAL_FIELD_DISTANCE:
+        return self.computeSignedDistanceMap(insideMask, spacing)
+      else:
+        return insideMask.astype(np.float32)
+
+    materialFieldFilePaths = [os.path.join(outputDirectory, "material{0}.nrrd".format(materialIndex)) for materialIndex in range(len(segmentIds) + 1)]
+    fieldVolumeNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLScalarVolumeNode')
+    fieldVolumeNode.CopyOrientation(referenceVolumeNode)
+    maximumSegmentField = None
+
+    def writeMaterialField(segmentIndex, segmentField):
+      nonlocal maximumSegmentField
+      if maximumSegmentField is None:
+        maximumSegmentField = segmentField.copy()
+      else:
+        np.maximum(maximumSegmentField, segmentField, out=maximumSegmentField)
+      slicer.util.updateVolumeFromArray(fieldVolumeNode, segmentField)
+      slicer.util.saveNode(fieldVolumeNode, materialFieldFilePaths[segmentIndex + 1], {"useCompression": False})
+      slicer.app.processEvents()  # give a chance to click Cancel button
+
+    # Segments must be accessed on the main thread, only the computation is performed in parallel.
+    # Only a few segments are processed at a time and each field is written and released as soon as it is computed,
+    # therefore memory usage does not grow with the number of segments.
+    maximumNumberOfPendingFields = os.cpu_count() or 1
+    pendingFields = collections.deque()
+    with ThreadPoolExecutor(max_workers=maximumNumberOfPendingFields) as executor:
+      for segmentIndex, segmentId in enumerate(segmentIds):
+        if len(pendingFields) >= maximumNumberOfPendingFields:
+          pendingSegmentIndex, pendingField = pendingFields.popleft()
+          writeMaterialField(pendingSegmentIndex, pendingField.result())
+        segmentLabelmap = slicer.vtkOrientedImageData()
+        slicer.vtkSlicerSegmentationsModuleLogic.GetSegmentBinaryLabelmapRepresentation(inputSegmentation, segmentId, segmentLabelmap, False)
+        pendingFields.append((segmentIndex, executor.submit(computeMaterialField, segmentLabelmap)))
+      while pendingFields:
+        pendingSegmentIndex, pendingField = pendingFields.popleft()
+        writeMaterialField(pendingSegmentIndex, pendingField.result())
+
+    # Background is where none of the segments are
+    if materialFieldType == CLEAVER_MATERIAL_FIELD_DISTANCE:
+      backgroundField = -maximumSegmentField
+    else:
+      backgroundField = 1.0 - maximumSegmentField
+    slicer.util.updateVolumeFromArray(fieldVolumeNode, backgroundField)
+    slicer.util.saveNode(fieldVolumeNode, materialFieldFilePaths[0], {"useCompression": False})
+
+    slicer.mrmlScene.RemoveNode(fieldVolumeNode.GetStorageNode())
+    slicer.mrmlScene.RemoveNode(fieldVolumeNode.GetDisplayNode())
+    slicer.mrmlScene.RemoveNode(fieldVolumeNode)
+    return materialFieldFilePaths
+
+  def createSegmentsColorTable(self, inputSegmentation, segmentIds):
+    """Create a color table (not added to the scene) that contains background and segment colors and names,
+    in the same order as in a merged labelmap.
+    """
+    colorTableNode = slicer.vtkMRMLColorTableNode()
+    colorTableNode.SetName(inputSegmentation.GetName() + "_ColorTable")
+    colorTableNode.SetTypeToUser()
+    colorTableNode.SetNumberOfColors(len(segmentIds) + 1)
+    colorTableNode.GetLookupTable().SetTableRange(0, len(segmentIds))
+    colorTableNode.SetColor(0, "Background", 0.0, 0.0, 0.0, 0.0)
+    for segmentIndex, segmentId in enumerate(segmentIds):
+      segment = inputSegmentation.GetSegmentation().GetSegment(segmentId)
+      color = segment.GetColor()
+      colorTableNode.SetColor(segmentIndex + 1, segment.GetName(), color[0], color[1], color[2], 1.0)
+    return colorTableNode
+
+  def getIjkToLocalMatrix(self, volumeNode, localTransformNode=None):
+    """Get transformation matrix from voxel coordinates of a volume to the local coordinate system of nodes
+    that are under localTransformNode (world coordinate system if localTransformNode is None), as a numpy array.
+    """
+    import numpy as np
+    ijkToRasMatrix = vtk.vtkMatrix4x4()
+    volumeNode.GetIJKToRASMatrix(ijkToRasMatrix)
+    rasToLocalMatrix = vtk.vtkMatrix4x4()
+    if not slicer.vtkMRMLTransformNode.GetMatrixTransformBetweenNodes(volumeNode.GetParentTransformNode(), localTransformNode, rasToLocalMatrix):
+      raise ValueError("Volume {0} and the mesh must not be under a non-linear transform".format(volumeNode.GetName()))
+    ijkToLocalMatrix = vtk.vtkMatrix4x4()
+    vtk.vtkMatrix4x4.Multiply4x4(rasToLocalMatrix, ijkToRasMatrix, ijkToLocalMatrix)
+    return np.array([[ijkToLocalMatrix.GetElement(row, column) for column in range(4)] for row in range(4)])
+
+  def writeTetGenBackgroundMesh(self, sizingFieldVolumeNode, fileBasePath, maximumNumberOfNodesPerAxis = 40, inputTransformNode = None):
+    """Write sizing field as TetGen background mesh (.b.node, .b.ele, .b.mtr files).
+    The volume is subsampled to a regular grid of at most maximumNumberOfNodesPerAxis nodes along each axis
+    and each grid cell is split into 6 tetrahedra.
+    inputTransformNode: parent transform of the TetGen input surface. Nodes are written in the local coordinate system
+    of the input surface so that the background mesh overlaps the input even if either of them is transformed.
+    """
+    import numpy as np
+
+    sizes = slicer.util.arrayFromVolume(sizingFieldVolumeNode)  # indexed as [k, j, i]
+    step = max(1, int(np.ceil(max(sizes.shape) / float(maximumNumberOfNodesPerAxis))))
+    # Always include the last slice so that the background mesh covers the entire volume
+    kIndices, jIndices, iIndices = [np.unique(np.r_[np.arange(0, axisSize, step), axisSize - 1]) for axisSize in sizes.shape]
+    numberOfNodesK, numberOfNodesJ, numberOfNodesI = len(kIndices), len(jIndices), len(iIndices)
+    if min(numberOfNodesK, numberOfNodesJ, numberOfNodesI) < 2:
+      raise ValueError("Sizing field volume must have at least 2 voxels along each axis")
+    nodeSizes = sizes[np.ix_(kIndices, jIndices, iIndices)].astype(np.float64).ravel()
+    # TetGen requires positive element sizes
+    nodeSizes = np.maximum(nodeSizes, 1e-3)
+
+    # Node positions in the coordinate system of the input surface
+    kk, jj, ii = np.meshgrid(kIndices, jIndices, iIndices, indexing='ij')
+    nodesIjk = np.column_stack((ii.ravel(), jj.ravel(), kk.ravel(), np.ones(ii.size)))
+    nodesLocal = nodesIjk.dot(self.getIjkToLocalMatrix(sizingFieldVolumeNode, inputTransformNode).T)[:, :3]
+
+    # Split each grid cell into 6 tetrahedra (Kuhn subdivision, which is conforming between neighbor cells)
+    cellK, cellJ, cellI = np.meshgrid(np.arange(numberOfNodesK - 1), np.arange(numberOfNodesJ - 1), np.arange(numberOfNodesI - 1), indexing='ij')
+    cellBaseNodes = ((cellK * numberOfNodesJ + cellJ) * numberOfNodesI + cellI).ravel()
+    strideI, strideJ, strideK = 1, numberOfNodesI, numberOfNodesI * numberOfNodesJ
+    tetrahedra = []
+    for first, second, third in [(strideI, strideJ, strideK), (strideI, strideK, strideJ), (strideJ, strideI, strideK),
+                                 (strideJ, strideK, strideI), (strideK, strideI, strideJ), (strideK, strideJ, strideI)]:
+      tetrahedra.append(np.column_stack((cellBaseNodes, cellBaseNodes + first, cellBaseNodes + first + second,
+        cellBaseNodes + first + second + third)))
+    tetrahedra = np.vstack(tetrahedra)
+    # Make all tetrahedra positively oriented
+    edges = nodesLocal[tetrahedra[:, 1:]] - nodesLocal[tetrahedra[:, :1]]
+    inverted = np.einsum('ij,ij->i', np.cross(edges[:, 0], edges[:, 1]), edges[:, 2]) < 0
+    tetrahedra[inverted] = tetrahedra[inverted][:, [0, 1, 3, 2]]
+
+    # Write files (indices are 1-based)
+    numberOfNodes = len(nodesLocal)
+    with open(fileBasePath + ".node", "w") as nodeFile:
+      nodeFile.write("{0} 3 0 0\n".format(numberOfNodes))
+      np.savetxt(nodeFile, np.column_stack((np.arange(1, numberOfNodes + 1), nodesLocal)), fmt="%d %.6f %.6f %.6f")
+    with open(fileBasePath + ".ele", "w") as elementFile:
+      elementFile.write("{0} 4 0\n".format(len(tetrahedra)))
+      np.savetxt(elementFile, np.column_stack((np.arange(1, len(tetrahedra) + 1), tetrahedra + 1)), fmt="%d")
+    with open(fileBasePath + ".mtr", "w") as metricFile:
+      metricFile.write("{0} 1\n".format(numberOfNodes))
+      np.savetxt(metricFile, nodeSizes, fmt="%.6f")
+
   def createMeshFromSegmentationCleaver(self, inputSegmentation, outputMeshNode, segments = [], additionalParameters = None, removeBackgroundMesh = False,
-    paddingRatio = 0.10, featureScale = 2, samplingRate=0.2, rateOfChange=0.2):
+    paddingRatio = 0.10, featureScale = 2, samplingRate=0.2, rateOfChange=0.2, sizingFieldVolumeNode = None, materialFieldType = None,
+    optimizationIterations = 0, inputDownsamplingFactor = 1.0):
+    """Create volumetric mesh from segments using Cleaver.
+    materialFieldType: CLEAVER_MATERIAL_FIELD_LABELMAP (default) passes all segments to Cleaver in a single merged labelmap,
+    CLEAVER_MATERIAL_FIELD_INDICATOR or CLEAVER_MATERIAL_FIELD_DISTANCE passes a separate material field for each segment.
+    inputDownsamplingFactor: if larger than 1 then the input labelmap spacing is increased by this factor.
+    optimizationIterations: if larger than 0 then the generated mesh is optimized (see optimizeMesh).
+    """
 
     if additionalParameters is None:
       additionalParameters=""
 
+    if materialFieldType is None:
+      materialFieldType = CLEAVER_MATERIAL_FIELD_LABELMAP
+
 
     self.abortRequested = False
     tempDir = self.createTempDirectory()
     self.addLog('Mesh generation using Cleaver is started in working directory: '+tempDir)
 
-    inputParamsCleaver = []
-
     # Write inputs
     qt.QDir().mkpath(tempDir)
 
     # Create temporary labelmap node. It will be used both for storing reference geometry
-    # and resulting merged labelmap.
+    # and resulting merged labelmap (if merged labelmap is used as input).
     labelmapVolumeNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLLabelMapVolumeNode')
     parentTransformNode  = inputSegmentation.GetParentTransformNode()
     labelmapVolumeNode.SetAndObserveTransformNodeID(parentTransformNode.GetID() if parentTransformNode else None)
@@ -682,6 +1999,8 @@ class SegmentMesherLogic(ScriptedLoadableModuleLogic):
     referenceGeometry_Segmentation = slicer.vtkOrientedImageData()
     inputSegmentation.GetSegmentation().SetImageGeometryFromCommonLabelmapGeometry(referenceGeometry_Segmentation, None,
       slicer.vtkSegmentation.EXTENT_REFERENCE_GEOMETRY)
+    if inputDownsamplingFactor > 1.0:
+      self.downsampleImageGeometry(referenceGeometry_Segmentation, inputDownsamplingFactor)
     slicer.modules.segmentations.logic().CopyOrientedImageDataToVolumeNode(referenceGeometry_Segmentation, labelmapVolumeNode)
 
     # Add margin
@@ -693,6 +2012,8 @@ class SegmentMesherLogic(ScriptedLoadableModuleLogic):
       paddedExtent[axisIndex * 2 + 1] = extent[axisIndex * 2 + 1] + paddingSizeVoxels
     labelmapVolumeNode.GetImageData().SetExtent(paddedExtent)
     labelmapVolumeNode.ShiftImageDataExtentToZeroStart()
+    dimensions = labelmapVolumeNode.GetImageData().GetDimensions()
+    inputSize = [dimensions[0] * dimensions[1] * dimensions[2]]
 
     # Get merged labelmap
     segmentIdList = vtk.vtkStringArray()
@@ -704,12 +2025,37 @@ class SegmentMesherLogic(ScriptedLoadableModuleLogic):
       self.addLog("No input segments are selected, therefore no output is generated.")
       return
 
-    slicer.modules.segmentations.logic().ExportSegmentsToLabelmapNode(inputSegmentation, segmentIdList, labelmapVolumeNode, labelmapVolumeNode)
+    if materialFieldType == CLEAVER_MATERIAL_FIELD_LABELMAP:
+      slicer.modules.segmentations.logic().ExportSegmentsToLabelmapNode(inputSegmentation, segmentIdList, labelmapVolumeNode, labelmapVolumeNode)
 
+      inputLabelmapVolumeFilePath = os.path.join(tempDir, "inputLabelmap.nrrd")
+      slicer.util.saveNode(labelmapVolumeNode, inputLabelmapVolumeFilePath, {"useCompression": False})
+      inputFilePaths = [inputLabelmapVolumeFilePath]
+      numberOfMaterialFields = 1
 
-    inputLabelmapVolumeFilePath = os.path.join(tempDir, "inputLabelmap.nrrd")
-    slicer.util.saveNode(labelmapVolumeNode, inputLabelmapVolumeFilePath, {"useCompression": False})
-    inputParamsCleaver.extend(["--input_files", inputLabelmapVolumeFilePath])
+      # Keep color node, we'll need it later
+      colorTableNode = labelmapVolumeNode.GetDisplayNode().GetColorNode()
+      slicer.mrmlScene.RemoveNode(colorTableNode)
+    else:
+      segmentIds = [segmentIdList.GetValue(index) for index in range(segmentIdList.GetNumberOfValues())]
+      inputFilePaths = self.exportSegmentMaterialFields(inputSegmentation, segmentIds, labelmapVolumeNode, tempDir, materialFieldType)
+      numberOfMaterialFields = len(inputFilePaths)
+      colorTableNode = self.createSegmentsColorTable(inputSegmentation, segmentIds)
+      # Remove color table that may have been created for the temporary labelmap (shared default color tables are kept)
+      labelmapDisplayNode = labelmapVolumeNode.GetDisplayNode()
+      labelmapColorTableNode = labelmapDisplayNode.GetColorNode() if labelmapDisplayNode else None
+      if labelmapColorTableNode and labelmapColorTableNode.GetType() == labelmapColorTableNode.User:
+        slicer.mrmlScene.RemoveNode(labelmapColorTableNode)
+
+    sizingFieldFilePath = None
+    if sizingFieldVolumeNode:
+      # Cleaver requires the sizing field on the same voxel grid as the input labelmap
+      resampledSizingFieldNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLScalarVolumeNode')
+      self.resampleVolumeToReferenceGeometry(sizingFieldVolumeNode, labelmapVolumeNode, resampledSizingFieldNode)
+      sizingFieldFilePath = os.path.join(tempDir, "sizingField.nrrd")
+      slicer.util.saveNode(resampledSizingFieldNode, sizingFieldFilePath, {"useCompression": False})
+      slicer.mrmlScene.RemoveNode(resampledSizingFieldNode.GetStorageNode())
+      slicer.mrmlScene.RemoveNode(resampledSizingFieldNode)
 
     # Keep IJK to RAS matrix, we'll need it later
     unscaledIjkToRasMatrix = vtk.vtkMatrix4x4()
@@ -720,35 +2066,16 @@ class SegmentMesherLogic(ScriptedLoadableModuleLogic):
     for i in range(3):
       unscaledIjkToRasMatrix.SetElement(i,3, origin[i])
 
-    # Keep color node, we'll need it later
-    colorTableNode = labelmapVolumeNode.GetDisplayNode().GetColorNode()
     # Background color is transparent by default which is not ideal for 3D display
     colorTableNode.SetColor(0,0.6,0.6,0.6,1.0)
 
     slicer.mrmlScene.RemoveNode(labelmapVolumeNode)
-    slicer.mrmlScene.RemoveNode(colorTableNode)
 
-    #User set parameters
-    inputParamsCleaver.extend(["--feature_scaling", "{:.2f}".format(featureScale)])
-    inputParamsCleaver.extend(["--sampling_rate", "{:.2f}".format(samplingRate)])
-    inputParamsCleaver.extend(["--lipschitz", "{:.2f}".format(rateOfChange)])
-
-    # Set up output format
-
-    inputParamsCleaver.extend(["--output_path", tempDir+"/"])
-    inputParamsCleaver.extend(["--output_format", "vtkUSG"]) # VTK unstructed grid
-    inputParamsCleaver.append("--fix_tet_windup") # prevent inside-out tets
-    inputParamsCleaver.append("--strip_exterior") # remove temporary elements that are added to make the volume cubic
-
-    inputParamsCleaver.append("--verbose")
-
-    # Quality
-    if additionalParameters:
-      inputParamsCleaver.extend(additionalParameters.split(' '))
+    inputParamsCleaver = self.getCleaverArguments(inputFilePaths, materialFieldType, tempDir, featureScale, samplingRate,
+      rateOfChange, sizingFieldFilePath, additionalParameters)
 
     # Run Cleaver
-    ep = self.startMesher(inputParamsCleaver, self.getCleaverPath())
-    self.logProcessOutput(ep, self.cleaverFilename)
+    self.runMesher(METHOD_CLEAVER, inputParamsCleaver, tempDir)
 
     # Read results
     if not self.abortRequested:
@@ -816,6 +2143,13 @@ class SegmentMesherLogic(ScriptedLoadableModuleLogic):
       outputMeshDisplayNode.SetClipping(not outputMeshDisplayNode.GetClipping())
       outputMeshDisplayNode.SetClipping(not outputMeshDisplayNode.GetClipping())
 
+      self.recordRun(METHOD_CLEAVER, inputSize, {"featureScale": featureScale, "samplingRate": samplingRate, "rateOfChange": rateOfChange,
+        "numberOfMaterialFields": numberOfMaterialFields, "sizingFieldDensity": self.getSizingFieldDensity(sizingFieldVolumeNode)},
+        outputMeshNode.GetMesh().GetNumberOfCells())
+
+      if optimizationIterations > 0:
+        self.optimizeOutputMesh(outputMeshNode, optimizationIterations)
+
     # Clean up
     if self.deleteTemporaryFiles:
       import shutil
@@ -823,7 +2157,59 @@ class SegmentMesherLogic(ScriptedLoadableModuleLogic):
 
     self.addLog("Model generation is completed")
 
-  def createMeshFromSegmentationTetGen(self, inputSegmentation, outputMeshNode, segments = [], additionalParameters="", ratio=5, angle=0, volume=10):
+  def downsampleImageGeometry(self, imageGeometry, downsamplingFactor):
+    """Increase voxel spacing of an image geometry (vtkOrientedImageData) by downsamplingFactor along each axis.
+    The new voxel grid covers the same region, with the same axis directions. Voxel values are not resampled.
+    """
+    import math
+    extent = imageGeometry.GetExtent()
+    if extent[0] > extent[1] or extent[2] > extent[3] or extent[4] > extent[5]:
+      return
+    imageToWorldMatrix = vtk.vtkMatrix4x4()
+    imageGeometry.GetImageToWorldMatrix(imageToWorldMatrix)
+    # The new grid starts at the corner of the first voxel of the current grid
+    firstVoxelCenter = imageToWorldMatrix.MultiplyPoint([extent[axisIndex * 2] - 0.5 + downsamplingFactor / 2.0 for axisIndex in range(3)] + [1.0])
+    downsampledExtent = [0, -1, 0, -1, 0, -1]
+    for axisIndex in range(3):
+      numberOfVoxels = extent[axisIndex * 2 + 1] - extent[axisIndex * 2] + 1
+      downsampledExtent[axisIndex * 2 + 1] = max(1, int(math.ceil(numberOfVoxels / downsamplingFactor))) - 1
+    imageGeometry.SetSpacing([spacing * downsamplingFactor for spacing in imageGeometry.GetSpacing()])
+    imageGeometry.SetOrigin(firstVoxelCenter[:3])
+    imageGeometry.SetExtent(downsampledExtent)
+
+  def getCleaverArguments(self, inputFilePaths, materialFieldType, outputDirectory, featureScale, samplingRate, rateOfChange,
+    sizingFieldFilePath=None, additionalParameters=""):
+    """Get Cleaver command-line arguments.
+    inputFilePaths: merged labelmap file path (CLEAVER_MATERIAL_FIELD_LABELMAP) or material field file paths
+    (background first, then one for each segment).
+    """
+    inputParamsCleaver = ["--input_files"] + list(inputFilePaths)
+    if materialFieldType != CLEAVER_MATERIAL_FIELD_LABELMAP:
+      inputParamsCleaver.append("--indicator_functions")
+    if sizingFieldFilePath:
+      inputParamsCleaver.extend(["--sizing_field", sizingFieldFilePath])
+
+    #User set parameters
+    inputParamsCleaver.extend(["--feature_scaling", "{:.2f}".format(featureScale)])
+    inputParamsCleaver.extend(["--sampling_rate", "{:.2f}".format(samplingRate)])
+    inputParamsCleaver.extend(["--lipschitz", "{:.2f}".format(rateOfChange)])
+
+    # Set up output format
+    inputParamsCleaver.extend(["--output_path", outputDirectory+"/"])
+    inputParamsCleaver.extend(["--output_format", "vtkUSG"]) # VTK unstructed grid
+    inputParamsCleaver.append("--fix_tet_windup") # prevent inside-out tets
+    inputParamsCleaver.append("--strip_exterior") # remove temporary elements that are added to make the volume cubic
+
+    inputParamsCleaver.append("--verbose")
+
+    # Quality
+    if additionalParameters:
+      inputParamsCleaver.extend(additionalParameters.split(' '))
+
+    return inputParamsCleaver
+
+  def createMeshFromSegmentationTetGen(self, inputSegmentation, outputMeshNode, segments = [], additionalParameters="", ratio=5, angle=0, volume=10,
+    sizingFieldVolumeNode = None, optimizationIterations = 0, inputDownsamplingFactor = 1.0):
 
     segmentIdList = vtk.vtkStringArray()
     for segment in segments:
@@ -832,31 +2218,190 @@ class SegmentMesherLogic(ScriptedLoadableModuleLogic):
     if segmentIdList.GetNumberOfValues() == 0:
       logging.info("createMeshFromSegmentationTetGen skipped: there are no selected segments")
       return
-    inputSegmentation.CreateClosedSurfaceRepresentation()
-    appender = vtk.vtkAppendPolyData()
-    for i in range(segmentIdList.GetNumberOfValues()):
-      segmentId = segmentIdList.GetValue(i)
 
-      #Use old function arguments for 4.10
-      if slicer.app.majorVersion == 4 and slicer.app.minorVersion < 11:
-        polydata = inputSegmentation.GetClosedSurfaceRepresentation(segmentId)
-      else:
-        polydata = vtk.vtkPolyData()
-        inputSegmentation.GetClosedSurfaceRepresentation(segmentId, polydata)
+    self.abortRequested = False
+    # Surfaces are appended in the order of segments, as soon as they are available
+    appender = vtk.vtkAppendPolyData()
+    segmentIds = [segmentIdList.GetValue(index) for index in range(segmentIdList.GetNumberOfValues())]
+    for segmentId, polydata in self.getSegmentClosedSurfaces(inputSegmentation, segmentIds):
       appender.AddInputData(polydata)
+      slicer.app.processEvents()  # give a chance to click Cancel button
+      if self.abortRequested:
+        raise ValueError("User requested cancel.")
 
     appender.Update()
-    self.createMeshFromPolyDataTetGen(appender.GetOutput(), outputMeshNode, additionalParameters, ratio, angle, volume)
+    self.createMeshFromPolyDataTetGen(appender.GetOutput(), outputMeshNode, additionalParameters, ratio, angle, volume, sizingFieldVolumeNode,
+      optimizationIterations, inputSegmentation.GetParentTransformNode(), inputDownsamplingFactor)
+
+  def getSegmentClosedSurfaces(self, inputSegmentation, segmentIds):
+    """Get closed surface of the specified segments. Yields (segmentId, polydata) pairs in the order of segmentIds,
+    each as soon as it is available.
+    If the segmentation already contains closed surface representation then that is used. Otherwise only the specified
+    segments are converted from binary labelmap, in parallel, without modifying the segmentation.
+    If the conversion parameters of the segmentation require processing all segments together (joint smoothing)
+    or a conversion method that is not implemented in convertLabelmapToClosedSurface, then all segments are converted
+    by the built-in converter, on a copy of the segmentation.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    segmentation = inputSegmentation.GetSegmentation()
+    closedSurfaceRepresentationName = slicer.vtkSegmentationConverter.GetSegmentationClosedSurfaceRepresentationName()
+
+    if segmentation.ContainsRepresentation(closedSurfaceRepresentationName):
+      for segmentId in segmentIds:
+        #Use old function arguments for 4.10
+        if slicer.app.majorVersion == 4 and slicer.app.minorVersion < 11:
+          polydata = inputSegmentation.GetClosedSurfaceRepresentation(segmentId)
+        else:
+          polydata = vtk.vtkPolyData()
+          inputSegmentation.GetClosedSurfaceRepresentation(segmentId, polydata)
+        yield segmentId, polydata
+      return
 
-    #Clean up representation
-    inputSegmentation.GetSegmentation().RemoveRepresentation(slicer.vtkSegmentationConverter().GetClosedSurfaceRepresentationName())
+    if not segmentation.CreateRepresentation(slicer.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName()):
+      raise ValueError("Failed to create binary labelmap representation")
 
-  def createMeshFromPolyDataTetGen(self, inputPolyData, outputMeshNode, additionalParameters="", ratio=5, angle=0, volume=10):
+    conversionParameters = self.getClosedSurfaceConversionParameters(segmentation)
+    if conversionParameters["jointSmoothing"] or conversionParameters["conversionMethod"] != 0:
+      segmentationCopy = slicer.vtkSegmentation()
+      segmentationCopy.DeepCopy(segmentation)
+      if not segmentationCopy.CreateRepresentation(closedSurfaceRepresentationName):
+        raise ValueError("Failed to create closed surface representation")
+      for segmentId in segmentIds:
+        polydata = vtk.vtkPolyData()
+        polydata.DeepCopy(segmentationCopy.GetSegment(segmentId).GetRepresentation(closedSurfaceRepresentationName))
+        yield segmentId, polydata
+      return
+
+    # Segments must be accessed on the main thread, only the conversion is performed in parallel
+    segmentLabelmaps = {}
+    for segmentId in segmentIds:
+      segmentLabelmap = slicer.vtkOrientedImageData()
+      slicer.vtkSlicerSegmentationsModuleLogic.GetSegmentBinaryLabelmapRepresentation(inputSegmentation, segmentId, segmentLabelmap, False)
+      segmentLabelmaps[segmentId] = segmentLabelmap
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+      futures = [(segmentId, executor.submit(self.convertLabelmapToClosedSurface, segmentLabelmaps[segmentId],
+        conversionParameters["decimationFactor"], conversionParameters["smoothingFactor"], conversionParameters["computeSurfaceNormals"]))
+        for segmentId in segmentIds]
+      try:
+        for segmentId, future in futures:
+          yield segmentId, future.result()
+      finally:
+        # If the caller stops early (for example, cancel is requested) then do not wait for the remaining conversions
+        for segmentId, future in futures:
+          future.cancel()
+
+  def getClosedSurfaceConversionParameters(self, segmentation):
+    """Get parameters that the segmentation uses for creating closed surface representation from binary labelmap,
+    as a dictionary (decimationFactor, smoothingFactor, computeSurfaceNormals, jointSmoothing, conversionMethod).
+    Default values of the conversion rule are used for parameters that are not set.
+    """
+    def getConversionParameter(name, defaultValue):
+      try:
+        return float(segmentation.GetConversionParameter(name))
+      except ValueError:
+        return defaultValue
+    return {
+      "decimationFactor": getConversionParameter("Decimation factor", 0.0),
+      "smoothingFactor": getConversionParameter("Smoothing factor", 0.5),
+      "computeSurfaceNormals": getConversionParameter("Compute surface normals", 1) != 0,
+      "jointSmoothing": getConversionParameter("Joint smoothing", 0) != 0,
+      # 0 = flying edges (or marching cubes), other methods (such as surface nets) are only available in the built-in converter
+      "conversionMethod": int(getConversionParameter("Conversion method", 0)),
+      }
+
+  def convertLabelmapToClosedSurface(self, labelmap, decimationFactor=0.0, smoothingFactor=0.5, computeSurfaceNormals=True):
+    """Create closed surface from a single binary labelmap (vtkOrientedImageData), using the same processing steps
+    as the segmentation binary labelmap to closed surface conversion rule (without joint smoothing).
+    It does not access the scene, therefore it can be called from any thread.
+    """
+    extent = labelmap.GetExtent()
+    if extent[0] > extent[1] or extent[2] > extent[3] or extent[4] > extent[5]:
+      return vtk.vtkPolyData()
+
+    imageToWorldMatrix = vtk.vtkMatrix4x4()
+    labelmap.GetImageToWorldMatrix(imageToWorldMatrix)
+
+    # Extract surface in voxel coordinates, it is transformed to world coordinates at the end
+    image = vtk.vtkImageData()
+    image.ShallowCopy(labelmap)
+    image.SetOrigin(0, 0, 0)
+    image.SetSpacing(1, 1, 1)
+
+    threshold = vtk.vtkImageThreshold()
+    threshold.SetInputData(image)
+    threshold.ThresholdByUpper(1)
+    threshold.SetInValue(1)
+    threshold.SetOutValue(0)
+    threshold.SetOutputScalarTypeToUnsignedChar()
+
+    # Pad by one voxel to make sure the surface is closed
+    padder = vtk.vtkImageConstantPad()
+    padder.SetInputConnection(threshold.GetOutputPort())
+    padder.SetOutputWholeExtent(extent[0] - 1, extent[1] + 1, extent[2] - 1, extent[3] + 1, extent[4] - 1, extent[5] + 1)
+    padder.SetConstant(0)
+
+    surfaceExtractor = vtk.vtkDiscreteFlyingEdges3D() if hasattr(vtk, 'vtkDiscreteFlyingEdges3D') else vtk.vtkDiscreteMarchingCubes()
+    surfaceExtractor.SetInputConnection(padder.GetOutputPort())
+    surfaceExtractor.SetValue(0, 1)
+    surfaceExtractor.ComputeNormalsOff()
+    lastFilter = surfaceExtractor
+
+    if decimationFactor > 0.0:
+      decimator = vtk.vtkDecimatePro()
+      decimator.SetInputConnection(lastFilter.GetOutputPort())
+      decimator.SetFeatureAngle(60)
+      decimator.SplittingOff()
+      decimator.PreserveTopologyOn()
+      decimator.SetMaximumError(1)
+      decimator.SetTargetReduction(decimationFactor)
+      lastFilter = decimator
+
+    if smoothingFactor > 0.0:
+      smoother = vtk.vtkWindowedSincPolyDataFilter()
+      smoother.SetInputConnection(lastFilter.GetOutputPort())
+      smoother.SetNumberOfIterations(20)
+      smoother.SetPassBand(pow(10.0, -4.0 * smoothingFactor))
+      smoother.BoundarySmoothingOff()
+      smoother.FeatureEdgeSmoothingOff()
+      smoother.NonManifoldSmoothingOn()
+      smoother.NormalizeCoordinatesOn()
+      lastFilter = smoother
+
+    imageToWorldTransform = vtk.vtkTransform()
+    imageToWorldTransform.SetMatrix(imageToWorldMatrix)
+    transformer = vtk.vtkTransformPolyDataFilter()
+    transformer.SetInputConnection(lastFilter.GetOutputPort())
+    transformer.SetTransform(imageToWorldTransform)
+
+    if not computeSurfaceNormals:
+      transformer.Update()
+      return transformer.GetOutput()
+
+    normals = vtk.vtkPolyDataNormals()
+    normals.SetInputConnection(transformer.GetOutputPort())
+    normals.ConsistencyOn()
+    normals.SplittingOff()
+    normals.Update()
+
+    return normals.GetOutput()
+
+  def createMeshFromPolyDataTetGen(self, inputPolyData, outputMeshNode, additionalParameters="", ratio=5, angle=0, volume=10,
+    sizingFieldVolumeNode = None, optimizationIterations = 0, inputTransformNode = None, inputDownsamplingFactor = 1.0):
+    """Create volumetric mesh from a closed surface using TetGen.
+    inputTransformNode: parent transform node of the input surface, used for aligning the sizing field with the input.
+    inputDownsamplingFactor: if larger than 1 then the input surface is decimated, as if its point spacing was increased
+    by this factor.
+    """
 
     self.abortRequested = False
     tempDir = self.createTempDirectory()
     self.addLog('Mesh generation is started in working directory: '+tempDir)
 
+    if inputDownsamplingFactor > 1.0:
+      # Number of surface points is inversely proportional to the square of the point spacing
+      inputPolyData = self.decimateSurface(inputPolyData, 1.0 - 1.0 / inputDownsamplingFactor**2)
+
     # Write inputs
     qt.QDir().mkpath(tempDir)
 
@@ -870,36 +2415,26 @@ class SegmentMesherLogic(ScriptedLoadableModuleLogic):
     #Command line for quality parameters
     parameters = 'q'+"{:.2f}".format(ratio)+'/'+"{:.2f}".format(angle)+'a'+"{:.2f}".format(volume)
 
+    if sizingFieldVolumeNode:
+      # TetGen reads the background mesh from files named as the input file, with ".b" suffix
+      self.writeTetGenBackgroundMesh(sizingFieldVolumeNode, os.path.join(tempDir, "mesh.b"), inputTransformNode=inputTransformNode)
+      parameters += 'm'
+
     inputParamsTetGen = []
     inputParamsTetGen.append("-k"+parameters+additionalParameters)
     inputParamsTetGen.append(inputSurfaceMeshFilePath)
 
     # Run tetgen
-    ep = self.startMesher(inputParamsTetGen, self.getTetGenPath())
-    self.logProcessOutput(ep, self.tetGenFilename)
+    self.runMesher(METHOD_TETGEN, inputParamsTetGen, tempDir)
 
     # Read results
     if not self.abortRequested:
-      outputVolumetricMeshPath = os.path.join(tempDir, "mesh.1.vtk")
-      outputReader = vtk.vtkUnstructuredGridReader()
-      outputReader.SetFileName(outputVolumetricMeshPath)
-      outputReader.ReadAllScalarsOn()
-      outputReader.ReadAllVectorsOn()
-      outputReader.ReadAllNormalsOn()
-      outputReader.ReadAllTensorsOn()
-      outputReader.ReadAllColorScalarsOn()
-      outputReader.ReadAllTCoordsOn()
-      outputReader.ReadAllFieldsOn()
-      outputReader.Update()
-      outputMeshNode.SetUnstructuredGridConnection(outputReader.GetOutputPort())
+      self.readTetGenOutputMesh(os.path.join(tempDir, "mesh.1.vtk"), outputMeshNode)
+      self.recordRun(METHOD_TETGEN, self.getInputSizeTetGen(inputPolyData), {"ratio": ratio, "angle": angle, "volume": volume,
+        "sizingFieldDensity": self.getSizingFieldDensity(sizingFieldVolumeNode)}, outputMeshNode.GetMesh().GetNumberOfCells())
 
-      outputMeshDisplayNode = outputMeshNode.GetDisplayNode()
-      if not outputMeshDisplayNode:
-        # Initial setup of display node
-        outputMeshNode.CreateDefaultDisplayNodes()
-        outputMeshDisplayNode = outputMeshNode.GetDisplayNode()
-        outputMeshDisplayNode.SetEdgeVisibility(True)
-        outputMeshDisplayNode.SetClipping(True)
+      if optimizationIterations > 0:
+        self.optimizeOutputMesh(outputMeshNode, optimizationIterations)
 
     # Clean up
     if self.deleteTemporaryFiles:
@@ -908,6 +2443,1089 @@ class SegmentMesherLogic(ScriptedLoadableModuleLogic):
 
     self.addLog("Model generation is completed")
 
+  def decimateSurface(self, inputPolyData, targetReduction):
+    """Reduce the number of points of a surface by the targetReduction fraction (or less, if needed for
+    preserving the topology), with the same decimation settings as closed surface creation from segments.
+    """
+    triangulator = vtk.vtkTriangleFilter()
+    triangulator.SetInputData(inputPolyData)
+    decimator = vtk.vtkDecimatePro()
+    decimator.SetInputConnection(triangulator.GetOutputPort())
+    decimator.SetFeatureAngle(60)
+    decimator.SplittingOff()
+    decimator.PreserveTopologyOn()
+    decimator.SetMaximumError(1)
+    decimator.SetTargetReduction(targetReduction)
+    decimator.Update()
+    return decimator.GetOutput()
+
+  def refineMeshTetGen(self, inputMesh, outputMeshNode, additionalParameters="", ratio=5, angle=0, volume=10, elementVolumeConstraints=None):
+    """Refine an existing tetrahedral mesh (such as a previous output of the mesher) instead of generating
+    a new mesh from the surface. Element labels are preserved.
+    elementVolumeConstraints: optional list of maximum volume for each element of inputMesh
+    (non-positive value means that the element volume is not constrained).
+    """
+
+    self.abortRequested = False
+    tempDir = self.createTempDirectory()
+    self.addLog('Mesh refinement is started in working directory: '+tempDir)
+
+    # Write inputs
+    qt.QDir().mkpath(tempDir)
+
+    inputMeshFileBasePath = os.path.join(tempDir, "mesh")
+    self.writeTetGenMesh(inputMesh, inputMeshFileBasePath, elementVolumeConstraints)
+    inputSize = self.getInputSizeTetGenFromMesh(inputMesh)
+
+    #Command line for quality parameters
+    parameters = 'r'+'q'+"{:.2f}".format(ratio)+'/'+"{:.2f}".format(angle)+'a'+"{:.2f}".format(volume)
+    if elementVolumeConstraints is not None:
+      # Read per-element volume constraints from .vol file
+      parameters += 'a'
+
+    inputParamsTetGen = []
+    inputParamsTetGen.append("-k"+parameters+additionalParameters)
+    inputParamsTetGen.append(inputMeshFileBasePath + ".ele")
+
+    # Run tetgen
+    self.runMesher(METHOD_TETGEN, inputParamsTetGen, tempDir)
+
+    # Read results
+    if not self.abortRequested:
+      self.readTetGenOutputMesh(os.path.join(tempDir, "mesh.1.vtk"), outputMeshNode)
+      self.recordRun(METHOD_TETGEN, inputSize, {"ratio": ratio, "angle": angle, "volume": volume, "sizingFieldDensity": None,
+        "refineMesh": True}, outputMeshNode.GetMesh().GetNumberOfCells())
+
+    # Clean up
+    if self.deleteTemporaryFiles:
+      import shutil
+      shutil.rmtree(tempDir)
+
+    self.addLog("Mesh refinement is completed")
+
+  def readTetGenOutputMesh(self, outputVolumetricMeshPath, outputMeshNode):
+    outputReader = vtk.vtkUnstructuredGridReader()
+    outputReader.SetFileName(outputVolumetricMeshPath)
+    outputReader.ReadAllScalarsOn()
+    outputReader.ReadAllVectorsOn()
+    outputReader.ReadAllNormalsOn()
+    outputReader.ReadAllTensorsOn()
+    outputReader.ReadAllColorScalarsOn()
+    outputReader.ReadAllTCoordsOn()
+    outputReader.ReadAllFieldsOn()
+    outputReader.Update()
+
+    # TetGen writes element attributes (labels of refined meshes) as an unnamed cell scalar array
+    cellData = outputReader.GetOutput().GetCellData()
+    if not cellData.GetArray("labels") and cellData.GetNumberOfArrays() > 0:
+      cellData.GetArray(0).SetName("labels")
+
+    outputMeshNode.SetUnstructuredGridConnection(outputReader.GetOutputPort())
+
+    outputMeshDisplayNode = outputMeshNode.GetDisplayNode()
+    if not outputMeshDisplayNode:
+      # Initial setup of display node
+      outputMeshNode.CreateDefaultDisplayNodes()
+      outputMeshDisplayNode = outputMeshNode.GetDisplayNode()
+      outputMeshDisplayNode.SetEdgeVisibility(True)
+      outputMeshDisplayNode.SetClipping(True)
+
+  def getTetrahedra(self, mesh):
+    """Get point indices of the elements of a tetrahedral mesh as a numpy array (one row for each element).
+    """
+    import numpy as np
+    from vtk.util import numpy_support
+    if mesh is None or mesh.GetNumberOfCells() == 0:
+      raise ValueError("Mesh is empty")
+    cellTypes = numpy_support.vtk_to_numpy(mesh.GetCellTypesArray())
+    if not np.all(cellTypes == vtk.VTK_TETRA):
+      raise ValueError("Mesh must contain only tetrahedral elements")
+    cells = mesh.GetCells()
+    if hasattr(cells, "GetConnectivityArray"):
+      # VTK 9 and later: cells are stored as offsets and connectivity arrays
+      offsets = numpy_support.vtk_to_numpy(cells.GetOffsetsArray())
+      if not np.all(np.diff(offsets) == 4):
+        raise ValueError("Mesh must contain only tetrahedral elements")
+      return numpy_support.vtk_to_numpy(cells.GetConnectivityArray()).reshape(-1, 4)
+    # Legacy cell array layout: number of points followed by point indices, for each cell
+    cellData = numpy_support.vtk_to_numpy(cells.GetData())
+    if len(cellData) != 5 * mesh.GetNumberOfCells() or not np.all(cellData[::5] == 4):
+      raise ValueError("Mesh must contain only tetrahedral elements")
+    return cellData.reshape(-1, 5)[:, 1:]
+
+  def writeTetGenMesh(self, mesh, fileBasePath, elementVolumeConstraints=None):
+    """Write tetrahedral mesh in TetGen format (.node, .ele, and optionally .vol files).
+    Cell array "labels" is written as element attribute.
+    """
+    import numpy as np
+    from vtk.util import numpy_support
+
+    points = numpy_support.vtk_to_numpy(mesh.GetPoints().GetData())
+    tetrahedra = self.getTetrahedra(mesh)
+    numberOfPoints = len(points)
+    numberOfElements = len(tetrahedra)
+    elementIds = np.arange(1, numberOfElements + 1)
+
+    with open(fileBasePath + ".node", "w") as nodeFile:
+      nodeFile.write("{0} 3 0 0\n".format(numberOfPoints))
+      np.savetxt(nodeFile, np.column_stack((np.arange(1, numberOfPoints + 1), points)), fmt="%d %.9g %.9g %.9g")
+
+    labelsArray = mesh.GetCellData().GetArray("labels")
+    with open(fileBasePath + ".ele", "w") as elementFile:
+      if labelsArray:
+        labels = numpy_support.vtk_to_numpy(labelsArray).reshape(numberOfElements, -1)[:, 0]
+        elementFile.write("{0} 4 1\n".format(numberOfElements))
+        np.savetxt(elementFile, np.column_stack((elementIds, tetrahedra + 1, labels)), fmt="%d")
+      else:
+        elementFile.write("{0} 4 0\n".format(numberOfElements))
+        np.savetxt(elementFile, np.column_stack((elementIds, tetrahedra + 1)), fmt="%d")
+
+    if elementVolumeConstraints is not None:
+      volumes = np.asarray(elementVolumeConstraints, dtype=np.float64)
+      if len(volumes) != numberOfElements:
+        raise ValueError("Number of element volume constraints ({0}) does not match number of elements ({1})".format(len(volumes), numberOfElements))
+      # TetGen uses -1 to indicate no constraint
+      volumes = np.where(volumes > 0, volumes, -1.0)
+      with open(fileBasePath + ".vol", "w") as volumeFile:
+        volumeFile.write("{0}\n".format(numberOfElements))
+        np.savetxt(volumeFile, np.column_stack((elementIds, volumes)), fmt="%d %.9g")
+
+  def getElementVolumeConstraintsInRegion(self, mesh, maximumVolume, roiNode, meshTransformNode=None):
+    """Get element volume constraints for refineMeshTetGen that only refine the elements
+    that have their centroid inside the region of interest node (markups or annotation ROI, which may be rotated).
+    mesh: model node or vtkUnstructuredGrid. If a model node is specified then its parent transform is taken into account,
+    otherwise the mesh points are in the local coordinate system of meshTransformNode (world coordinate system if None).
+    """
+    import numpy as np
+    from vtk.util import numpy_support
+
+    if isinstance(mesh, slicer.vtkMRMLModelNode):
+      meshTransformNode = mesh.GetParentTransformNode()
+      mesh = mesh.GetMesh()
+
+    points = numpy_support.vtk_to_numpy(mesh.GetPoints().GetData())
+    centroids = points[self.getTetrahedra(mesh)].mean(axis=1)
+
+    # Transform centroids to the ROI coordinate system, where the ROI is an axis-aligned box centered at the origin
+    meshToWorldMatrix = vtk.vtkMatrix4x4()
+    if not slicer.vtkMRMLTransformNode.GetMatrixTransformBetweenNodes(meshTransformNode, None, meshToWorldMatrix):
+      raise ValueError("Mesh must not be under a non-linear transform")
+    roiToWorldMatrix, roiRadius = self.getRegionOfInterestBox(roiNode)
+    worldToRoiMatrix = vtk.vtkMatrix4x4()
+    vtk.vtkMatrix4x4.Invert(roiToWorldMatrix, worldToRoiMatrix)
+    meshToRoiMatrix = vtk.vtkMatrix4x4()
+    vtk.vtkMatrix4x4.Multiply4x4(worldToRoiMatrix, meshToWorldMatrix, meshToRoiMatrix)
+    meshToRoi = np.array([[meshToRoiMatrix.GetElement(row, column) for column in range(4)] for row in range(4)])
+    centroidsRoi = np.column_stack((centroids, np.ones(len(centroids)))).dot(meshToRoi.T)[:, :3]
+
+    inside = np.all(np.abs(centroidsRoi) <= np.array(roiRadius), axis=1)
+    return np.where(inside, maximumVolume, -1.0)
+
+  def getRegionOfInterestBox(self, roiNode):
+    """Get ROI to world transformation matrix (vtkMatrix4x4) and radius of a markups or annotation ROI node.
+    In the ROI coordinate system the ROI is an axis-aligned box centered at the origin.
+    """
+    roiToWorldMatrix = vtk.vtkMatrix4x4()
+    if roiNode.IsA("vtkMRMLMarkupsROINode"):
+      # Object to world matrix contains the ROI orientation and the parent transforms
+      roiToWorldMatrix.DeepCopy(roiNode.GetObjectToWorldMatrix())
+      roiRadius = [size / 2.0 for size in roiNode.GetSize()]
+    else:
+      # Annotation ROI is axis-aligned in the coordinate system of its parent transform
+      if not slicer.vtkMRMLTransformNode.GetMatrixTransformBetweenNodes(roiNode.GetParentTransformNode(), None, roiToWorldMatrix):
+        raise ValueError("Region of interest must not be under a non-linear transform")
+      center = [0.0, 0.0, 0.0]
+      roiNode.GetXYZ(center)
+      roiRadius = [0.0, 0.0, 0.0]
+      roiNode.GetRadiusXYZ(roiRadius)
+      centerTransform = vtk.vtkTransform()
+      centerTransform.PostMultiply()
+      centerTransform.Translate(center)
+      centerTransform.Concatenate(roiToWorldMatrix)
+      roiToWorldMatrix.DeepCopy(centerTransform.GetMatrix())
+    return roiToWorldMatrix, roiRadius
+
+  def getMeshLabels(self, mesh):
+    """Get "labels" cell array of the mesh as a numpy array (all zeros if the mesh has no labels).
+    """
+    import numpy as np
+    from vtk.util import numpy_support
+    labelsArray = mesh.GetCellData().GetArray("labels")
+    if not labelsArray:
+      return np.zeros(mesh.GetNumberOfCells(), dtype=np.int64)
+    return numpy_support.vtk_to_numpy(labelsArray).reshape(mesh.GetNumberOfCells(), -1)[:, 0].astype(np.int64)
+
+  def getMeshSurfaces(self, tetrahedra, labels, maximumNumberOfFacesPerPass=4000000, chunkSize=100000):
+    """Get faces of interfaces between regions of different labels and exterior boundary faces of each region.
+    Returns a list of (surfaceName, faceIndices) tuples. Face index is elementIndex * 4 + localFaceIndex,
+    where local face indices correspond to faces of MESH_TETRAHEDRON_FACES.
+    Interface faces are listed from the side of the element that has the lower label value.
+    Faces are matched in multiple passes, each pass processes faces that have their smallest node index in a range,
+    therefore memory usage is bounded by maximumNumberOfFacesPerPass (and the size of the returned surfaces).
+    """
+    import numpy as np
+    numberOfElements = len(tetrahedra)
+    numberOfPoints = int(tetrahedra.max()) + 1
+    tetrahedronFaces = np.array(MESH_TETRAHEDRON_FACES)
+    numberOfPasses = max(1, int(np.ceil(numberOfElements * 4.0 / maximumNumberOfFacesPerPass)))
+    passNodeRanges = np.linspace(0, numberOfPoints, numberOfPasses + 1).round().astype(np.int64)
+
+    boundaryFaces = []
+    interfaceFirstFaces = []
+    interfaceSecondFaces = []
+    for passIndex in range(numberOfPasses):
+      passFaces = []
+      passFaceIndices = []
+      for chunkStart in range(0, numberOfElements, chunkSize):
+        chunkFaces = np.sort(tetrahedra[chunkStart:chunkStart + chunkSize][:, tetrahedronFaces].reshape(-1, 3), axis=1)
+        inPass = (chunkFaces[:, 0] >= passNodeRanges[passIndex]) & (chunkFaces[:, 0] < passNodeRanges[passIndex + 1])
+        passFaces.append(chunkFaces[inPass])
+        passFaceIndices.append(np.nonzero(inPass)[0] + chunkStart * 4)
+      faces = np.vstack(passFaces)
+      faceIndices = np.concatenate(passFaceIndices)
+      del passFaces, passFaceIndices
+      order = np.lexsort((faces[:, 2], faces[:, 1], faces[:, 0]))
+      sortedFaces = faces[order]
+      # In a conforming mesh each internal face is shared by exactly two elements
+      sameAsNext = np.all(sortedFaces[1:] == sortedFaces[:-1], axis=1)
+      del faces, sortedFaces
+      isInternal = np.zeros(len(faceIndices), dtype=bool)
+      isInternal[order[:-1][sameAsNext]] = True
+      isInternal[order[1:][sameAsNext]] = True
+      boundaryFaces.append(faceIndices[~isInternal])
+      firstFaces = faceIndices[order[:-1][sameAsNext]]
+      secondFaces = faceIndices[order[1:][sameAsNext]]
+      isInterface = labels[firstFaces // 4] != labels[secondFaces // 4]
+      interfaceFirstFaces.append(firstFaces[isInterface])
+      interfaceSecondFaces.append(secondFaces[isInterface])
+
+    surfaces = []
+    boundaryFaces = np.sort(np.concatenate(boundaryFaces))
+    boundaryFaceLabels = labels[boundaryFaces // 4]
+    for label in np.unique(boundaryFaceLabels):
+      surfaces.append(("boundary_{0}".format(label), boundaryFaces[boundaryFaceLabels == label]))
+
+    firstFaces = np.concatenate(interfaceFirstFaces)
+    secondFaces = np.concatenate(interfaceSecondFaces)
+    firstLabels = labels[firstFaces // 4]
+    secondLabels = labels[secondFaces // 4]
+    lowerSideFaces = np.where(firstLabels < secondLabels, firstFaces, secondFaces)
+    interfaceLabelPairs = np.column_stack((np.minimum(firstLabels, secondLabels), np.maximum(firstLabels, secondLabels)))
+    order = np.argsort(lowerSideFaces)
+    lowerSideFaces = lowerSideFaces[order]
+    interfaceLabelPairs = interfaceLabelPairs[order]
+    if len(interfaceLabelPairs):
+      for labelPair in np.unique(interfaceLabelPairs, axis=0):
+        surfaces.append(("interface_{0}_{1}".format(labelPair[0], labelPair[1]),
+          lowerSideFaces[np.all(interfaceLabelPairs == labelPair, axis=1)]))
+    return surfaces
+
+  def getMeshExportElementSetNames(self, labels, labelNames=None):
+    """Get element set name for each label value. labelNames optionally maps label values to names.
+    """
+    import numpy as np
+    import re
+    elementSetNames = {}
+    for label in np.unique(labels):
+      name = labelNames.get(int(label)) if labelNames else None
+      # Solvers generally do not accept spaces and special characters in set names
+      elementSetNames[label] = re.sub(r'[^A-Za-z0-9_]', '_', name) if name else "label_{0}".format(label)
+    return elementSetNames
+
+  def formatRows(self, rows, rowFormat):
+    """Format rows of a numpy array as text. rowFormat contains one format specifier for each column
+    and the line ending.
+    """
+    import io
+    import numpy as np
+    rowsText = io.StringIO()
+    np.savetxt(rowsText, rows, fmt=rowFormat, newline="")
+    return rowsText.getvalue()
+
+  def writeRowsInChunks(self, outputFile, numberOfRows, getRows, rowFormat, chunkSize=100000):
+    """Write rows as text, formatting a large chunk of rows at once.
+    getRows(start, stop) returns the rows in the [start, stop) range as a numpy array, which allows creating rows
+    only for the current chunk, without copying the whole mesh.
+    """
+    for chunkStart in range(0, numberOfRows, chunkSize):
+      chunk = getRows(chunkStart, min(chunkStart + chunkSize, numberOfRows))
+      if len(chunk) > 0:
+        outputFile.write(self.formatRows(chunk, rowFormat))
+
+  def getNodeRows(self, points):
+    """Get function for writeRowsInChunks that returns rows of node ID (1-based) and node coordinates.
+    """
+    import numpy as np
+    return lambda start, stop: np.column_stack((np.arange(start + 1, stop + 1), points[start:stop]))
+
+  def getElementRows(self, tetrahedra, labels, label):
+    """Get function for writeRowsInChunks that returns rows of element ID and node IDs (1-based)
+    of the elements that have the specified label.
+    """
+    import numpy as np
+    def getRows(start, stop):
+      elementIndices = start + np.nonzero(labels[start:stop] == label)[0]
+      return np.column_stack((elementIndices + 1, tetrahedra[elementIndices] + 1))
+    return getRows
+
+  def getFaceNodeIds(self, tetrahedra, faceIndices):
+    """Get node IDs (1-based) of element faces. Node order is reversed compared to MESH_TETRAHEDRON_FACES
+    to make triangle normals point out of the element.
+    """
+    import numpy as np
+    tetrahedronFaces = np.array(MESH_TETRAHEDRON_FACES)
+    return tetrahedra[faceIndices // 4][np.arange(len(faceIndices))[:, np.newaxis], tetrahedronFaces[faceIndices % 4, ::-1]] + 1
+
+  def exportMesh(self, mesh, filePath, labelNames=None):
+    """Export tetrahedral mesh to a finite element solver file format, determined from the file extension:
+    Abaqus (.inp), Gmsh (.msh, binary), or FEBio (.feb).
+    Element sets are created for each "labels" value, surfaces are created for each interface between
+    different labels and for the exterior boundary of each label.
+    labelNames optionally maps label values to element set names.
+    """
+    extension = os.path.splitext(filePath)[1].lower()
+    if extension == ".inp":
+      self.exportMeshToAbaqus(mesh, filePath, labelNames)
+    elif extension == ".msh":
+      self.exportMeshToGmsh(mesh, filePath, True, labelNames)
+    elif extension == ".feb":
+      self.exportMeshToFEBio(mesh, filePath, labelNames)
+    else:
+      raise ValueError("Unsupported mesh file format: " + extension)
+
+  def exportMeshToAbaqus(self, mesh, filePath, labelNames=None):
+    import numpy as np
+    from vtk.util import numpy_support
+    points = numpy_support.vtk_to_numpy(mesh.GetPoints().GetData())
+    tetrahedra = self.getTetrahedra(mesh)
+    labels = self.getMeshLabels(mesh)
+    elementSetNames = self.getMeshExportElementSetNames(labels, labelNames)
+    with open(filePath, "w") as outputFile:
+      outputFile.write("*HEADING\nVolumetric mesh exported from 3D Slicer SegmentMesher\n")
+      outputFile.write("*NODE\n")
+      self.writeRowsInChunks(outputFile, len(points), self.getNodeRows(points), "%d, %.9g, %.9g, %.9g\n")
+      for label, elementSetName in elementSetNames.items():
+        outputFile.write("*ELEMENT, TYPE=C3D4, ELSET={0}\n".format(elementSetName))
+        self.writeRowsInChunks(outputFile, len(tetrahedra), self.getElementRows(tetrahedra, labels, label), "%d, %d, %d, %d, %d\n")
+      for surfaceName, faceIndices in self.getMeshSurfaces(tetrahedra, labels):
+        outputFile.write("*SURFACE, NAME={0}, TYPE=ELEMENT\n".format(surfaceName))
+        # Abaqus face identifiers S1-S4 correspond to MESH_TETRAHEDRON_FACES
+        self.writeRowsInChunks(outputFile, len(faceIndices),
+          lambda start, stop: np.column_stack((faceIndices[start:stop] // 4 + 1, faceIndices[start:stop] % 4 + 1)), "%d, S%d\n")
+
+  def exportMeshToGmsh(self, mesh, filePath, binary=True, labelNames=None):
+    """Export mesh in Gmsh 2.2 format. Each label is stored as a physical volume, each surface as a physical surface.
+    Tetrahedron IDs are the same as in Abaqus and FEBio exports (element index + 1), triangles of the surfaces
+    are numbered after all the tetrahedra.
+    """
+    import numpy as np
+    from vtk.util import numpy_support
+    points = numpy_support.vtk_to_numpy(mesh.GetPoints().GetData())
+    tetrahedra = self.getTetrahedra(mesh)
+    labels = self.getMeshLabels(mesh)
+    elementSetNames = self.getMeshExportElementSetNames(labels, labelNames)
+    surfaces = self.getMeshSurfaces(tetrahedra, labels)
+    chunkSize = 100000
+
+    # Physical tags must be positive
+    volumeTags = {label: tagIndex + 1 for tagIndex, label in enumerate(elementSetNames.keys())}
+    gmshTetrahedron = 4
+    gmshTriangle = 2
+
+    with open(filePath, "wb") as outputFile:
+      outputFile.write("$MeshFormat\n2.2 {0} 8\n".format(1 if binary else 0).encode())
+      if binary:
+        # Integer 1 allows readers to detect endianness
+        outputFile.write(np.array([1], dtype=np.int32).tobytes() + b"\n")
+      outputFile.write(b"$EndMeshFormat\n")
+
+      outputFile.write("$PhysicalNames\n{0}\n".format(len(elementSetNames) + len(surfaces)).encode())
+      for label, elementSetName in elementSetNames.items():
+        outputFile.write('3 {0} "{1}"\n'.format(volumeTags[label], elementSetName).encode())
+      for surfaceIndex, (surfaceName, faceIndices) in enumerate(surfaces):
+        outputFile.write('2 {0} "{1}"\n'.format(surfaceIndex + 1, surfaceName).encode())
+      outputFile.write(b"$EndPhysicalNames\n")
+
+      outputFile.write("$Nodes\n{0}\n".format(len(points)).encode())
+      for chunkStart in range(0, len(points), chunkSize):
+        chunkPoints = points[chunkStart:chunkStart + chunkSize]
+        nodeIds = np.arange(chunkStart + 1, chunkStart + len(chunkPoints) + 1)
+        if binary:
+          nodes = np.empty(len(chunkPoints), dtype=[('id', np.int32), ('position', np.float64, (3,))])
+          nodes['id'] = nodeIds
+          nodes['position'] = chunkPoints
+          outputFile.write(nodes.tobytes())
+        else:
+          outputFile.write(self.formatRows(np.column_stack((nodeIds, chunkPoints)), "%d %.9g %.9g %.9g\n").encode())
+      if binary:
+        outputFile.write(b"\n")
+      outputFile.write(b"$EndNodes\n")
+
+      # Element blocks: (element type, physical tag, element or face indices in chunks)
+      def getLabelElementIndexChunks(label):
+        for chunkStart in range(0, len(tetrahedra), chunkSize):
+          yield chunkStart + np.nonzero(labels[chunkStart:chunkStart + chunkSize] == label)[0]
+      def getFaceIndexChunks(faceIndices):
+        for chunkStart in range(0, len(faceIndices), chunkSize):
+          yield faceIndices[chunkStart:chunkStart + chunkSize]
+      elementBlocks = []
+      for label in elementSetNames.keys():
+        elementBlocks.append((gmshTetrahedron, volumeTags[label], getLabelElementIndexChunks(label)))
+      for surfaceIndex, (surfaceName, faceIndices) in enumerate(surfaces):
+        elementBlocks.append((gmshTriangle, surfaceIndex + 1, getFaceIndexChunks(faceIndices)))
+      numberOfSurfaceElements = sum(len(faceIndices) for surfaceName, faceIndices in surfaces)
+
+      outputFile.write("$Elements\n{0}\n".format(len(tetrahedra) + numberOfSurfaceElements).encode())
+      nextSurfaceElementId = len(tetrahedra) + 1
+      for elementType, physicalTag, indexChunks in elementBlocks:
+        for chunkIndices in indexChunks:
+          if len(chunkIndices) == 0:
+            continue
+          if elementType == gmshTetrahedron:
+            nodeIds = tetrahedra[chunkIndices] + 1
+            elementIds = chunkIndices + 1
+          else:
+            nodeIds = self.getFaceNodeIds(tetrahedra, chunkIndices)
+            elementIds = np.arange(nextSurfaceElementId, nextSurfaceElementId + len(chunkIndices))
+            nextSurfaceElementId += len(chunkIndices)
+          # element id, physical tag, elementary tag, node ids
+          records = np.column_stack((elementIds, np.full(len(chunkIndices), physicalTag), np.full(len(chunkIndices), physicalTag), nodeIds))
+          if binary:
+            outputFile.write(np.array([elementType, len(chunkIndices), 2], dtype=np.int32).tobytes())
+            outputFile.write(records.astype(np.int32).tobytes())
+          else:
+            rowFormat = "%d {0} 2 %d %d".format(elementType) + " %d" * nodeIds.shape[1] + "\n"
+            outputFile.write(self.formatRows(records, rowFormat).encode())
+      if binary:
+        outputFile.write(b"\n")
+      outputFile.write(b"$EndElements\n")
+
+  def exportMeshToFEBio(self, mesh, filePath, labelNames=None):
+    """Export mesh in FEBio 3.0 (.feb) format. Each label is stored as an element domain, each surface as a named surface.
+    A placeholder neo-Hookean material is assigned to each domain, so that the file can be loaded in FEBio Studio
+    or FEBio, where the materials, boundary conditions, and loads can be specified.
+    """
+    import numpy as np
+    from vtk.util import numpy_support
+    points = numpy_support.vtk_to_numpy(mesh.GetPoints().GetData())
+    tetrahedra = self.getTetrahedra(mesh)
+    labels = self.getMeshLabels(mesh)
+    elementSetNames = self.getMeshExportElementSetNames(labels, labelNames)
+    with open(filePath, "w") as outputFile:
+      outputFile.write('<?xml version="1.0" encoding="ISO-8859-1"?>\n<febio_spec version="3.0">\n')
+      outputFile.write('\t<Module type="solid"/>\n')
+      outputFile.write('\t<Control>\n\t\t<analysis>STATIC</analysis>\n\t\t<time_steps>10</time_steps>\n\t\t<step_size>0.1</step_size>\n\t</Control>\n')
+      outputFile.write('\t<Material>\n')
+      for materialIndex, elementSetName in enumerate(elementSetNames.values()):
+        outputFile.write('\t\t<material id="{0}" name="{1}" type="neo-Hookean">\n'.format(materialIndex + 1, elementSetName))
+        outputFile.write('\t\t\t<density>1</density>\n\t\t\t<E>1</E>\n\t\t\t<v>0.3</v>\n\t\t</material>\n')
+      outputFile.write('\t</Material>\n')
+      outputFile.write('\t<Mesh>\n')
+      outputFile.write('\t\t<Nodes name="Object">\n')
+      self.writeRowsInChunks(outputFile, len(points), self.getNodeRows(points), '\t\t\t<node id="%d">%.9g,%.9g,%.9g</node>\n')
+      outputFile.write('\t\t</Nodes>\n')
+      for label, elementSetName in elementSetNames.items():
+        outputFile.write('\t\t<Elements type="tet4" name="{0}">\n'.format(elementSetName))
+        self.writeRowsInChunks(outputFile, len(tetrahedra), self.getElementRows(tetrahedra, labels, label), '\t\t\t<elem id="%d">%d,%d,%d,%d</elem>\n')
+        outputFile.write('\t\t</Elements>\n')
+      for surfaceName, faceIndices in self.getMeshSurfaces(tetrahedra, labels):
+        outputFile.write('\t\t<Surface name="{0}">\n'.format(surfaceName))
+        self.writeRowsInChunks(outputFile, len(faceIndices), lambda start, stop: np.column_stack((np.arange(start + 1, stop + 1),
+          self.getFaceNodeIds(tetrahedra, faceIndices[start:stop]))), '\t\t\t<tri3 id="%d">%d,%d,%d</tri3>\n')
+        outputFile.write('\t\t</Surface>\n')
+      outputFile.write('\t</Mesh>\n')
+      outputFile.write('\t<MeshDomains>\n')
+      for elementSetName in elementSetNames.values():
+        outputFile.write('\t\t<SolidDomain name="{0}" mat="{0}"/>\n'.format(elementSetName))
+      outputFile.write('\t</MeshDomains>\n</febio_spec>\n')
+
+  def mapVolumeToMeshElements(self, mesh, volumeNode, integrate=False, outputArrayName=None, meshTransformNode=None):
+    """Compute mean (or integrated) value of a scalar volume within each element of a tetrahedral mesh,
+    for example to assign CT-derived material properties to mesh elements.
+    mesh: model node or vtkUnstructuredGrid. If a model node is specified then its parent transform is taken into account,
+    otherwise the mesh points are in the local coordinate system of meshTransformNode (world coordinate system if None).
+    Mean is computed from voxels that have their center inside the element. For elements that do not contain
+    any voxel center, the value of the voxel nearest to the element centroid is used.
+    Integrated value is the mean value multiplied by the element volume (in the world coordinate system).
+    The result is added to the mesh as a cell array (named as the volume node by default) and returned as a numpy array.
+    The voxel-to-element index is cached, therefore mapping more volumes with the same geometry onto the same mesh is fast.
+    """
+    import numpy as np
+    from vtk.util import numpy_support
+
+    if isinstance(mesh, slicer.vtkMRMLModelNode):
+      meshTransformNode = mesh.GetParentTransformNode()
+      mesh = mesh.GetMesh()
+
+    values = slicer.util.arrayFromVolume(volumeNode)
+    if values.ndim != 3:
+      raise ValueError("Only single-component scalar volumes can be mapped to mesh elements")
+    values = values.ravel()
+
+    index = self.getVoxelToElementIndex(mesh, volumeNode, meshTransformNode)
+    numberOfElements = len(index["elementVolumes"])
+    sums = np.bincount(index["elementIndices"], weights=values[index["voxelIndices"]], minlength=numberOfElements)
+    counts = np.bincount(index["elementIndices"], minlength=numberOfElements)
+    centroidValues = np.full(numberOfElements, np.nan)
+    centroidInsideVolume = index["centroidVoxelIndices"] >= 0
+    centroidValues[centroidInsideVolume] = values[index["centroidVoxelIndices"][centroidInsideVolume]]
+    elementValues = np.where(counts > 0, sums / np.maximum(counts, 1), centroidValues)
+    if integrate:
+      elementValues = elementValues * index["elementVolumes"]
+
+    outputArray = numpy_support.numpy_to_vtk(elementValues.astype(np.float64), deep=True)
+    outputArray.SetName(outputArrayName if outputArrayName else volumeNode.GetName())
+    mesh.GetCellData().AddArray(outputArray)
+    return elementValues
+
+  def getVoxelToElementIndex(self, mesh, volumeNode, meshTransformNode=None):
+    """Get index that specifies which voxels of the volume have their center inside each mesh element.
+    Voxels are found by vectorized rasterization of the elements: candidate voxels within the bounding box
+    of many elements are tested at once using barycentric coordinates.
+    Mesh points are in the local coordinate system of meshTransformNode (world coordinate system if None).
+    The index is cached for each mesh and volume geometry.
+    """
+    import numpy as np
+    from vtk.util import numpy_support
+
+    ijkToLocal = self.getIjkToLocalMatrix(volumeNode, meshTransformNode)
+    ijkToWorld = self.getIjkToLocalMatrix(volumeNode)
+    dimensions = np.array(volumeNode.GetImageData().GetDimensions())  # i, j, k
+    cacheKey = (mesh.GetAddressAsString("vtkUnstructuredGrid"), mesh.GetPoints().GetMTime(), mesh.GetCells().GetMTime(),
+      tuple(dimensions), tuple(ijkToLocal.ravel()), tuple(ijkToWorld.ravel()))
+    if cacheKey in self.voxelToElementIndexCache:
+      return self.voxelToElementIndexCache[cacheKey]
+
+    pointsLocal = numpy_support.vtk_to_numpy(mesh.GetPoints().GetData()).astype(np.float64)
+    tetrahedra = self.getTetrahedra(mesh)
+    numberOfElements = len(tetrahedra)
+    pointsIjk = np.column_stack((pointsLocal, np.ones(len(pointsLocal)))).dot(np.linalg.inv(ijkToLocal).T)[:, :3]
+    tetrahedraIjk = pointsIjk[tetrahedra]  # element, vertex, axis
+    edgesIjk = tetrahedraIjk[:, 1:] - tetrahedraIjk[:, :1]
+    edgesIjkDeterminants = np.linalg.det(edgesIjk)
+
+    # Element volumes (in world coordinate system) and voxels nearest to element centroids
+    elementVolumes = np.abs(edgesIjkDeterminants) * abs(np.linalg.det(ijkToWorld[:3, :3])) / 6.0
+    centroidVoxels = np.rint(tetrahedraIjk.mean(axis=1)).astype(np.int64)
+    centroidInsideVolume = np.all((centroidVoxels >= 0) & (centroidVoxels < dimensions), axis=1)
+    centroidVoxelIndices = np.where(centroidInsideVolume,
+      (centroidVoxels[:, 2] * dimensions[1] + centroidVoxels[:, 1]) * dimensions[0] + centroidVoxels[:, 0], -1)
+
+    # Range of voxel centers within the bounding box of each element
+    voxelRangeMin = np.maximum(np.ceil(tetrahedraIjk.min(axis=1)).astype(np.int64), 0)
+    voxelRangeMax = np.minimum(np.floor(tetrahedraIjk.max(axis=1)).astype(np.int64), dimensions - 1)
+    voxelRangeSizes = np.maximum(voxelRangeMax - voxelRangeMin + 1, 0)
+    numberOfCandidateVoxels = voxelRangeSizes.prod(axis=1)
+
+    # Matrices for computing barycentric coordinates
+    nonDegenerate = np.abs(edgesIjkDeterminants) > 1e-12
+    candidateElements = np.nonzero((numberOfCandidateVoxels > 0) & nonDegenerate)[0]
+    barycentricMatrices = np.zeros((numberOfElements, 3, 3))
+    barycentricMatrices[candidateElements] = np.linalg.inv(np.transpose(edgesIjk[candidateElements], (0, 2, 1)))
+
+    # Candidate voxels of all elements are enumerated one after the other and tested in batches
+    # of maximumNumberOfTestedVoxels, therefore memory usage does not depend on element sizes.
+    candidateVoxelsEnd = np.cumsum(numberOfCandidateVoxels[candidateElements])
+    candidateVoxelsStart = candidateVoxelsEnd - numberOfCandidateVoxels[candidateElements]
+    numberOfAllCandidateVoxels = int(candidateVoxelsEnd[-1]) if len(candidateElements) else 0
+    maximumNumberOfTestedVoxels = 4000000
+    tolerance = 1e-9
+    elementIndicesList = []
+    voxelIndicesList = []
+    for batchStart in range(0, numberOfAllCandidateVoxels, maximumNumberOfTestedVoxels):
+      candidateVoxelIndices = np.arange(batchStart, min(batchStart + maximumNumberOfTestedVoxels, numberOfAllCandidateVoxels))
+      candidatePositions = np.searchsorted(candidateVoxelsEnd, candidateVoxelIndices, side='right')
+      batchElements = candidateElements[candidatePositions]
+      # Position of the voxel within the bounding box of the element
+      offsets = candidateVoxelIndices - candidateVoxelsStart[candidatePositions]
+      del candidateVoxelIndices, candidatePositions
+      rangeSizes = voxelRangeSizes[batchElements]
+      voxels = voxelRangeMin[batchElements] + np.column_stack((offsets % rangeSizes[:, 0],
+        (offsets // rangeSizes[:, 0]) % rangeSizes[:, 1], offsets // (rangeSizes[:, 0] * rangeSizes[:, 1])))
+      del offsets, rangeSizes
+      voxelsRelative = voxels - tetrahedraIjk[batchElements, 0]
+      inside = np.ones(len(voxels), dtype=bool)
+      barycentricCoordinatesSum = np.zeros(len(voxels))
+      for axis in range(3):
+        barycentricCoordinates = (barycentricMatrices[batchElements, axis] * voxelsRelative).sum(axis=1)
+        inside &= barycentricCoordinates >= -tolerance
+        barycentricCoordinatesSum += barycentricCoordinates
+      inside &= barycentricCoordinatesSum <= 1.0 + tolerance
+      voxels = voxels[inside]
+      elementIndicesList.append(batchElements[inside])
+      voxelIndicesList.append((voxels[:, 2] * dimensions[1] + voxels[:, 1]) * dimensions[0] + voxels[:, 0])
+
+    elementIndices = np.concatenate(elementIndicesList) if elementIndicesList else np.zeros(0, dtype=np.int64)
+    voxelIndices = np.concatenate(voxelIndicesList) if voxelIndicesList else np.zeros(0, dtype=np.int64)
+    # Voxels on faces shared by neighbor elements are only assigned to one element
+    voxelIndices, firstOccurrence = np.unique(voxelIndices, return_index=True)
+    elementIndices = elementIndices[firstOccurrence]
+
+    index = {"elementIndices": elementIndices, "voxelIndices": voxelIndices,
+      "centroidVoxelIndices": centroidVoxelIndices, "elementVolumes": elementVolumes}
+    # Only keep a few recently used indices
+    while len(self.voxelToElementIndexCache) >= self.maximumNumberOfCachedVoxelToElementIndices:
+      del self.voxelToElementIndexCache[next(iter(self.voxelToElementIndexCache))]
+    self.voxelToElementIndexCache[cacheKey] = index
+    return index
+
+  def optimizeOutputMesh(self, outputMeshNode, numberOfIterations):
+    """Optimize the volumetric mesh of the output model node in place (see optimizeMesh).
+    """
+    self.addLog("Optimizing mesh...")
+    optimizedMesh, qualityStatistics = self.optimizeMesh(outputMeshNode.GetMesh(), numberOfIterations)
+    outputMeshNode.SetAndObserveMesh(optimizedMesh)
+    before = qualityStatistics["before"]
+    after = qualityStatistics["after"]
+    self.addLog("Mesh optimization is completed: minimum element quality {0:.3f} -> {1:.3f}, mean quality {2:.3f} -> {3:.3f},"
+      " poor elements {4} -> {5}, inverted elements {6} -> {7}".format(
+      before["minimumQuality"], after["minimumQuality"], before["meanQuality"], after["meanQuality"],
+      before["numberOfPoorElements"], after["numberOfPoorElements"], before["numberOfInvertedElements"], after["numberOfInvertedElements"]))
+
+  def optimizeMesh(self, mesh, numberOfIterations=5, poorQualityThreshold=0.2, relaxationFactor=0.5):
+    """Improve element quality of a tetrahedral mesh, without changing the outer boundary and the interfaces
+    between regions of different labels. It is much faster than generating the mesh again with different parameters.
+    Returns the optimized mesh and element quality statistics before and after the optimization
+    (see optimizeTetrahedra for details).
+    """
+    import numpy as np
+    from vtk.util import numpy_support
+    tetrahedra = self.getTetrahedra(mesh)
+    points = numpy_support.vtk_to_numpy(mesh.GetPoints().GetData()).astype(np.float64)
+    labels = self.getMeshLabels(mesh)
+
+    points, tetrahedra, labels, sourceElementIndices, qualityStatistics = self.optimizeTetrahedra(
+      points, tetrahedra, labels, numberOfIterations, poorQualityThreshold, relaxationFactor)
+
+    optimizedMesh = vtk.vtkUnstructuredGrid()
+    optimizedPoints = vtk.vtkPoints()
+    optimizedPoints.SetData(numpy_support.numpy_to_vtk(points, deep=True))
+    optimizedMesh.SetPoints(optimizedPoints)
+    cells = np.column_stack((np.full(len(tetrahedra), 4), tetrahedra)).astype(numpy_support.ID_TYPE_CODE).ravel()
+    cellArray = vtk.vtkCellArray()
+    cellArray.SetCells(len(tetrahedra), numpy_support.numpy_to_vtkIdTypeArray(cells, deep=True))
+    optimizedMesh.SetCells(vtk.VTK_TETRA, cellArray)
+    optimizedMesh.GetPointData().ShallowCopy(mesh.GetPointData())
+    # Elements created by edge flips get the cell data values of one of the replaced elements
+    cellData = mesh.GetCellData()
+    for arrayIndex in range(cellData.GetNumberOfArrays()):
+      array = cellData.GetArray(arrayIndex)
+      if not array:
+        continue
+      optimizedArray = numpy_support.numpy_to_vtk(numpy_support.vtk_to_numpy(array)[sourceElementIndices], deep=True, array_type=array.GetDataType())
+      optimizedArray.SetName(array.GetName())
+      optimizedMesh.GetCellData().AddArray(optimizedArray)
+    if cellData.GetScalars():
+      optimizedMesh.GetCellData().SetActiveScalars(cellData.GetScalars().GetName())
+    return optimizedMesh, qualityStatistics
+
+  def optimizeTetrahedra(self, points, tetrahedra, labels, numberOfIterations=5, poorQualityThreshold=0.2, relaxationFactor=0.5):
+    """Improve element quality by alternating sliver removal and smoothing.
+    Slivers (elements with quality below poorQualityThreshold) are removed by 3-2 edge flips (see flipMeshEdges).
+    Interior nodes are moved towards the average position of their neighbors (Laplacian smoothing), but a node is
+    only moved if the quality of the worst element around it does not decrease, therefore the minimum element
+    quality never decreases and no elements get inverted. Nodes on the outer boundary and on interfaces between
+    regions of different labels are not moved.
+    Edge flips are vectorized and run on a single thread, smoothing and element quality computation use
+    multiple threads for large meshes (see smoothMeshNodes and computeTetrahedraQuality).
+    Returns points, tetrahedra, labels, index of the original element for each element, and quality statistics
+    ({"before": ..., "after": ...}, see getMeshQualityStatistics).
+    """
+    import numpy as np
+    points = np.array(points, dtype=np.float64)
+    tetrahedra = np.array(tetrahedra, dtype=np.int64)
+    labels = np.asarray(labels)
+    sourceElementIndices = np.arange(len(tetrahedra))
+
+    # Nodes of boundary and interface faces are kept in place
+    fixedNodes = np.zeros(len(points), dtype=bool)
+    tetrahedronFaces = tetrahedra[:, MESH_TETRAHEDRON_FACES].reshape(-1, 3)
+    for surfaceName, faceIndices in self.getMeshSurfaces(tetrahedra, labels):
+      fixedNodes[tetrahedronFaces[faceIndices].ravel()] = True
+    del tetrahedronFaces
+
+    # Quality is computed so that it is positive for elements that have the same orientation as most elements
+    orientation = 1.0 if np.count_nonzero(self.computeTetrahedraVolumes(points, tetrahedra) >= 0) * 2 >= len(tetrahedra) else -1.0
+    quality = self.computeTetrahedraQuality(points, tetrahedra, orientation)
+    qualityStatistics = {"before": self.getMeshQualityStatistics(quality, poorQualityThreshold)}
+
+    for iteration in range(numberOfIterations):
+      tetrahedra, labels, quality, flippedElementIndices, numberOfFlips = self.flipMeshEdges(
+        points, tetrahedra, labels, quality, orientation, poorQualityThreshold)
+      sourceElementIndices = sourceElementIndices[flippedElementIndices]
+      points, quality, numberOfMovedNodes = self.smoothMeshNodes(points, tetrahedra, quality, orientation, fixedNodes, relaxationFactor)
+      logging.debug("Mesh optimization iteration {0}: {1} edge flips, {2} moved nodes".format(iteration + 1, numberOfFlips, numberOfMovedNodes))
+      if numberOfFlips == 0 and numberOfMovedNodes == 0:
+        break
+
+    qualityStatistics["after"] = self.getMeshQualityStatistics(quality, poorQualityThreshold)
+    return points, tetrahedra, labels, sourceElementIndices, qualityStatistics
+
+  def computeTetrahedraVolumes(self, points, tetrahedra):
+    """Signed volume of each tetrahedron.
+    """
+    import numpy as np
+    p0 = points[tetrahedra[:, 0]]
+    return np.einsum('ij,ij->i', points[tetrahedra[:, 1]] - p0,
+      np.cross(points[tetrahedra[:, 2]] - p0, points[tetrahedra[:, 3]] - p0)) / 6.0
+
+  def computeTetrahedraQuality(self, points, tetrahedra, orientation=1.0, chunkSize=200000):
+    """Mean ratio quality measure of tetrahedra: 1 for regular tetrahedron, 0 for degenerate (flat) tetrahedron,
+    negative for inverted tetrahedron (volume sign is opposite of orientation).
+    Large meshes are processed in chunks, using multiple threads (numpy releases the GIL during array operations).
+    """
+    import numpy as np
+    localEdges = np.array(MESH_TETRAHEDRON_EDGES)
+    def computeQuality(chunk):
+      volumes = self.computeTetrahedraVolumes(points, chunk) * orientation
+      edgeVectors = points[chunk[:, localEdges[:, 1]]] - points[chunk[:, localEdges[:, 0]]]
+      sumOfSquaredEdgeLengths = np.einsum('ijk,ijk->i', edgeVectors, edgeVectors)
+      with np.errstate(divide='ignore', invalid='ignore'):
+        quality = np.sign(volumes) * 12.0 * np.power(3.0 * np.abs(volumes), 2.0 / 3.0) / sumOfSquaredEdgeLengths
+      return np.nan_to_num(quality)
+    if len(tetrahedra) <= chunkSize:
+      return computeQuality(tetrahedra)
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+      return np.concatenate(list(executor.map(computeQuality,
+        [tetrahedra[startIndex:startIndex + chunkSize] for startIndex in range(0, len(tetrahedra), chunkSize)])))
+
+  def getMeshQualityStatistics(self, quality, poorQualityThreshold):
+    import numpy as np
+    return {
+      "minimumQuality": float(np.min(quality)) if len(quality) else 0.0,
+      "meanQuality": float(np.mean(quality)) if len(quality) else 0.0,
+      "numberOfPoorElements": int(np.count_nonzero(quality < poorQualityThreshold)),
+      "numberOfInvertedElements": int(np.count_nonzero(quality <= 0)),
+      }
+
+  def smoothMeshNodes(self, points, tetrahedra, quality, orientation, fixedNodes, relaxationFactor=0.5, chunkSize=10000):
+    """Move free nodes towards the average position of their neighbors (one Laplacian smoothing step).
+    A node is only moved if the quality of the worst element around it does not decrease.
+    Nodes are split into independent sets (nodes of a set do not share any element, see getIndependentNodeSets)
+    and the sets are processed one after the other, using the node positions updated by the previous sets.
+    Nodes of a set are processed in chunks of chunkSize nodes, using multiple threads: chunks read and write
+    disjoint parts of the point and quality arrays, and numpy releases the GIL during array operations.
+    Returns the new points, element quality, and number of moved nodes.
+    """
+    import numpy as np
+    numberOfPoints = len(points)
+    points = points.copy()
+    quality = quality.copy()
+    edges = np.sort(tetrahedra[:, MESH_TETRAHEDRON_EDGES].reshape(-1, 2), axis=1)
+    edgeKeys = np.unique(edges[:, 0] * numberOfPoints + edges[:, 1])
+    edges = np.column_stack((edgeKeys // numberOfPoints, edgeKeys % numberOfPoints))
+    movableNodes = np.flatnonzero(~fixedNodes & (np.bincount(edges.ravel(), minlength=numberOfPoints) > 0))
+    if len(movableNodes) == 0:
+      return points, quality, 0
+
+    # Neighbors and elements of each node (node i: items from starts[i] to starts[i + 1])
+    neighborNodes = np.concatenate((edges[:, 1], edges[:, 0]))
+    neighborOrder = np.argsort(np.concatenate((edges[:, 0], edges[:, 1])), kind='stable')
+    neighborNodes = neighborNodes[neighborOrder]
+    neighborStarts = np.searchsorted(np.concatenate((edges[:, 0], edges[:, 1]))[neighborOrder], np.arange(numberOfPoints + 1))
+    cornerNodes = tetrahedra.ravel()
+    cornerOrder = np.argsort(cornerNodes, kind='stable')
+    nodeElements = cornerOrder // 4
+    elementStarts = np.searchsorted(cornerNodes[cornerOrder], np.arange(numberOfPoints + 1))
+
+    def getItemsOfNodes(items, starts, nodes):
+      # Items of the specified nodes, concatenated, and the index of the first item of each node
+      counts = starts[nodes + 1] - starts[nodes]
+      groupStarts = np.cumsum(counts) - counts
+      return items[np.repeat(starts[nodes] - groupStarts, counts) + np.arange(counts.sum())], groupStarts
+
+    def smoothNodes(nodes):
+      neighbors, neighborGroupStarts = getItemsOfNodes(neighborNodes, neighborStarts, nodes)
+      neighborAverage = np.add.reduceat(points[neighbors], neighborGroupStarts, axis=0) / np.diff(np.append(neighborGroupStarts, len(neighbors)))[:, np.newaxis]
+      oldPositions = points[nodes]
+      points[nodes] = oldPositions + relaxationFactor * (neighborAverage - oldPositions)
+      elements, elementGroupStarts = getItemsOfNodes(nodeElements, elementStarts, nodes)
+      newQuality = self.computeTetrahedraQuality(points, tetrahedra[elements], orientation, chunkSize=len(elements))
+      rejected = np.minimum.reduceat(newQuality, elementGroupStarts) < np.minimum.reduceat(quality[elements], elementGroupStarts)
+      points[nodes[rejected]] = oldPositions[rejected]
+      acceptedElements = ~np.repeat(rejected, np.diff(np.append(elementGroupStarts, len(elements))))
+      quality[elements[acceptedElements]] = newQuality[acceptedElements]
+      return int(np.count_nonzero(~rejected))
+
+    from concurrent.futures import ThreadPoolExecutor
+    numberOfMovedNodes = 0
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+      for nodes in self.getIndependentNodeSets(edges, movableNodes, numberOfPoints):
+        if len(nodes) <= chunkSize:
+          numberOfMovedNodes += smoothNodes(nodes)
+        else:
+          numberOfMovedNodes += sum(executor.map(smoothNodes,
+            [nodes[startIndex:startIndex + chunkSize] for startIndex in range(0, len(nodes), chunkSize)]))
+    return points, quality, numberOfMovedNodes
+
+  def getIndependentNodeSets(self, edges, nodes, numberOfPoints):
+    """Split nodes into sets so that nodes of the same set are not connected by an edge (graph coloring).
+    Each node gets a random priority and in each round the nodes that have higher priority than all their
+    remaining neighbors form a new set (Jones-Plassmann algorithm). Random numbers are generated with a fixed seed,
+    therefore the result is reproducible.
+    Returns list of node index arrays.
+    """
+    import numpy as np
+    priority = np.full(numberOfPoints, -1, dtype=np.int64)
+    priority[nodes] = np.random.RandomState(0).permutation(len(nodes))
+    remaining = priority >= 0
+    nodeSets = []
+    while np.any(remaining):
+      edges = edges[remaining[edges[:, 0]] & remaining[edges[:, 1]]]
+      dominated = np.zeros(numberOfPoints, dtype=bool)
+      dominated[edges[priority[edges[:, 0]] < priority[edges[:, 1]], 0]] = True
+      dominated[edges[priority[edges[:, 1]] < priority[edges[:, 0]], 1]] = True
+      nodeSet = np.flatnonzero(remaining & ~dominated)
+      nodeSets.append(nodeSet)
+      remaining[nodeSet] = False
+    return nodeSets
+
+  def flipMeshEdges(self, points, tetrahedra, labels, quality, orientation, poorQualityThreshold):
+    """Remove slivers by 3-2 edge flips: an interior edge that is shared by exactly three elements of the same label
+    is removed and the three elements are replaced by two, if it improves the quality of the worst element.
+    Only edges of elements with quality below poorQualityThreshold are considered.
+    Returns new tetrahedra, labels, and quality, index of the input element for each output element, and number of flips.
+    """
+    import numpy as np
+    numberOfElements = len(tetrahedra)
+    unchangedResult = (tetrahedra, labels, quality, np.arange(numberOfElements), 0)
+
+    # Find edges that are shared by exactly three elements
+    edges = np.sort(tetrahedra[:, MESH_TETRAHEDRON_EDGES].reshape(-1, 2), axis=1)
+    edgeKeys = edges[:, 0] * len(points) + edges[:, 1]
+    order = np.argsort(edgeKeys, kind='stable')
+    uniqueKeys, firstIndices, counts = np.unique(edgeKeys[order], return_index=True, return_counts=True)
+    firstIndices = firstIndices[counts == 3]
+    elementIndices = order[firstIndices[:, np.newaxis] + np.arange(3)] // len(MESH_TETRAHEDRON_EDGES)
+    edgeNodes = edges[order[firstIndices]]
+
+    # Only consider edges of poor quality elements, within a single region
+    candidates = (np.any(quality[elementIndices] < poorQualityThreshold, axis=1)
+      & np.all(labels[elementIndices] == labels[elementIndices[:, :1]], axis=1))
+    elementIndices = elementIndices[candidates]
+    edgeNodes = edgeNodes[candidates]
+    if len(elementIndices) == 0:
+      return unchangedResult
+
+    # Nodes of the three elements that are not on the edge form a closed ring around interior edges
+    elementNodes = tetrahedra[elementIndices]
+    isRingNode = (elementNodes != edgeNodes[:, 0, np.newaxis, np.newaxis]) & (elementNodes != edgeNodes[:, 1, np.newaxis, np.newaxis])
+    ringNodes = np.sort(elementNodes[isRingNode].reshape(-1, 6), axis=1)
+    closedRing = (np.all(ringNodes[:, 0::2] == ringNodes[:, 1::2], axis=1)
+      & (ringNodes[:, 1] != ringNodes[:, 2]) & (ringNodes[:, 3] != ringNodes[:, 4]))
+    ringNodes = ringNodes[:, 0::2]
+
+    # Replace the three elements by the ring triangle connected to each edge node
+    newElements = []
+    newElementsQuality = []
+    for edgeNodeIndex in range(2):
+      newElementsForEdgeNode = np.column_stack((ringNodes, edgeNodes[:, edgeNodeIndex]))
+      inverted = self.computeTetrahedraVolumes(points, newElementsForEdgeNode) * orientation < 0
+      newElementsForEdgeNode[inverted, 0], newElementsForEdgeNode[inverted, 1] = ringNodes[inverted, 1], ringNodes[inverted, 0]
+      newElements.append(newElementsForEdgeNode)
+      newElementsQuality.append(self.computeTetrahedraQuality(points, newElementsForEdgeNode, orientation))
+    worstQualityBefore = np.min(quality[elementIndices], axis=1)
+    worstQualityAfter = np.minimum(newElementsQuality[0], newElementsQuality[1])
+    # Edge nodes must be on opposite sides of the ring triangle (otherwise the new elements would overlap)
+    edgeCrossesRing = (self.computeTetrahedraVolumes(points, np.column_stack((ringNodes, edgeNodes[:, 0])))
+      * self.computeTetrahedraVolumes(points, np.column_stack((ringNodes, edgeNodes[:, 1]))) < 0)
+    improving = np.nonzero(closedRing & edgeCrossesRing & (worstQualityAfter > worstQualityBefore) & (worstQualityAfter > 0))[0]
+    if len(improving) == 0:
+      return unchangedResult
+
+    # An element can only be replaced by one flip, flips with the largest improvement are performed first
+    improving = improving[np.argsort(worstQualityBefore[improving] - worstQualityAfter[improving], kind='stable')]
+    replacedElements = np.zeros(numberOfElements, dtype=bool)
+    flips = []
+    for candidateIndex in improving:
+      if not np.any(replacedElements[elementIndices[candidateIndex]]):
+        replacedElements[elementIndices[candidateIndex]] = True
+        flips.append(candidateIndex)
+    flips = np.array(flips)
+
+    keptElements = np.nonzero(~replacedElements)[0]
+    sourceElements = np.concatenate((keptElements, elementIndices[flips, 0], elementIndices[flips, 0]))
+    tetrahedra = np.vstack((tetrahedra[keptElements], newElements[0][flips], newElements[1][flips]))
+    quality = np.concatenate((quality[keptElements], newElementsQuality[0][flips], newElementsQuality[1][flips]))
+    return tetrahedra, labels[sourceElements], quality, sourceElements, len(flips)
+
+class SegmentMesherLocalBackend(object):
+  """Runs the mesher on this computer.
+  """
+
+  def runMesher(self, logic, method, cmdLineArguments, workingDirectory):
+    if method == METHOD_CLEAVER:
+      ep = logic.startMesher(cmdLineArguments, logic.getCleaverPath())
+      logic.logProcessOutput(ep, logic.cleaverFilename)
+    else:
+      ep = logic.startMesher(cmdLineArguments, logic.getTetGenPath())
+      logic.logProcessOutput(ep, logic.tetGenFilename)
+
+
+class SegmentMesherRemoteBackend(object):
+  """Runs the mesher on a meshing server (see SegmentMesherLib/MeshingWorker.py).
+  Files in the working directory are uploaded as mesher inputs (files that are already on the server are not uploaded again),
+  mesher output is streamed to the log, and files created by the mesher are downloaded into the working directory.
+  """
+
+  def __init__(self, serverUrl, timeout=60):
+    self.serverUrl = serverUrl.rstrip("/")
+    self.timeout = timeout
+
+  def request(self, method, path, data=None, headers=None, timeout=-1):
+    import urllib.request
+    request = urllib.request.Request(self.serverUrl + path, data=data, method=method, headers=headers or {})
+    return urllib.request.urlopen(request, timeout=self.timeout if timeout == -1 else timeout)
+
+  def requestJson(self, method, path, value=None):
+    import json
+    data = json.dumps(value).encode("utf-8") if value is not None else None
+    with self.request(method, path, data, {"Content-Type": "application/json"}) as response:
+      return json.loads(response.read().decode("utf-8"))
+
+  def uploadInputs(self, workingDirectory):
+    """Upload all files in the working directory that are not on the server yet.
+    Returns dictionary of relative file path and content hash of each file.
+    """
+    import hashlib
+    import urllib.error
+    inputs = {}
+    for dirPath, dirNames, fileNames in os.walk(workingDirectory):
+      for fileName in fileNames:
+        filePath = os.path.join(dirPath, fileName)
+        sha256 = hashlib.sha256()
+        with open(filePath, "rb") as inputFile:
+          for chunk in iter(lambda: inputFile.read(1024*1024), b""):
+            sha256.update(chunk)
+        fileHash = sha256.hexdigest()
+        try:
+          self.request("HEAD", "/blobs/" + fileHash).close()
+        except urllib.error.HTTPError as e:
+          if e.code != 404:
+            raise
+          with open(filePath, "rb") as inputFile:
+            self.request("PUT", "/blobs/" + fileHash, inputFile, {"Content-Type": "application/octet-stream",
+              "Content-Length": str(os.path.getsize(filePath))}).close()
+        inputs[os.path.relpath(filePath, workingDirectory).replace(os.sep, "/")] = fileHash
+    return inputs
+
+  def runMesher(self, logic, method, cmdLineArguments, workingDirectory):
+    import shutil
+    import tempfile
+    import time
+    import zipfile
+    from SegmentMesherLib.MeshingWorker import WORKING_DIRECTORY_PLACEHOLDER, JOB_STATUS_COMPLETED
+
+    # Replace local working directory in the arguments, as it is different on the server
+    localDirectory = workingDirectory.replace("\\", "/").rstrip("/")
+    remoteArguments = []
+    for argument in cmdLineArguments:
+      if localDirectory in argument.replace("\\", "/"):
+        argument = argument.replace("\\", "/").replace(localDirectory, WORKING_DIRECTORY_PLACEHOLDER)
+      remoteArguments.append(argument)
+
+    logic.addLog("Uploading inputs to meshing server " + self.serverUrl + "...")
+    inputs = self.uploadInputs(workingDirectory)
+    jobRequest = {
+      "mesher": "cleaver" if method == METHOD_CLEAVER else "tetgen",
+      "arguments": remoteArguments,
+      "inputs": inputs,
+      "maximumMemoryUsage": logic.maximumMemoryUsage,
+      }
+    logic.addLog("Generating volumetric mesh...")
+    logging.info("Generate mesh on " + self.serverUrl + ": " + repr(jobRequest))
+    logic.mesherStartTime = time.time()
+    logic.resourceLimitExceeded = None
+    logic.resourceLimitType = None
+    jobId = self.requestJson("POST", "/jobs", jobRequest)["id"]
+    try:
+      processOutput = self.logJobOutput(logic, jobId)
+      status = self.requestJson("GET", "/jobs/" + jobId)
+      logic.lastRunTime = status["runTime"]
+      logic.lastRunPeakMemory = status["peakMemory"]
+      if status["status"] != JOB_STATUS_COMPLETED:
+        if logic.abortRequested:
+          raise ValueError("User requested cancel.")
+        if processOutput:
+          logic.addLog(processOutput)
+        if not logic.resourceLimitExceeded:
+          logic.resourceLimitExceeded = status["resourceLimitExceeded"]
+          logic.resourceLimitType = status.get("resourceLimitType")
+        if logic.resourceLimitExceeded:
+          raise ValueError("Mesher is stopped: {0}".format(logic.resourceLimitExceeded))
+        raise ValueError("Mesher failed on the meshing server (status: {0}, return code: {1})".format(status["status"], status["returnCode"]))
+      logic.addLog("Downloading results from meshing server...")
+      with self.request("GET", "/jobs/{0}/result".format(jobId), timeout=None) as response, tempfile.TemporaryFile() as archiveFile:
+        shutil.copyfileobj(response, archiveFile)
+        with zipfile.ZipFile(archiveFile) as resultArchive:
+          resultArchive.extractall(workingDirectory)
+    finally:
+      try:
+        self.request("DELETE", "/jobs/" + jobId).close()
+      except Exception as e:
+        logging.warning("Failed to delete job {0} on the meshing server: {1}".format(jobId, e))
+
+  def logJobOutput(self, logic, jobId):
+    """Log output lines of the job while it is running and enforce time limit. Returns output that is not logged yet.
+    """
+    import queue
+    import threading
+    import time
+    from SegmentMesherLib.MeshingWorker import RESOURCE_LIMIT_TIME
+
+    # Read log stream in a separate thread to keep the application responsive while the mesher output is waited for
+    outputLines = queue.Queue()
+    def readLog():
+      try:
+        with self.request("GET", "/jobs/{0}/log".format(jobId), timeout=None) as response:
+          for line in response:
+            outputLines.put(line.decode("utf-8").rstrip())
+      except Exception as e:
+        outputLines.put(e)
+      outputLines.put(None)
+    logThread = threading.Thread(target=readLog)
+    logThread.daemon = True
+    logThread.start()
+
+    processOutput = ''
+    cancelRequested = False
+    jobFinished = False
+    try:
+      while True:
+        if logic.mesherIdleCallback:
+          logic.mesherIdleCallback()
+        if not cancelRequested:
+          if logic.maximumRunTime and time.time() - logic.mesherStartTime > logic.maximumRunTime:
+            logic.resourceLimitType = RESOURCE_LIMIT_TIME
+            logic.resourceLimitExceeded = "computation time exceeded {0:.0f} s".format(logic.maximumRunTime)
+          if logic.abortRequested or logic.resourceLimitExceeded:
+            self.request("POST", "/jobs/{0}/cancel".format(jobId)).close()
+            cancelRequested = True
+        try:
+          line = outputLines.get(timeout=0.1)
+        except queue.Empty:
+          continue
+        if line is None:
+          jobFinished = True
+          break
+        if isinstance(line, Exception):
+          raise line
+        if logic.logStandardOutput:
+          logic.addLog(line)
+        else:
+          processOutput += line + '\n'
+        logic.updateMesherProgress(line)
+    finally:
+      # Job is not left running on the server if waiting for the output is interrupted
+      if not jobFinished and not cancelRequested:
+        try:
+          self.request("POST", "/jobs/{0}/cancel".format(jobId)).close()
+        except Exception as e:
+          logging.warning("Failed to cancel job {0} on the meshing server: {1}".format(jobId, e))
+    return processOutput
+
+
 class SegmentMesherTest(ScriptedLoadableModuleTest):
   """
   This is the test case for your scripted module.
@@ -925,6 +3543,34 @@ class SegmentMesherTest(ScriptedLoadableModuleTest):
     """
     self.setUp()
     self.test_TetGen1()
+    self.setUp()
+    self.test_TetGenRemoteBackend1()
+    self.setUp()
+    self.test_SizingFieldBackgroundMesh1()
+    self.setUp()
+    self.test_TetGenMeshWriter1()
+    self.setUp()
+    self.test_RefinementRegion1()
+    self.setUp()
+    self.test_CleaverMaterialFields1()
+    self.setUp()
+    self.test_CleaverArguments1()
+    self.setUp()
+    self.test_CostEstimate1()
+    self.setUp()
+    self.test_MeshExport1()
+    self.setUp()
+    self.test_MapVolumeToMesh1()
+    self.setUp()
+    self.test_SegmentClosedSurfaces1()
+    self.setUp()
+    self.test_ResourceLimits1()
+    self.setUp()
+    self.test_SegmentSelector1()
+    self.setUp()
+    self.test_MeshOptimization1()
+    self.setUp()
+    self.test_MesherProgress1()
 
   def test_TetGen1(self):
     """ Ideally you should have several levels of tests.  At the lowest level
@@ -967,5 +3613,839 @@ class SegmentMesherTest(ScriptedLoadableModuleTest):
 
     self.delayDisplay('Test passed!')
 
+  def test_TetGenRemoteBackend1(self):
+    """Run TetGen through a meshing worker server running on localhost.
+    """
+    import threading
+    from SegmentMesherLib import MeshingWorker
+
+    self.delayDisplay("Starting the test")
+
+    logic = SegmentMesherLogic()
+    workDirectory = os.path.join(logic.createTempDirectory(), "MeshingWorker")
+    server = MeshingWorker.createServer("localhost", 0, workDirectory, {"tetgen": logic.getTetGenPath()})
+    serverThread = threading.Thread(target=server.serve_forever)
+    serverThread.daemon = True
+    serverThread.start()
+
+    try:
+      sphere = vtk.vtkSphereSource()
+      sphere.SetRadius(10)
+      sphere.Update()
+      logic.backend = SegmentMesherRemoteBackend("http://localhost:{0}".format(server.server_address[1]))
+      outputModelNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLModelNode")
+      logic.createMeshFromPolyDataTetGen(sphere.GetOutput(), outputModelNode, '', 100, 0, 100)
+      self.assertTrue(outputModelNode.GetMesh().GetNumberOfCells()>0)
+
+      # Same input is not uploaded again
+      numberOfBlobs = len(os.listdir(server.worker.blobsDirectory))
+      logic.createMeshFromPolyDataTetGen(sphere.GetOutput(), outputModelNode, '', 100, 0, 100)
+      self.assertEqual(len(os.listdir(server.worker.blobsDirectory)), numberOfBlobs)
+    finally:
+      server.shutdown()
+      server.server_close()
+
+    self.delayDisplay('Test passed!')
+
+  def createTestMesh(self, points, tetrahedra, labels=None):
+    """Create a vtkUnstructuredGrid from point coordinates and point indices of tetrahedra.
+    """
+    mesh = vtk.vtkUnstructuredGrid()
+    meshPoints = vtk.vtkPoints()
+    for point in points:
+      meshPoints.InsertNextPoint(point)
+    mesh.SetPoints(meshPoints)
+    for tetrahedron in tetrahedra:
+      pointIds = vtk.vtkIdList()
+      for pointIndex in tetrahedron:
+        pointIds.InsertNextId(int(pointIndex))
+      mesh.InsertNextCell(vtk.VTK_TETRA, pointIds)
+    if labels is not None:
+      labelsArray = vtk.vtkIntArray()
+      labelsArray.SetName("labels")
+      for label in labels:
+        labelsArray.InsertNextValue(int(label))
+      mesh.GetCellData().AddArray(labelsArray)
+    return mesh
+
+  def test_SizingFieldBackgroundMesh1(self):
+    """Write a small sizing field volume as TetGen background mesh and check the written files.
+    """
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    sizes = np.arange(1.0, 25.0, dtype=np.float32).reshape(2, 3, 4)  # indexed as [k, j, i]
+    sizingFieldNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode")
+    slicer.util.updateVolumeFromArray(sizingFieldNode, sizes)
+    sizingFieldNode.SetSpacing(1.0, 2.0, 3.0)
+    sizingFieldNode.SetOrigin(10.0, 20.0, 30.0)
+    transformNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode")
+    translation = vtk.vtkTransform()
+    translation.Translate(100.0, 0.0, 0.0)
+    transformNode.SetMatrixTransformToParent(translation.GetMatrix())
+    sizingFieldNode.SetAndObserveTransformNodeID(transformNode.GetID())
+
+    logic = SegmentMesherLogic()
+    fileBasePath = os.path.join(logic.createTempDirectory(), "mesh.b")
+
+    # Input surface is under the same transform as the sizing field, therefore local coordinates are written
+    logic.writeTetGenBackgroundMesh(sizingFieldNode, fileBasePath, inputTransformNode=transformNode)
+    with open(fileBasePath + ".node") as nodeFile:
+      self.assertEqual(nodeFile.readline().split(), ["24", "3", "0", "0"])
+    nodes = np.loadtxt(fileBasePath + ".node", skiprows=1)
+    elements = np.loadtxt(fileBasePath + ".ele", skiprows=1, dtype=int)
+    metrics = np.loadtxt(fileBasePath + ".mtr", skiprows=1)
+    self.assertEqual(nodes.shape, (24, 4))
+    self.assertEqual(elements.shape, (6 * 1 * 2 * 3, 5))
+    self.assertEqual(metrics.shape, (24,))
+    np.testing.assert_allclose(nodes[0, 1:], [10.0, 20.0, 30.0])
+    np.testing.assert_allclose(nodes[-1, 1:], [13.0, 24.0, 33.0])
+    np.testing.assert_allclose(metrics, sizes.ravel())
+
+    # Elements are positively oriented and fill the volume
+    points = nodes[:, 1:]
+    tetrahedra = elements[:, 1:] - 1
+    edges = points[tetrahedra[:, 1:]] - points[tetrahedra[:, :1]]
+    signedVolumes = np.einsum('ij,ij->i', np.cross(edges[:, 0], edges[:, 1]), edges[:, 2]) / 6.0
+    self.assertTrue(np.all(signedVolumes > 0))
+    self.assertAlmostEqual(signedVolumes.sum(), 3.0 * 4.0 * 3.0)
+
+    # Input surface is not transformed, therefore world coordinates are written
+    logic.writeTetGenBackgroundMesh(sizingFieldNode, fileBasePath)
+    nodes = np.loadtxt(fileBasePath + ".node", skiprows=1)
+    np.testing.assert_allclose(nodes[0, 1:], [110.0, 20.0, 30.0])
+
+    self.delayDisplay('Test passed!')
+
+  def test_TetGenMeshWriter1(self):
+    """Write a mesh for refinement in TetGen format and check the written files.
+    """
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    points = [[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 1, 1]]
+    tetrahedra = [[0, 1, 2, 3], [1, 2, 3, 4]]
+    mesh = self.createTestMesh(points, tetrahedra, labels=[1, 2])
+
+    logic = SegmentMesherLogic()
+    np.testing.assert_array_equal(logic.getTetrahedra(mesh), tetrahedra)
+
+    fileBasePath = os.path.join(logic.createTempDirectory(), "mesh")
+    logic.writeTetGenMesh(mesh, fileBasePath, elementVolumeConstraints=[0.5, 0])
+    nodes = np.loadtxt(fileBasePath + ".node", skiprows=1)
+    elements = np.loadtxt(fileBasePath + ".ele", skiprows=1, dtype=int)
+    volumes = np.loadtxt(fileBasePath + ".vol", skiprows=1)
+    with open(fileBasePath + ".ele") as elementFile:
+      self.assertEqual(elementFile.readline().split(), ["2", "4", "1"])
+    np.testing.assert_allclose(nodes[:, 1:], points)
+    # Indices are 1-based, element label is written as attribute
+    np.testing.assert_array_equal(elements, [[1, 1, 2, 3, 4, 1], [2, 2, 3, 4, 5, 2]])
+    # Non-positive constraint means unconstrained element
+    np.testing.assert_allclose(volumes, [[1, 0.5], [2, -1.0]])
+
+    with self.assertRaises(ValueError):
+      logic.writeTetGenMesh(mesh, fileBasePath, elementVolumeConstraints=[0.5])
+
+    # Meshes that contain other cell types are rejected
+    triangle = vtk.vtkIdList()
+    for pointIndex in [0, 1, 2]:
+      triangle.InsertNextId(pointIndex)
+    mesh.InsertNextCell(vtk.VTK_TRIANGLE, triangle)
+    with self.assertRaises(ValueError):
+      logic.getTetrahedra(mesh)
+
+    self.delayDisplay('Test passed!')
+
+  def test_RefinementRegion1(self):
+    """Compute element volume constraints in a rotated region of interest for a transformed mesh.
+    """
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    # Element centroids are at (0.25, 0.25, 0.25) and (10.25, 0.25, 0.25) in the mesh coordinate system
+    points = [[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1], [10, 0, 0], [11, 0, 0], [10, 1, 0], [10, 0, 1]]
+    tetrahedra = [[0, 1, 2, 3], [4, 5, 6, 7]]
+    mesh = self.createTestMesh(points, tetrahedra)
+    meshNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLModelNode")
+    meshNode.SetAndObserveMesh(mesh)
+    meshTransform = vtk.vtkTransform()
+    meshTransform.Translate(100, 0, 0)
+    meshTransformNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode")
+    meshTransformNode.SetMatrixTransformToParent(meshTransform.GetMatrix())
+    meshNode.SetAndObserveTransformNodeID(meshTransformNode.GetID())
+
+    # ROI is rotated by 90 degrees around the z axis: it spans x = [109, 111], y = [-10, 10] in world coordinates,
+    # therefore it contains the centroid of the second element (110.25, 0.25, 0.25) only
+    roiNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLMarkupsROINode")
+    roiNode.SetCenter([0, -110, 0])
+    roiNode.SetSize([20, 2, 2])
+    roiTransform = vtk.vtkTransform()
+    roiTransform.RotateZ(90)
+    roiTransformNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode")
+    roiTransformNode.SetMatrixTransformToParent(roiTransform.GetMatrix())
+    roiNode.SetAndObserveTransformNodeID(roiTransformNode.GetID())
+
+    logic = SegmentMesherLogic()
+    np.testing.assert_allclose(logic.getElementVolumeConstraintsInRegion(meshNode, 0.5, roiNode), [-1.0, 0.5])
+    # Mesh points are in the local coordinate system of the specified transform
+    np.testing.assert_allclose(logic.getElementVolumeConstraintsInRegion(mesh, 0.5, roiNode, meshTransformNode), [-1.0, 0.5])
+    np.testing.assert_allclose(logic.getElementVolumeConstraintsInRegion(mesh, 0.5, roiNode), [-1.0, -1.0])
+
+    # Input size of refinement: number of boundary points and mesh volume
+    numberOfBoundaryPoints, meshVolume = logic.getInputSizeTetGenFromMesh(mesh)
+    self.assertEqual(numberOfBoundaryPoints, 8)
+    self.assertAlmostEqual(meshVolume, 2.0 / 6.0)
+
+    self.delayDisplay('Test passed!')
+
+  def createTestSegmentation(self, labels):
+    """Create a segmentation node from a labelmap array (indexed as [k, j, i]), with one segment for each label value.
+    Returns the segmentation node and the labelmap volume node.
+    """
+    labelmapVolumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode")
+    slicer.util.updateVolumeFromArray(labelmapVolumeNode, labels)
+    segmentationNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLSegmentationNode")
+    slicer.modules.segmentations.logic().ImportLabelmapToSegmentationNode(labelmapVolumeNode, segmentationNode)
+    return segmentationNode, labelmapVolumeNode
+
+  def test_CleaverMaterialFields1(self):
+    """Compute per-segment material fields for Cleaver and check the written files.
+    """
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    labels = np.zeros((6, 8, 10), dtype=np.uint8)
+    labels[1:5, 1:4, 1:5] = 1
+    labels[1:5, 4:7, 2:8] = 2
+    segmentationNode, labelmapVolumeNode = self.createTestSegmentation(labels)
+    segmentIds = list(segmentationNode.GetSegmentation().GetSegmentIDs())
+    self.assertEqual(len(segmentIds), 2)
+
+    logic = SegmentMesherLogic()
+    outputDirectory = logic.createTempDirectory()
+    numberOfNodes = slicer.mrmlScene.GetNumberOfNodes()
+
+    materialFieldFilePaths = logic.exportSegmentMaterialFields(segmentationNode, segmentIds, labelmapVolumeNode, outputDirectory,
+      CLEAVER_MATERIAL_FIELD_INDICATOR)
+    self.assertEqual(slicer.mrmlScene.GetNumberOfNodes(), numberOfNodes)
+    self.assertEqual(len(materialFieldFilePaths), 3)
+    indicatorFields = [slicer.util.arrayFromVolume(slicer.util.loadVolume(filePath)) for filePath in materialFieldFilePaths]
+    np.testing.assert_array_equal(indicatorFields[0], labels == 0)
+    np.testing.assert_array_equal(indicatorFields[1], labels == 1)
+    np.testing.assert_array_equal(indicatorFields[2], labels == 2)
+
+    materialFieldFilePaths = logic.exportSegmentMaterialFields(segmentationNode, segmentIds, labelmapVolumeNode, outputDirectory,
+      CLEAVER_MATERIAL_FIELD_DISTANCE)
+    distanceFields = [slicer.util.arrayFromVolume(slicer.util.loadVolume(filePath)) for filePath in materialFieldFilePaths]
+    # Signed distance is positive inside the material, the material with the largest value wins at each voxel
+    np.testing.assert_array_equal(np.argmax(distanceFields, axis=0), labels)
+
+    self.delayDisplay('Test passed!')
+
+  def test_CleaverArguments1(self):
+    """Check Cleaver command-line arguments for each input material field type.
+    """
+    from SegmentMesherLib import MeshingWorker
+
+    self.delayDisplay("Starting the test")
+
+    logic = SegmentMesherLogic()
+    outputDirectory = logic.createTempDirectory()
+    labelmapFilePath = os.path.join(outputDirectory, "inputLabelmap.nrrd")
+    materialFieldFilePaths = [os.path.join(outputDirectory, "material{0}.nrrd".format(materialIndex)) for materialIndex in range(3)]
+    sizingFieldFilePath = os.path.join(outputDirectory, "sizingField.nrrd")
+
+    arguments = logic.getCleaverArguments([labelmapFilePath], CLEAVER_MATERIAL_FIELD_LABELMAP, outputDirectory, 2, 0.2, 0.2)
+    self.assertEqual(arguments, ["--input_files", labelmapFilePath, "--feature_scaling", "2.00", "--sampling_rate", "0.20",
+      "--lipschitz", "0.20", "--output_path", outputDirectory + "/", "--output_format", "vtkUSG", "--fix_tet_windup",
+      "--strip_exterior", "--verbose"])
+    # All options must be known Cleaver options and all files must be in the working directory
+    MeshingWorker.checkMesherArguments("cleaver", arguments, outputDirectory)
+
+    for materialFieldType in [CLEAVER_MATERIAL_FIELD_INDICATOR, CLEAVER_MATERIAL_FIELD_DISTANCE]:
+      arguments = logic.getCleaverArguments(materialFieldFilePaths, materialFieldType, outputDirectory, 1.5, 0.3, 0.25,
+        sizingFieldFilePath, "--alpha 0.5")
+      # Each material field is a separate input file, Cleaver must use them as indicator functions
+      self.assertEqual(arguments[:5], ["--input_files"] + materialFieldFilePaths + ["--indicator_functions"])
+      self.assertEqual(arguments[5:13], ["--sizing_field", sizingFieldFilePath, "--feature_scaling", "1.50",
+        "--sampling_rate", "0.30", "--lipschitz", "0.25"])
+      self.assertEqual(arguments[-2:], ["--alpha", "0.5"])
+      MeshingWorker.checkMesherArguments("cleaver", arguments, outputDirectory)
+
+    self.delayDisplay('Test passed!')
+
+  def test_CostEstimate1(self):
+    """Estimate cost of TetGen meshing from synthetic run history records.
+    """
+    import json
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    logic = SegmentMesherLogic()
+    runHistoryFilePath = os.path.join(logic.createTempDirectory(), "RunHistory.json")
+    logic.getRunHistoryFilePath = lambda: runHistoryFilePath
+
+    # Number of elements is proportional to the enclosed volume divided by the maximum element volume
+    with open(runHistoryFilePath, "w") as runHistoryFile:
+      for maximumVolume in [1.0, 2.0, 5.0, 10.0]:
+        for numberOfSurfacePoints, enclosedVolume in [(1000, 1000.0), (4000, 8000.0)]:
+          runHistoryFile.write(json.dumps({"method": METHOD_TETGEN, "inputSize": [numberOfSurfacePoints, enclosedVolume],
+            "parameters": {"ratio": 2.0, "angle": 0.0, "volume": maximumVolume},
+            "numberOfElements": 6.0 * enclosedVolume / maximumVolume, "runtime": 1e-4 * enclosedVolume / maximumVolume}) + "\n")
+    estimate = logic.estimateCost(METHOD_TETGEN, [2000, 4000.0], {"ratio": 2.0, "angle": 0.0, "volume": 4.0})
+    self.assertEqual(estimate["numberOfRuns"], 8)
+    self.assertAlmostEqual(estimate["numberOfElements"] / 6000.0, 1.0, delta=0.2)
+    self.assertAlmostEqual(estimate["runtime"] / 0.1, 1.0, delta=0.2)
+    self.assertNotIn("peakMemory", estimate)
+    self.assertIsNone(logic.estimateCost(METHOD_CLEAVER, [1000], {"featureScale": 2.0, "samplingRate": 0.2, "rateOfChange": 0.2}))
+
+    # Input size of selected segments is estimated from the binary labelmap: a 4x4x4 voxel cube
+    # has 6*4*4 boundary voxel faces
+    labels = np.zeros((10, 10, 10), dtype=np.uint8)
+    labels[2:6, 2:6, 2:6] = 1
+    labels[7:9, 7:9, 7:9] = 2
+    segmentationNode, labelmapVolumeNode = self.createTestSegmentation(labels)
+    segmentationNode.RemoveClosedSurfaceRepresentation()
+    segmentIds = list(segmentationNode.GetSegmentation().GetSegmentIDs())
+    inputSize = logic.getInputSizeTetGenFromSegmentation(segmentationNode, segmentIds[:1])
+    self.assertEqual(inputSize[0], 96)
+    self.assertAlmostEqual(inputSize[1], 64.0)
+
+    # Estimate does not modify the parameter node
+    parameterNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScriptedModuleNode")
+    parameterNode.SetParameter("Method", "TetGen")
+    parameterNode.SetNodeReferenceID("InputSegmentation", segmentationNode.GetID())
+    logic.setSelectedSegmentIds(parameterNode, segmentIds[:1])
+    modifiedTime = parameterNode.GetMTime()
+    self.assertIsNotNone(logic.estimatePresetCost(parameterNode, "FEM coarse"))
+    self.assertEqual(parameterNode.GetMTime(), modifiedTime)
+    self.assertFalse(segmentationNode.GetSegmentation().ContainsRepresentation(
+      slicer.vtkSegmentationConverter.GetSegmentationClosedSurfaceRepresentationName()))
+
+    # Input size is computed again only if the selected segments or the segmentation are modified
+    numberOfCachedInputs = len(logic.costEstimateInputCache)
+    logic.estimatePresetCost(parameterNode, "FEM fine")
+    self.assertEqual(len(logic.costEstimateInputCache), numberOfCachedInputs)
+    logic.setSelectedSegmentIds(parameterNode, segmentIds)
+    logic.estimatePresetCost(parameterNode, "FEM fine")
+    self.assertEqual(len(logic.costEstimateInputCache), numberOfCachedInputs + 1)
+    segmentationNode.GetSegmentation().GetSegment(segmentIds[0]).GetRepresentation(
+      slicer.vtkSegmentationConverter.GetSegmentationBinaryLabelmapRepresentationName()).Modified()
+    logic.estimatePresetCost(parameterNode, "FEM fine")
+    self.assertEqual(len(logic.costEstimateInputCache), numberOfCachedInputs + 2)
+
+    # Run history is parsed again only after it is modified
+    runs = logic.getRunHistory()
+    self.assertIs(logic.getRunHistory(), runs)
+    logic.lastRunTime = 2.0
+    logic.lastRunPeakMemory = None
+    logic.lastRunPhaseStartTimes = None
+    logic.recordRun(METHOD_TETGEN, [1000, 1000.0], {"ratio": 2.0, "angle": 0.0, "volume": 1.0}, 6000)
+    self.assertEqual(len(logic.getRunHistory()), len(runs) + 1)
+
+    self.delayDisplay('Test passed!')
+
+  def test_MeshExport1(self):
+    """Export a mesh of two elements with different labels to Abaqus, Gmsh, and FEBio formats and read it back.
+    """
+    import numpy as np
+    import xml.etree.ElementTree as ElementTree
+
+    self.delayDisplay("Starting the test")
+
+    points = [[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 1, 1]]
+    tetrahedra = [[0, 1, 2, 3], [1, 2, 3, 4]]
+    mesh = self.createTestMesh(points, tetrahedra, labels=[1, 2])
+    labelNames = {1: "bone", 2: "soft tissue"}
+
+    logic = SegmentMesherLogic()
+    outputDirectory = logic.createTempDirectory()
+
+    # Faces are matched the same way if processed in multiple passes
+    surfaces = logic.getMeshSurfaces(np.array(tetrahedra), np.array([1, 2]))
+    self.assertEqual([(surfaceName, faceIndices.tolist()) for surfaceName, faceIndices in surfaces],
+      [("boundary_1", [0, 1, 3]), ("boundary_2", [5, 6, 7]), ("interface_1_2", [2])])
+    surfacesMultiPass = logic.getMeshSurfaces(np.array(tetrahedra), np.array([1, 2]), maximumNumberOfFacesPerPass=2, chunkSize=1)
+    self.assertEqual([(surfaceName, faceIndices.tolist()) for surfaceName, faceIndices in surfacesMultiPass],
+      [(surfaceName, faceIndices.tolist()) for surfaceName, faceIndices in surfaces])
+
+    # Abaqus
+    abaqusFilePath = os.path.join(outputDirectory, "mesh.inp")
+    logic.exportMesh(mesh, abaqusFilePath, labelNames)
+    sections = {}
+    with open(abaqusFilePath) as abaqusFile:
+      for line in abaqusFile.read().splitlines():
+        if line.startswith("*"):
+          sectionRows = sections.setdefault(line, [])
+        else:
+          sectionRows.append([value.strip() for value in line.split(",")])
+    np.testing.assert_allclose(np.array(sections["*NODE"], dtype=float), np.column_stack((np.arange(1, 6), points)))
+    self.assertEqual(sections["*ELEMENT, TYPE=C3D4, ELSET=bone"], [["1", "1", "2", "3", "4"]])
+    self.assertEqual(sections["*ELEMENT, TYPE=C3D4, ELSET=soft_tissue"], [["2", "2", "3", "4", "5"]])
+    self.assertEqual(sections["*SURFACE, NAME=boundary_1, TYPE=ELEMENT"], [["1", "S1"], ["1", "S2"], ["1", "S4"]])
+    self.assertEqual(sections["*SURFACE, NAME=interface_1_2, TYPE=ELEMENT"], [["1", "S3"]])
+
+    # Gmsh (binary)
+    gmshFilePath = os.path.join(outputDirectory, "mesh.msh")
+    logic.exportMesh(mesh, gmshFilePath, labelNames)
+    with open(gmshFilePath, "rb") as gmshFile:
+      gmshData = gmshFile.read()
+    self.assertTrue(gmshData.startswith(b"$MeshFormat\n2.2 1 8\n"))
+    nodesStart = gmshData.index(b"$Nodes\n") + len(b"$Nodes\n")
+    numberOfNodesEnd = gmshData.index(b"\n", nodesStart)
+    self.assertEqual(int(gmshData[nodesStart:numberOfNodesEnd]), 5)
+    nodes = np.frombuffer(gmshData, dtype=[('id', np.int32), ('position', np.float64, (3,))], count=5, offset=numberOfNodesEnd + 1)
+    np.testing.assert_array_equal(nodes['id'], np.arange(1, 6))
+    np.testing.assert_allclose(nodes['position'], points)
+    elementsStart = gmshData.index(b"$Elements\n") + len(b"$Elements\n")
+    numberOfElementsEnd = gmshData.index(b"\n", elementsStart)
+    numberOfElements = int(gmshData[elementsStart:numberOfElementsEnd])
+    self.assertEqual(numberOfElements, 2 + 7)
+    offset = numberOfElementsEnd + 1
+    elements = {}  # element type: list of (physical tag, node ids)
+    numberOfReadElements = 0
+    while numberOfReadElements < numberOfElements:
+      elementType, numberOfBlockElements, numberOfTags = np.frombuffer(gmshData, dtype=np.int32, count=3, offset=offset)
+      offset += 3 * 4
+      numberOfNodesPerElement = {2: 3, 4: 4}[elementType]
+      records = np.frombuffer(gmshData, dtype=np.int32, count=numberOfBlockElements * (1 + numberOfTags + numberOfNodesPerElement),
+        offset=offset).reshape(numberOfBlockElements, -1)
+      offset += records.nbytes
+      for record in records:
+        elements.setdefault(elementType, []).append((record[0], record[1], record[1 + numberOfTags:].tolist()))
+      numberOfReadElements += numberOfBlockElements
+    self.assertEqual(elements[4], [(1, 1, [1, 2, 3, 4]), (2, 2, [2, 3, 4, 5])])
+    self.assertEqual(sorted(elementId for elementId, physicalTag, nodeIds in elements[2]), list(range(3, 10)))
+    self.assertTrue(gmshData[offset:].startswith(b"\n$EndElements"))
+
+    # Gmsh (ASCII), element IDs match element IDs of the other formats even if labels are not in increasing order
+    swappedLabelsMesh = self.createTestMesh(points, tetrahedra, labels=[2, 1])
+    gmshAsciiFilePath = os.path.join(outputDirectory, "mesh_ascii.msh")
+    logic.exportMeshToGmsh(swappedLabelsMesh, gmshAsciiFilePath, False, labelNames)
+    with open(gmshAsciiFilePath) as gmshFile:
+      gmshLines = gmshFile.read().splitlines()
+    nodesStart = gmshLines.index("$Nodes") + 2
+    np.testing.assert_allclose(np.array([line.split() for line in gmshLines[nodesStart:nodesStart + 5]], dtype=float),
+      np.column_stack((np.arange(1, 6), points)))
+    elementsStart = gmshLines.index("$Elements") + 2
+    elementRecords = [[int(value) for value in line.split()] for line in gmshLines[elementsStart:gmshLines.index("$EndElements")]]
+    tetrahedronRecords = sorted(record for record in elementRecords if record[1] == 4)
+    # element id, element type, number of tags, physical tag, elementary tag, node ids
+    self.assertEqual(tetrahedronRecords, [[1, 4, 2, 2, 2, 1, 2, 3, 4], [2, 4, 2, 1, 1, 2, 3, 4, 5]])
+    self.assertEqual(sorted(record[0] for record in elementRecords if record[1] == 2), list(range(3, 10)))
+
+    # FEBio
+    febioFilePath = os.path.join(outputDirectory, "mesh.feb")
+    logic.exportMesh(mesh, febioFilePath, labelNames)
+    febioSpec = ElementTree.parse(febioFilePath).getroot()
+    self.assertEqual(febioSpec.get("version"), "3.0")
+    self.assertIsNotNone(febioSpec.find("Module"))
+    materialNames = [material.get("name") for material in febioSpec.find("Material")]
+    self.assertEqual(materialNames, ["bone", "soft_tissue"])
+    febioMesh = febioSpec.find("Mesh")
+    nodes = np.array([node.text.split(",") for node in febioMesh.find("Nodes")], dtype=float)
+    np.testing.assert_allclose(nodes, points)
+    self.assertEqual([[element.text for element in elementSet] for elementSet in febioMesh.findall("Elements")],
+      [["1,2,3,4"], ["2,3,4,5"]])
+    self.assertEqual({surface.get("name"): len(surface) for surface in febioMesh.findall("Surface")},
+      {"boundary_1": 3, "boundary_2": 3, "interface_1_2": 1})
+    self.assertEqual([(domain.get("name"), domain.get("mat")) for domain in febioSpec.find("MeshDomains")],
+      [("bone", "bone"), ("soft_tissue", "soft_tissue")])
+
+    self.delayDisplay('Test passed!')
+
+  def test_MapVolumeToMesh1(self):
+    """Map a constant volume to a transformed cube mesh and check mean and integrated element values.
+    """
+    import itertools
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    # Cube of [2, 6] x [2, 6] x [2, 6] mm in the world coordinate system, split into 6 tetrahedra
+    cornerPositions = np.array([[i, j, k] for k in (2.0, 6.0) for j in (2.0, 6.0) for i in (2.0, 6.0)])
+    tetrahedra = np.array([[0, a, a + b, a + b + c] for a, b, c in itertools.permutations([1, 2, 4])])
+    edges = cornerPositions[tetrahedra[:, 1:]] - cornerPositions[tetrahedra[:, :1]]
+    inverted = np.linalg.det(edges) < 0
+    tetrahedra[inverted] = tetrahedra[inverted][:, [0, 1, 3, 2]]
+    # Model is under a transform that translates it by 100 mm, therefore the mesh points are translated by -100 mm
+    mesh = self.createTestMesh(cornerPositions - [100.0, 0.0, 0.0], tetrahedra)
+    modelNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLModelNode")
+    modelNode.SetAndObserveMesh(mesh)
+    transformNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLinearTransformNode")
+    translation = vtk.vtkTransform()
+    translation.Translate(100.0, 0.0, 0.0)
+    transformNode.SetMatrixTransformToParent(translation.GetMatrix())
+    modelNode.SetAndObserveTransformNodeID(transformNode.GetID())
+
+    volumeNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode")
+    slicer.util.updateVolumeFromArray(volumeNode, np.full((20, 20, 20), 3.0, dtype=np.float32))
+    volumeNode.SetSpacing(0.5, 0.5, 0.5)
+
+    logic = SegmentMesherLogic()
+    meanValues = logic.mapVolumeToMeshElements(modelNode, volumeNode, outputArrayName="mean")
+    np.testing.assert_allclose(meanValues, np.full(6, 3.0))
+    integratedValues = logic.mapVolumeToMeshElements(modelNode, volumeNode, integrate=True, outputArrayName="integral")
+    np.testing.assert_allclose(integratedValues, np.full(6, 3.0 * 64.0 / 6.0))
+    self.assertIsNotNone(mesh.GetCellData().GetArray("mean"))
+    self.assertIsNotNone(mesh.GetCellData().GetArray("integral"))
+
+    # Each voxel with its center inside the cube is assigned to exactly one element
+    index = logic.getVoxelToElementIndex(mesh, volumeNode, transformNode)
+    self.assertEqual(len(index["voxelIndices"]), 9 * 9 * 9)
+    np.testing.assert_allclose(index["elementVolumes"].sum(), 64.0)
+
+    # Without the transform the mesh is outside the volume
+    self.assertTrue(np.all(np.isnan(logic.mapVolumeToMeshElements(mesh, volumeNode))))
+
+    self.delayDisplay('Test passed!')
+
+  def test_SegmentClosedSurfaces1(self):
+    """Convert segments to closed surfaces in parallel and check that they are returned in the requested order.
+    """
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    labels = np.zeros((6, 6, 14), dtype=np.uint8)
+    labels[1:5, 1:5, 1:4] = 1
+    labels[1:5, 1:5, 5:9] = 2
+    labels[1:5, 1:5, 10:13] = 3
+    segmentationNode, labelmapVolumeNode = self.createTestSegmentation(labels)
+    segmentIds = list(segmentationNode.GetSegmentation().GetSegmentIDs())
+    self.assertEqual(len(segmentIds), 3)
+
+    logic = SegmentMesherLogic()
+    requestedSegmentIds = [segmentIds[2], segmentIds[0], segmentIds[1]]
+    surfaces = list(logic.getSegmentClosedSurfaces(segmentationNode, requestedSegmentIds))
+    self.assertEqual([segmentId for segmentId, polydata in surfaces], requestedSegmentIds)
+    # Segments are placed along the first image axis in the order of their label value
+    surfaceCentersX = [(polydata.GetBounds()[0] + polydata.GetBounds()[1]) / 2.0 for segmentId, polydata in surfaces]
+    self.assertTrue(surfaceCentersX[1] < surfaceCentersX[2] < surfaceCentersX[0])
+    for segmentId, polydata in surfaces:
+      self.assertTrue(polydata.GetNumberOfPoints() > 0)
+    self.assertFalse(segmentationNode.GetSegmentation().ContainsRepresentation(
+      slicer.vtkSegmentationConverter.GetSegmentationClosedSurfaceRepresentationName()))
+
+    # Remaining conversions are cancelled if the caller stops early
+    surfaceGenerator = logic.getSegmentClosedSurfaces(segmentationNode, segmentIds)
+    self.assertEqual(next(surfaceGenerator)[0], segmentIds[0])
+    surfaceGenerator.close()
+
+    # Surfaces are the same as the ones created by the built-in converter, with and without joint smoothing
+    closedSurfaceRepresentationName = slicer.vtkSegmentationConverter.GetSegmentationClosedSurfaceRepresentationName()
+    segmentation = segmentationNode.GetSegmentation()
+    segmentation.SetConversionParameter("Decimation factor", "0.3")
+    for jointSmoothing in ["0", "1"]:
+      segmentation.SetConversionParameter("Joint smoothing", jointSmoothing)
+      segmentationCopy = slicer.vtkSegmentation()
+      segmentationCopy.DeepCopy(segmentation)
+      self.assertTrue(segmentationCopy.CreateRepresentation(closedSurfaceRepresentationName))
+      expectedPolyData = segmentationCopy.GetSegment(segmentIds[1]).GetRepresentation(closedSurfaceRepresentationName)
+      segmentId, polydata = list(logic.getSegmentClosedSurfaces(segmentationNode, [segmentIds[1]]))[0]
+      self.assertEqual(polydata.GetNumberOfPoints(), expectedPolyData.GetNumberOfPoints())
+      self.assertEqual(polydata.GetNumberOfPolys(), expectedPolyData.GetNumberOfPolys())
+      np.testing.assert_allclose(polydata.GetBounds(), expectedPolyData.GetBounds(), atol=1e-3)
+      self.assertEqual(polydata.GetPointData().GetNormals() is not None, expectedPolyData.GetPointData().GetNormals() is not None)
+    self.assertFalse(segmentation.ContainsRepresentation(closedSurfaceRepresentationName))
+
+    self.delayDisplay('Test passed!')
+
+  def test_ResourceLimits1(self):
+    """Retry meshing with coarser parameters when a resource limit is exceeded, without running a mesher.
+    """
+    import re
+    from SegmentMesherLib.MeshingWorker import MEMORY_ALLOCATION_FAILURE_PATTERN, RESOURCE_LIMIT_MEMORY, RESOURCE_LIMIT_TIME
+
+    self.delayDisplay("Starting the test")
+
+    logic = SegmentMesherLogic()
+
+    cleaverParameters = {"featureScale": 2.0, "samplingRate": 0.2, "rateOfChange": 0.2, "paddingRatio": 0.1}
+    coarserParameters, changes = logic.getCoarserMesherParameters(METHOD_CLEAVER, cleaverParameters)
+    self.assertAlmostEqual(coarserParameters["featureScale"], 3.0)
+    self.assertAlmostEqual(coarserParameters["samplingRate"], 0.2 / 1.5)
+    self.assertAlmostEqual(coarserParameters["paddingRatio"], 0.05)
+    self.assertEqual(coarserParameters["rateOfChange"], 0.2)
+    self.assertEqual(len(changes), 3)
+
+    tetGenParameters = {"ratio": 5.0, "angle": 0.0, "volume": 10.0, "inputDownsamplingFactor": 1.0}
+    coarserParameters, changes = logic.getCoarserMesherParameters(METHOD_TETGEN, tetGenParameters)
+    self.assertEqual(coarserParameters, {"ratio": 6.25, "angle": 0.0, "volume": 20.0, "inputDownsamplingFactor": 1.5})
+    # Input is not coarsened if the mesher does not support it (for example, when refining a mesh)
+    coarserParameters, changes = logic.getCoarserMesherParameters(METHOD_TETGEN, {"ratio": 5.0, "angle": 0.0, "volume": 10.0})
+    self.assertNotIn("inputDownsamplingFactor", coarserParameters)
+    # Unconstrained element volume remains unconstrained
+    coarserParameters, changes = logic.getCoarserMesherParameters(METHOD_TETGEN, dict(tetGenParameters, volume=0.0))
+    self.assertEqual(coarserParameters["volume"], 0.0)
+
+    # Mesher fails because of exceeding the memory limit, then the time limit, then succeeds
+    attempts = []
+    def createMesh(parameters):
+      tempDir = logic.createTempDirectory()
+      attempts.append((parameters, tempDir))
+      if len(attempts) == 1:
+        logic.resourceLimitType = RESOURCE_LIMIT_MEMORY
+        logic.resourceLimitExceeded = "memory allocation failed"
+      elif len(attempts) == 2:
+        logic.resourceLimitType = RESOURCE_LIMIT_TIME
+        logic.resourceLimitExceeded = "computation time exceeded 60 s"
+      else:
+        return
+      raise ValueError("Mesher is stopped: " + logic.resourceLimitExceeded)
+    logic.retryWithCoarserParameters = True
+    logic.deleteTemporaryFiles = True
+    usedParameters = logic.createMeshWithResourceLimits(METHOD_TETGEN, tetGenParameters, createMesh)
+    self.assertEqual(len(attempts), 3)
+    self.assertEqual(usedParameters, attempts[2][0])
+    self.assertAlmostEqual(usedParameters["volume"], 40.0)
+    self.assertAlmostEqual(usedParameters["inputDownsamplingFactor"], 2.25)
+    # The limit that stopped the mesher is recorded for each failed attempt
+    self.assertEqual([(attempt["parameters"], attempt["resourceLimitType"]) for attempt in logic.failedAttempts],
+      [(attempts[0][0], RESOURCE_LIMIT_MEMORY), (attempts[1][0], RESOURCE_LIMIT_TIME)])
+    # Temporary directories are removed, including the ones of failed attempts
+    for parameters, tempDir in attempts:
+      self.assertFalse(os.path.exists(tempDir))
+
+    # Without retry the error is reported after the first attempt
+    attempts = []
+    logic.retryWithCoarserParameters = False
+    with self.assertRaises(ValueError):
+      logic.createMeshWithResourceLimits(METHOD_TETGEN, tetGenParameters, createMesh)
+    self.assertEqual(len(attempts), 1)
+    self.assertEqual(len(logic.failedAttempts), 1)
+
+    # Only messages of failed memory allocations are recognized, not all messages that mention memory
+    for line in ["terminate called after throwing an instance of 'std::bad_alloc'", "Error:  Out of memory.", "MemoryError"]:
+      self.assertIsNotNone(re.search(MEMORY_ALLOCATION_FAILURE_PATTERN, line, re.IGNORECASE))
+    for line in ["Memory usage: 120 MB", "Writing memory-mapped file"]:
+      self.assertIsNone(re.search(MEMORY_ALLOCATION_FAILURE_PATTERN, line, re.IGNORECASE))
+
+    self.delayDisplay('Test passed!')
+
+  def test_SegmentSelector1(self):
+    """Check that the segment selector follows segment changes and keeps the selection by segment ID.
+    """
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    labels = np.zeros((4, 4, 8), dtype=np.uint8)
+    labels[1:3, 1:3, 1:3] = 1
+    labels[1:3, 1:3, 3:5] = 2
+    labels[1:3, 1:3, 5:7] = 3
+    segmentationNode, labelmapVolumeNode = self.createTestSegmentation(labels)
+    segmentation = segmentationNode.GetSegmentation()
+    segmentIds = list(segmentation.GetSegmentIDs())
+
+    widget = slicer.modules.segmentmesher.widgetRepresentation().self()
+    parameterNode = widget.logic.getParameterNode()
+    widget.setParameterNode(parameterNode)
+    widget.logic.setSelectedSegmentIds(parameterNode, [segmentIds[1]])
+    parameterNode.SetNodeReferenceID("InputSegmentation", segmentationNode.GetID())
+
+    comboBox = widget.ui.segmentSelectorCombBox
+    def getSegmentIds():
+      return [comboBox.itemData(row) for row in range(comboBox.count)]
+    def getCheckedSegmentIds():
+      return [comboBox.itemData(index.row()) for index in comboBox.checkedIndexes()]
+    self.assertEqual(getSegmentIds(), segmentIds)
+    self.assertEqual(getCheckedSegmentIds(), [segmentIds[1]])
+
+    # Selection is kept when other segments are removed, renamed, or added
+    segmentation.RemoveSegment(segmentIds[0])
+    self.assertEqual(getSegmentIds(), segmentIds[1:])
+    self.assertEqual(getCheckedSegmentIds(), [segmentIds[1]])
+    segmentation.GetSegment(segmentIds[2]).SetName("renamed")
+    self.assertEqual(comboBox.itemText(comboBox.findData(segmentIds[2])), "renamed")
+    addedSegmentId = segmentation.AddEmptySegment("", "added")
+    self.assertEqual(getSegmentIds(), segmentIds[1:] + [addedSegmentId])
+    self.assertEqual(getCheckedSegmentIds(), [segmentIds[1]])
+
+    # Select all only selects segments that match the filter
+    widget.ui.segmentFilterSearchBox.text = "add"
+    view = comboBox.view()
+    self.assertEqual([row for row in range(comboBox.count) if not view.isRowHidden(row)], [comboBox.findData(addedSegmentId)])
+    widget.onSelectAllSegmentsButton()
+    widget.ui.segmentFilterSearchBox.text = ""
+    self.assertEqual(getCheckedSegmentIds(), [segmentIds[1], addedSegmentId])
+
+    # Selection is written to the parameter node in a single batch
+    self.assertEqual(widget.logic.getSelectedSegmentIds(parameterNode), [segmentIds[1]])
+    self.assertTrue(widget.selectedSegmentsUpdateTimer.isActive())
+    widget.selectedSegmentsUpdateTimer.stop()
+    widget.updateParameterNodeSelectedSegments()
+    self.assertEqual(widget.logic.getSelectedSegmentIds(parameterNode), [segmentIds[1], addedSegmentId])
+
+    # Removed segment remains selected (and selected again when it is added back),
+    # but it is not meshed while it is not in the segmentation
+    removedSegment = slicer.vtkSegment()
+    removedSegment.DeepCopy(segmentation.GetSegment(segmentIds[1]))
+    segmentation.RemoveSegment(segmentIds[1])
+    self.assertEqual(getCheckedSegmentIds(), [addedSegmentId])
+    self.assertEqual(widget.logic.getSelectedSegmentIds(parameterNode), [segmentIds[1], addedSegmentId])
+    self.assertEqual(widget.logic.getExistingSegmentIds(segmentationNode, widget._selectedSegmentIds), [addedSegmentId])
+    segmentation.AddSegment(removedSegment, segmentIds[1])
+    self.assertEqual(getCheckedSegmentIds(), [addedSegmentId, segmentIds[1]])
+    self.assertEqual(widget.logic.getExistingSegmentIds(segmentationNode, widget._selectedSegmentIds), [addedSegmentId, segmentIds[1]])
+    self.assertFalse(widget.selectedSegmentsUpdateTimer.isActive())
+
+    self.delayDisplay('Test passed!')
+
+  def test_MeshOptimization1(self):
+    """Optimize a distorted mesh of a cube with two regions and check that quality does not decrease,
+    fixed nodes are not moved, and volume of each region is preserved.
+    """
+    import itertools
+    import numpy as np
+
+    self.delayDisplay("Starting the test")
+
+    # Grid of 4x4x4 cells, each split into 6 tetrahedra, cells with x < 2 are labeled 1, others 2
+    gridSize = 4
+    points = np.array([[i, j, k] for k in range(gridSize + 1) for j in range(gridSize + 1) for i in range(gridSize + 1)], dtype=np.float64)
+    steps = [1, gridSize + 1, (gridSize + 1) ** 2]
+    tetrahedra = []
+    labels = []
+    for i, j, k in itertools.product(range(gridSize), repeat=3):
+      cornerIndex = i * steps[0] + j * steps[1] + k * steps[2]
+      for a, b, c in itertools.permutations(steps):
+        tetrahedra.append([cornerIndex, cornerIndex + a, cornerIndex + a + b, cornerIndex + a + b + c])
+        labels.append(1 if i < gridSize // 2 else 2)
+    tetrahedra = np.array(tetrahedra)
+    labels = np.array(labels)
+    inverted = SegmentMesherLogic().computeTetrahedraVolumes(points, tetrahedra) < 0
+    tetrahedra[inverted] = tetrahedra[inverted][:, [0, 1, 3, 2]]
+
+    # Distort interior nodes that are not on the interface between the regions
+    fixedNodes = np.any((points == 0) | (points == gridSize), axis=1) | (points[:, 0] == gridSize // 2)
+    randomGenerator = np.random.RandomState(1)
+    distortedPoints = points.copy()
+    distortedPoints[~fixedNodes] += randomGenerator.uniform(-0.3, 0.3, (np.count_nonzero(~fixedNodes), 3))
+
+    logic = SegmentMesherLogic()
+    optimizedPoints, optimizedTetrahedra, optimizedLabels, sourceElementIndices, qualityStatistics = logic.optimizeTetrahedra(
+      distortedPoints, tetrahedra, labels, numberOfIterations=5)
+
+    self.assertGreaterEqual(qualityStatistics["after"]["minimumQuality"], qualityStatistics["before"]["minimumQuality"])
+    self.assertGreater(qualityStatistics["after"]["meanQuality"], qualityStatistics["before"]["meanQuality"])
+    np.testing.assert_array_equal(optimizedPoints[fixedNodes], distortedPoints[fixedNodes])
+    self.assertEqual(len(optimizedLabels), len(optimizedTetrahedra))
+    np.testing.assert_array_equal(optimizedLabels, labels[sourceElementIndices])
+    volumes = logic.computeTetrahedraVolumes(optimizedPoints, optimizedTetrahedra)
+    self.assertTrue(np.all(volumes > 0))
+    for label in [1, 2]:
+      self.assertAlmostEqual(volumes[optimizedLabels == label].sum(), gridSize ** 3 / 2.0)
+
+    # Nodes of an independent set are not connected by an edge
+    edges = np.unique(np.sort(tetrahedra[:, MESH_TETRAHEDRON_EDGES].reshape(-1, 2), axis=1), axis=0)
+    movableNodes = np.flatnonzero(~fixedNodes)
+    nodeSets = logic.getIndependentNodeSets(edges, movableNodes, len(points))
+    np.testing.assert_array_equal(np.sort(np.concatenate(nodeSets)), movableNodes)
+    for nodeSet in nodeSets:
+      inSet = np.zeros(len(points), dtype=bool)
+      inSet[nodeSet] = True
+      self.assertFalse(np.any(inSet[edges[:, 0]] & inSet[edges[:, 1]]))
+
+    # Smoothing in multiple chunks (processed in parallel) gives the same result as smoothing in a single chunk
+    orientation = 1.0
+    quality = logic.computeTetrahedraQuality(distortedPoints, tetrahedra, orientation)
+    singleChunkResult = logic.smoothMeshNodes(distortedPoints, tetrahedra, quality, orientation, fixedNodes)
+    multipleChunksResult = logic.smoothMeshNodes(distortedPoints, tetrahedra, quality, orientation, fixedNodes, chunkSize=2)
+    np.testing.assert_array_equal(multipleChunksResult[0], singleChunkResult[0])
+    np.testing.assert_array_equal(multipleChunksResult[1], singleChunkResult[1])
+    self.assertEqual(multipleChunksResult[2], singleChunkResult[2])
+    self.assertGreater(singleChunkResult[2], 0)
+    np.testing.assert_array_almost_equal(singleChunkResult[1], logic.computeTetrahedraQuality(singleChunkResult[0], tetrahedra, orientation))
+
+    self.delayDisplay('Test passed!')
+
+  def test_MesherProgress1(self):
+    """Estimate progress and remaining time from TetGen output lines, with simulated timing.
+    """
+    import time
+
+    self.delayDisplay("Starting the test")
+
+    logic = SegmentMesherLogic()
+    runHistoryFilePath = os.path.join(logic.createTempDirectory(), "RunHistory.json")
+    logic.getRunHistoryFilePath = lambda: runHistoryFilePath
+    progressRecords = []
+    logic.progressCallback = lambda progress, remainingTime, phase: progressRecords.append((progress, remainingTime, phase))
+
+    def updateProgress(elapsedTime, outputLine=None):
+      logic.mesherStartTime = time.time() - elapsedTime
+      logic.updateMesherProgress(outputLine)
+      return progressRecords[-1]
+
+    # Output of "tetgen -pq1.2a10", with elapsed time (in seconds) when each line is written
+    logic.startMesherProgress(METHOD_TETGEN)
+    self.assertEqual(updateProgress(0.0, "Opening mesh.ply.")[2], "input")
+    self.assertEqual(updateProgress(1.0, "Delaunizing vertices...")[2], "tetrahedralization")
+    self.assertEqual(updateProgress(3.0, "Delaunay seconds:  2.0")[2], "tetrahedralization")
+    self.assertEqual(updateProgress(3.0, "Creating surface mesh ...")[2], "boundary recovery")
+    self.assertEqual(updateProgress(4.0, "Recovering boundaries...")[2], "boundary recovery")
+    self.assertEqual(updateProgress(5.0, "Removing exterior tetrahedra ...")[2], "boundary recovery")
+    progress, remainingTime, phase = updateProgress(6.0, "Refining mesh...")
+    self.assertEqual(phase, "refinement")
+    self.assertAlmostEqual(progress, 0.3, places=2)
+    self.assertAlmostEqual(remainingTime, 14.0, places=1)
+
+    # Progress advances while TetGen does not write anything (updated by a timer while the mesher is running)
+    progress, remainingTime, phase = updateProgress(11.0)
+    self.assertEqual(phase, "refinement")
+    self.assertAlmostEqual(progress, 0.55, places=2)
+    self.assertAlmostEqual(remainingTime, 9.0, places=1)
+
+    self.assertEqual(updateProgress(16.0, "Optimizing mesh...")[2], "quality improvement")
+    self.assertEqual(updateProgress(19.0, "Writing mesh.1.node.")[2], "output")
+    progressValues = [progress for progress, remainingTime, phase in progressRecords]
+    self.assertEqual(progressValues, sorted(progressValues))
+
+    logic.finishMesherProgress()
+    self.assertEqual(progressRecords[-1], (1.0, 0.0, "output"))
+    self.assertAlmostEqual(logic.lastRunPhaseStartTimes["refinement"], 6.0, places=1)
+
+    self.delayDisplay('Test passed!')
+
 METHOD_CLEAVER = 'CLEAVER'
 METHOD_TETGEN = 'TETGEN'
+
+CLEAVER_MATERIAL_FIELD_LABELMAP = 'LABELMAP'
+CLEAVER_MATERIAL_FIELD_INDICATOR = 'INDICATOR'
+CLEAVER_MATERIAL_FIELD_DISTANCE = 'DISTANCE'
+
+# Node indices of the faces of a tetrahedron, in the order of Abaqus C3D4 element faces S1-S4
+# (face normals point inward for positively oriented tetrahedra)
+MESH_TETRAHEDRON_FACES = [[0, 1, 2], [0, 3, 1], [1, 3, 2], [2, 3, 0]]
+
+# Node indices of the edges of a tetrahedron
+MESH_TETRAHEDRON_EDGES = [[0, 1], [0, 2], [0, 3], [1, 2], [1, 3], [2, 3]]
+
+# Phases of each mesher: phase name, mesher output line pattern (case-insensitive regular expression) that marks
+# the start of the phase, and default fraction of the total computation time at which the phase starts
+# (used until phase timings of previous runs are available). The first phase starts when the mesher is started.
+MESHER_PHASES = {
+  METHOD_CLEAVER: [
+    ("input", None, 0.0),
+    ("sizing field", r"sizing field|feature size", 0.05),
+    ("background mesh", r"background mesh|octree", 0.25),
+    ("interface cutting", r"cuts|triples|quadruples|violations", 0.45),
+    ("quality improvement", r"snap|warp", 0.65),
+    ("stencil", r"stencil", 0.8),
+    ("output", r"^\s*writing", 0.95),
+    ],
+  METHOD_TETGEN: [
+    ("input", None, 0.0),
+    ("tetrahedralization", r"delaunizing vertices|reconstructing mesh", 0.05),
+    ("boundary recovery", r"creating surface mesh|recovering boundaries|removing exterior tetrahedra", 0.2),
+    ("refinement", r"refining mesh", 0.3),
+    ("quality improvement", r"optimizing mesh", 0.75),
+    ("output", r"^\s*writing", 0.95),
+    ],
+  }
@@ -0,0 +1,594 @@
+"""Meshing worker server. It runs Cleaver and TetGen for SegmentMesher module instances running on other computers
+(see SegmentMesherRemoteBackend in SegmentMesher.py).
+
+The worker does not depend on Slicer, only Python 3.7 or later is required. Example usage:
+
+  python MeshingWorker.py --port 8765 --cleaver /opt/bin/cleaver-cli --tetgen /opt/bin/tetgen
+
+HTTP interface:
+
+- HEAD /blobs/<sha256>: check if an input file with the specified SHA-256 hash is already uploaded (200: yes, 404: no)
+- PUT /blobs/<sha256>: upload an input file
+- POST /jobs: start a job. Request body is a JSON object: {"mesher": "cleaver" or "tetgen", "arguments": [...],
+  "inputs": {"relative/file/path": sha256, ...}, "maximumMemoryUsage": bytes or null}.
+  WORKING_DIRECTORY_PLACEHOLDER in the arguments is replaced by the working directory of the job.
+  Only known mesher options are accepted and all file paths must be in the working directory of the job.
+  Response is {"id": jobId}.
+- GET /jobs/<id>: get job status
+- GET /jobs/<id>/log: stream the output of the mesher, until the mesher exits
+- GET /jobs/<id>/result: get all the files that the mesher created in the working directory, in a zip file
+- POST /jobs/<id>/cancel: stop the mesher
+- DELETE /jobs/<id>: delete the job and its working directory
+
+Jobs that are not accessed by the client for a long time (for example, because the client exited without deleting the job)
+are deleted automatically.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORKING_DIRECTORY_PLACEHOLDER = "{workingDirectory}"
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_COMPLETED = "completed"
+JOB_STATUS_FAILED = "failed"
+JOB_STATUS_CANCELLED = "cancelled"
+
+# Command-line options that clients may use for each mesher. Value is True if the option is followed by file paths,
+# which must be in the working directory of the job, as Cleaver writes output files and reads inputs at these locations.
+CLEAVER_OPTIONS = {
+  "--input_files": True, "-i": True,
+  "--background_mesh": True, "-b": True,
+  "--sizing_field": True,
+  "--output_path": True, "-o": True,
+  "--output_name": True, "-n": True,
+  "--output_format": False, "-f": False,
+  "--feature_scaling": False, "--sampling_rate": False, "--lipschitz": False,
+  "--alpha": False, "--alpha_long": False, "--alpha_short": False,
+  "--element_sizing_method": False, "--blend_sigma": False, "--mesh_mode": False,
+  "--indicator_functions": False, "--segmentation": False, "-z": False,
+  "--fix_tet_windup": False, "-w": False, "--strip_exterior": False, "-e": False,
+  "--verbose": False, "-v": False,
+  }
+
+# TetGen switches are a single argument (such as "-pq1.2a10"), all other arguments are input file paths
+TETGEN_SWITCHES_PATTERN = r"^-[A-Za-z0-9./]+$"
+
+# Mesher output line pattern (case-insensitive regular expression) that indicates that a memory allocation failed
+MEMORY_ALLOCATION_FAILURE_PATTERN = r"bad_alloc|out of memory|MemoryError|cannot allocate memory"
+
+# Types of resource limits that may stop the mesher
+RESOURCE_LIMIT_MEMORY = "memory"
+RESOURCE_LIMIT_TIME = "time"
+
+
+def getProcessMemoryUsage(pid):
+  """Get current memory usage (resident set size) of a process in bytes. Returns None if not available.
+  """
+  try:
+    import psutil
+    return psutil.Process(pid).memory_info().rss
+  except ImportError:
+    pass
+  except Exception:
+    # process already exited
+    return None
+  # psutil is not available, try Linux process information
+  try:
+    with open("/proc/{0}/status".format(pid)) as statusFile:
+      for line in statusFile:
+        if line.startswith("VmRSS:"):
+          return int(line.split()[1]) * 1024
+  except (IOError, OSError, ValueError):
+    pass
+  return None
+
+
+def getPathInDirectory(directory, path):
+  """Get absolute path of a file that is specified relative to a directory (or as an absolute path).
+  Raises ValueError if the file is not in the directory (after resolving "..", symbolic links, and drive letters).
+  """
+  realDirectory = os.path.realpath(directory)
+  try:
+    realPath = os.path.realpath(os.path.join(realDirectory, path))
+    inDirectory = (os.path.commonpath([realDirectory, realPath]) == realDirectory)
+  except ValueError:
+    # paths on different drives
+    inDirectory = False
+  if not inDirectory:
+    raise ValueError("File path is outside of the job working directory: " + path)
+  return realPath
+
+
+def checkMesherArguments(mesher, arguments, workingDirectory):
+  """Raise ValueError if the mesher command-line arguments contain unknown options
+  or refer to files outside of the working directory.
+  """
+  if mesher == "cleaver":
+    option = None
+    for argument in arguments:
+      if argument.startswith("-") and not re.match(r"^-[0-9.]", argument):
+        if argument not in CLEAVER_OPTIONS:
+          raise ValueError("Mesher option is not allowed: " + argument)
+        option = argument
+      elif option is None:
+        raise ValueError("Unexpected mesher argument: " + argument)
+      elif CLEAVER_OPTIONS[option]:
+        getPathInDirectory(workingDirectory, argument)
+  else:
+    for argument in arguments:
+      if argument.startswith("-"):
+        if not re.match(TETGEN_SWITCHES_PATTERN, argument):
+          raise ValueError("Mesher option is not allowed: " + argument)
+      else:
+        getPathInDirectory(workingDirectory, argument)
+
+
+def limitProcessAddressSpace(pid, addressSpaceLimit):
+  """Limit address space of a running process (in bytes). Returns True if the limit is set.
+  The limit is set after the process is started, because preexec_fn of subprocess.Popen is not safe to use
+  in a multi-threaded process (such as this server or Slicer). It is only supported on Linux: resource.prlimit is not available
+  on other platforms (and RLIMIT_AS is not enforced on macOS).
+  """
+  if not sys.platform.startswith("linux"):
+    return False
+  try:
+    import resource
+    resource.prlimit(pid, resource.RLIMIT_AS, (addressSpaceLimit, addressSpaceLimit))
+    return True
+  except (ImportError, AttributeError, ValueError, OSError):
+    # process already exited or limit cannot be changed
+    return False
+
+
+class MeshingJob(object):
+  """Runs a mesher process and stores its output.
+  """
+
+  def __init__(self, jobId, executablePath, arguments, workingDirectory, inputFilePaths, maximumMemoryUsage=None):
+    self.id = jobId
+    self.executablePath = executablePath
+    self.arguments = arguments
+    self.workingDirectory = workingDirectory
+    self.inputFilePaths = inputFilePaths  # relative paths of input files, these are not included in the result
+    self.maximumMemoryUsage = maximumMemoryUsage
+    self.memorySamplingInterval = 0.2
+
+    self.status = JOB_STATUS_QUEUED
+    self.returnCode = None
+    self.resourceLimitExceeded = None
+    self.resourceLimitType = None
+    self.runTime = None
+    self.peakMemory = None
+    self.outputLines = []
+    self.process = None
+    self.cancelRequested = False
+    self.lastAccessTime = time.time()
+    # Notified when new output line is available or the job is finished
+    self.condition = threading.Condition()
+
+  def touch(self):
+    """Record that the client is still interested in the job (see MeshingWorker.removeIdleJobs).
+    """
+    self.lastAccessTime = time.time()
+
+  def isFinished(self):
+    return self.status in [JOB_STATUS_COMPLETED, JOB_STATUS_FAILED, JOB_STATUS_CANCELLED]
+
+  def run(self, jobSlots):
+    """Run the mesher when a job slot becomes available.
+    """
+    with jobSlots:
+      if self.cancelRequested:
+        self.setFinished(JOB_STATUS_CANCELLED)
+        return
+      try:
+        self.runProcess()
+      except Exception as e:
+        logging.exception("Job {0} failed".format(self.id))
+        self.appendOutputLine("Error: {0}".format(e))
+        self.setFinished(JOB_STATUS_FAILED)
+
+  def runProcess(self):
+    startTime = time.time()
+    with self.condition:
+      self.process = subprocess.Popen([self.executablePath] + self.arguments, cwd=self.workingDirectory,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+      if self.maximumMemoryUsage:
+        # Make memory allocation fail instead of swapping (address space is usually larger than resident memory)
+        limitProcessAddressSpace(self.process.pid, int(self.maximumMemoryUsage * 2))
+      self.status = JOB_STATUS_RUNNING
+      self.condition.notify_all()
+
+    peakMemory = [0]
+    monitoringStopped = threading.Event()
+    def monitorProcess():
+      while not monitoringStopped.wait(self.memorySamplingInterval):
+        memoryUsage = getProcessMemoryUsage(self.process.pid) or 0
+        peakMemory[0] = max(peakMemory[0], memoryUsage)
+        if self.maximumMemoryUsage and memoryUsage > self.maximumMemoryUsage:
+          self.resourceLimitType = RESOURCE_LIMIT_MEMORY
+          self.resourceLimitExceeded = "memory usage exceeded {0:.1f} GB".format(self.maximumMemoryUsage / 1024.0**3)
+          self.process.kill()
+          return
+    monitorThread = threading.Thread(target=monitorProcess)
+    monitorThread.daemon = True
+    monitorThread.start()
+
+    memoryAllocationFailed = False
+    for line in iter(self.process.stdout.readline, ""):
+      if re.search(MEMORY_ALLOCATION_FAILURE_PATTERN, line, re.IGNORECASE):
+        memoryAllocationFailed = True
+      self.appendOutputLine(line.rstrip())
+    self.process.stdout.close()
+    self.returnCode = self.process.wait()
+    monitoringStopped.set()
+    monitorThread.join()
+
+    self.runTime = time.time() - startTime
+    self.peakMemory = peakMemory[0] if peakMemory[0] > 0 else None
+    if self.returnCode and memoryAllocationFailed and self.maximumMemoryUsage and not self.resourceLimitExceeded:
+      self.resourceLimitType = RESOURCE_LIMIT_MEMORY
+      self.resourceLimitExceeded = "memory allocation failed"
+
+    if self.cancelRequested:
+      self.setFinished(JOB_STATUS_CANCELLED)
+    elif self.returnCode:
+      self.setFinished(JOB_STATUS_FAILED)
+    else:
+      self.setFinished(JOB_STATUS_COMPLETED)
+
+  def appendOutputLine(self, line):
+    with self.condition:
+      self.outputLines.append(line)
+      self.condition.notify_all()
+
+  def setFinished(self, status):
+    with self.condition:
+      self.status = status
+      self.condition.notify_all()
+
+  def cancel(self):
+    with self.condition:
+      self.cancelRequested = True
+      if self.process and self.returnCode is None:
+        self.process.kill()
+
+  def waitForOutputLines(self, startIndex, timeout=1.0):
+    """Get output lines starting from startIndex. Waits until new lines are available or the job is finished.
+    Returns the lines and a flag that indicates if the job is finished (and so there will be no more lines).
+    """
+    self.touch()
+    with self.condition:
+      if len(self.outputLines) <= startIndex and not self.isFinished():
+        self.condition.wait(timeout)
+      return self.outputLines[startIndex:], self.isFinished()
+
+  def getStatus(self):
+    return {
+      "id": self.id,
+      "status": self.status,
+      "returnCode": self.returnCode,
+      "resourceLimitExceeded": self.resourceLimitExceeded,
+      "resourceLimitType": self.resourceLimitType,
+      "runTime": self.runTime,
+      "peakMemory": self.peakMemory,
+      "numberOfOutputLines": len(self.outputLines),
+      }
+
+  def writeResultArchive(self, archiveFile):
+    """Write files created by the mesher into a compressed zip file (file object opened for binary writing).
+    """
+    with zipfile.ZipFile(archiveFile, "w", zipfile.ZIP_DEFLATED) as archive:
+      for dirPath, dirNames, fileNames in os.walk(self.workingDirectory):
+        for fileName in fileNames:
+          filePath = os.path.join(dirPath, fileName)
+          relativePath = os.path.relpath(filePath, self.workingDirectory).replace(os.sep, "/")
+          if relativePath not in self.inputFilePaths:
+            archive.write(filePath, relativePath)
+
+
+class MeshingWorker(object):
+  """Stores uploaded input files and manages meshing jobs.
+  Input files are stored by their content hash, therefore identical inputs only need to be uploaded once.
+  """
+
+  def __init__(self, workDirectory, mesherPaths, maximumNumberOfConcurrentJobs=None, idleJobTimeout=3600):
+    """mesherPaths: dictionary that maps mesher name ("cleaver", "tetgen") to executable path.
+    idleJobTimeout: jobs that are not accessed by the client for this long (in seconds) are deleted. None means no timeout.
+    """
+    self.blobsDirectory = os.path.join(workDirectory, "blobs")
+    self.jobsDirectory = os.path.join(workDirectory, "jobs")
+    for directory in [self.blobsDirectory, self.jobsDirectory]:
+      if not os.path.exists(directory):
+        os.makedirs(directory)
+    self.mesherPaths = mesherPaths
+    if not maximumNumberOfConcurrentJobs:
+      maximumNumberOfConcurrentJobs = max(1, (os.cpu_count() or 1) // 4)
+    self.jobSlots = threading.BoundedSemaphore(maximumNumberOfConcurrentJobs)
+    self.jobs = {}
+    self.jobsLock = threading.Lock()
+    self.idleJobTimeout = idleJobTimeout
+    if idleJobTimeout:
+      idleJobRemoverThread = threading.Thread(target=self.removeIdleJobsPeriodically)
+      idleJobRemoverThread.daemon = True
+      idleJobRemoverThread.start()
+
+  def getBlobPath(self, blobHash):
+    if not re.match("^[0-9a-f]{64}$", blobHash):
+      raise ValueError("Invalid SHA-256 hash: " + blobHash)
+    return os.path.join(self.blobsDirectory, blobHash)
+
+  def hasBlob(self, blobHash):
+    return os.path.exists(self.getBlobPath(blobHash))
+
+  def addBlob(self, blobHash, inputStream, length, chunkSize=1024*1024):
+    """Store an uploaded file. The file is only stored if its content matches the specified hash.
+    """
+    blobPath = self.getBlobPath(blobHash)
+    temporaryBlobPath = blobPath + "." + uuid.uuid4().hex
+    sha256 = hashlib.sha256()
+    try:
+      with open(temporaryBlobPath, "wb") as blobFile:
+        remainingLength = length
+        while remainingLength > 0:
+          chunk = inputStream.read(min(chunkSize, remainingLength))
+          if not chunk:
+            raise ValueError("Incomplete upload")
+          sha256.update(chunk)
+          blobFile.write(chunk)
+          remainingLength -= len(chunk)
+      if sha256.hexdigest() != blobHash:
+        raise ValueError("Uploaded content does not match hash " + blobHash)
+      os.replace(temporaryBlobPath, blobPath)
+    finally:
+      if os.path.exists(temporaryBlobPath):
+        os.remove(temporaryBlobPath)
+
+  def createJob(self, jobRequest):
+    """Create working directory with the input files and start the mesher (as soon as a job slot is available).
+    """
+    mesher = jobRequest.get("mesher")
+    if mesher not in self.mesherPaths:
+      raise ValueError("Mesher is not available: {0}".format(mesher))
+    jobId = uuid.uuid4().hex
+    workingDirectory = os.path.join(self.jobsDirectory, jobId)
+    os.makedirs(workingDirectory)
+    try:
+      inputs = jobRequest.get("inputs", {})
+      for relativePath, blobHash in inputs.items():
+        # Paths are always relative and use "/" separator, regardless of the operating system of the client and the server
+        if "\\" in relativePath or re.match(r"^[A-Za-z]:", relativePath) or os.path.isabs(relativePath):
+          raise ValueError("Invalid input file path: " + relativePath)
+        inputFilePath = getPathInDirectory(workingDirectory, os.path.join(*relativePath.split("/")))
+        if inputFilePath == os.path.realpath(workingDirectory):
+          raise ValueError("Invalid input file path: " + relativePath)
+        if not self.hasBlob(blobHash):
+          raise ValueError("Input file is not uploaded: " + relativePath)
+        if not os.path.exists(os.path.dirname(inputFilePath)):
+          os.makedirs(os.path.dirname(inputFilePath))
+        try:
+          os.link(self.getBlobPath(blobHash), inputFilePath)
+        except OSError:
+          shutil.copyfile(self.getBlobPath(blobHash), inputFilePath)
+
+      arguments = [argument.replace(WORKING_DIRECTORY_PLACEHOLDER, workingDirectory) for argument in jobRequest.get("arguments", [])]
+      checkMesherArguments(mesher, arguments, workingDirectory)
+    except Exception:
+      shutil.rmtree(workingDirectory, ignore_errors=True)
+      raise
+
+    job = MeshingJob(jobId, self.mesherPaths[mesher], arguments, workingDirectory, set(inputs.keys()),
+      jobRequest.get("maximumMemoryUsage"))
+    with self.jobsLock:
+      self.jobs[jobId] = job
+    jobThread = threading.Thread(target=job.run, args=(self.jobSlots,))
+    jobThread.daemon = True
+    jobThread.start()
+    logging.info("Job {0} is created: {1} {2}".format(jobId, mesher, arguments))
+    return job
+
+  def getJob(self, jobId):
+    with self.jobsLock:
+      job = self.jobs[jobId]
+    job.touch()
+    return job
+
+  def deleteJob(self, jobId):
+    with self.jobsLock:
+      job = self.jobs.pop(jobId)
+    job.cancel()
+    shutil.rmtree(job.workingDirectory, ignore_errors=True)
+
+  def removeIdleJobs(self):
+    """Delete jobs that have not been accessed by the client for idleJobTimeout seconds
+    (for example, because the client exited without deleting the job).
+    """
+    currentTime = time.time()
+    with self.jobsLock:
+      idleJobIds = [jobId for jobId, job in self.jobs.items() if currentTime - job.lastAccessTime > self.idleJobTimeout]
+    for jobId in idleJobIds:
+      logging.info("Job {0} is deleted because it has not been accessed for {1:.0f} s".format(jobId, self.idleJobTimeout))
+      try:
+        self.deleteJob(jobId)
+      except KeyError:
+        # client deleted the job meanwhile
+        pass
+
+  def removeIdleJobsPeriodically(self):
+    while True:
+      time.sleep(min(60.0, self.idleJobTimeout / 10.0))
+      self.removeIdleJobs()
+
+
+class MeshingWorkerRequestHandler(BaseHTTPRequestHandler):
+  """Implements the HTTP interface of the worker (see module documentation).
+  """
+
+  def sendJson(self, value, status=200):
+    content = json.dumps(value).encode("utf-8")
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(content)))
+    self.end_headers()
+    self.wfile.write(content)
+
+  def sendEmpty(self, status):
+    self.send_response(status)
+    self.send_header("Content-Length", "0")
+    self.end_headers()
+
+  def handleRequest(self, handler):
+    try:
+      handler(self.server.worker, self.path.split("?")[0].strip("/").split("/"))
+    except KeyError:
+      self.sendJson({"error": "Not found"}, 404)
+    except ValueError as e:
+      self.sendJson({"error": str(e)}, 400)
+
+  def do_HEAD(self):
+    def handle(worker, pathItems):
+      if len(pathItems) != 2 or pathItems[0] != "blobs":
+        raise KeyError(self.path)
+      self.sendEmpty(200 if worker.hasBlob(pathItems[1]) else 404)
+    self.handleRequest(handle)
+
+  def do_PUT(self):
+    def handle(worker, pathItems):
+      if len(pathItems) != 2 or pathItems[0] != "blobs":
+        raise KeyError(self.path)
+      worker.addBlob(pathItems[1], self.rfile, int(self.headers["Content-Length"]))
+      self.sendEmpty(201)
+    self.handleRequest(handle)
+
+  def do_POST(self):
+    def handle(worker, pathItems):
+      if pathItems == ["jobs"]:
+        jobRequest = json.loads(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+        job = worker.createJob(jobRequest)
+        self.sendJson({"id": job.id}, 201)
+      elif len(pathItems) == 3 and pathItems[0] == "jobs" and pathItems[2] == "cancel":
+        worker.getJob(pathItems[1]).cancel()
+        self.sendEmpty(200)
+      else:
+        raise KeyError(self.path)
+    self.handleRequest(handle)
+
+  def do_GET(self):
+    def handle(worker, pathItems):
+      if len(pathItems) < 2 or pathItems[0] != "jobs":
+        raise KeyError(self.path)
+      job = worker.getJob(pathItems[1])
+      if len(pathItems) == 2:
+        self.sendJson(job.getStatus())
+      elif pathItems[2] == "log":
+        self.streamLog(job)
+      elif pathItems[2] == "result":
+        if not job.isFinished():
+          raise ValueError("Job is not finished")
+        # Archive is written to a temporary file, as mesh files may be too large to keep in memory
+        with tempfile.TemporaryFile() as archiveFile:
+          job.writeResultArchive(archiveFile)
+          contentLength = archiveFile.tell()
+          archiveFile.seek(0)
+          self.send_response(200)
+          self.send_header("Content-Type", "application/zip")
+          self.send_header("Content-Length", str(contentLength))
+          self.end_headers()
+          shutil.copyfileobj(archiveFile, self.wfile)
+      else:
+        raise KeyError(self.path)
+    self.handleRequest(handle)
+
+  def do_DELETE(self):
+    def handle(worker, pathItems):
+      if len(pathItems) != 2 or pathItems[0] != "jobs":
+        raise KeyError(self.path)
+      worker.deleteJob(pathItems[1])
+      self.sendEmpty(200)
+    self.handleRequest(handle)
+
+  def streamLog(self, job):
+    """Send output lines as soon as they are available. Response is complete when the mesher is finished
+    (content length is not known in advance, therefore the connection is closed at the end).
+    """
+    self.send_response(200)
+    self.send_header("Content-Type", "text/plain; charset=utf-8")
+    self.send_header("Connection", "close")
+    self.end_headers()
+    self.close_connection = True
+    lineIndex = 0
+    try:
+      while True:
+        lines, finished = job.waitForOutputLines(lineIndex)
+        for line in lines:
+          self.wfile.write((line + "\n").encode("utf-8"))
+        self.wfile.flush()
+        lineIndex += len(lines)
+        if finished and not lines:
+          break
+    except (IOError, OSError):
+      # client disconnected
+      pass
+
+  def log_message(self, format, *args):
+    logging.debug(format % args)
+
+
+def createServer(host, port, workDirectory, mesherPaths, maximumNumberOfConcurrentJobs=None, idleJobTimeout=3600):
+  """Create worker server. If port is 0 then a free port is chosen (see server.server_address).
+  Call serve_forever() method of the returned server to start processing requests.
+  """
+  server = ThreadingHTTPServer((host, port), MeshingWorkerRequestHandler)
+  server.daemon_threads = True
+  server.worker = MeshingWorker(workDirectory, mesherPaths, maximumNumberOfConcurrentJobs, idleJobTimeout)
+  return server
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Run Cleaver and TetGen meshing jobs for SegmentMesher module.")
+  parser.add_argument("--host", default="localhost", help="network interface to listen on (use 0.0.0.0 for all interfaces)")
+  parser.add_argument("--port", type=int, default=8765)
+  parser.add_argument("--cleaver", help="path of cleaver-cli executable")
+  parser.add_argument("--tetgen", help="path of tetgen executable")
+  parser.add_argument("--work-directory", default=os.path.join(os.path.abspath(os.curdir), "MeshingWorker"),
+    help="directory for storing uploaded files and job working directories")
+  parser.add_argument("--max-jobs", type=int, default=None, help="maximum number of concurrently running meshers")
+  parser.add_argument("--idle-job-timeout", type=float, default=3600,
+    help="delete jobs that are not accessed by the client for this many seconds (0 means never)")
+  args = parser.parse_args(argv)
+
+  mesherPaths = {}
+  if args.cleaver:
+    mesherPaths["cleaver"] = args.cleaver
+  if args.tetgen:
+    mesherPaths["tetgen"] = args.tetgen
+  if not mesherPaths:
+    parser.error("at least one mesher executable must be specified")
+
+  logging.basicConfig(level=logging.INFO)
+  server = createServer(args.host, args.port, args.work_directory, mesherPaths, args.max_jobs, args.idle_job_timeout)
+  logging.info("Meshing worker is listening on {0}:{1}".format(*server.server_address))
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  server.server_close()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,3 @@
+"""Helper modules of SegmentMesher module. These do not depend on Slicer, therefore they can be used
+on computers where Slicer is not installed (for example, MeshingWorker can run on a meshing server).
+"""